@@ -232,6 +232,28 @@ class CMAMLoss(nn.Module):
         Returns:
             Dict[str, torch.Tensor]: Dictionary containing total loss and individual loss components.
         """
+        ## the cosine, MMD and moment terms are not safe in reduced precision, compute the loss in fp32 under autocast
+        with torch.autocast(device_type=predictions.device.type, enabled=False):
+            return self._forward(
+                predictions.float(),
+                targets.float(),
+                originals=originals,
+                reconstructed=reconstructed.float() if reconstructed is not None else None,
+                forward_func=forward_func,
+                cls_logits=cls_logits.float() if isinstance(cls_logits, torch.Tensor) else cls_logits,
+                cls_labels=cls_labels,
+            )
+
+    def _forward(
+        self,
+        predictions: torch.Tensor,
+        targets: torch.Tensor,
+        originals: Optional[torch.Tensor] = None,
+        reconstructed: Optional[torch.Tensor] = None,
+        forward_func: Optional[Callable] = None,
+        cls_logits: Optional[list[torch.Tensor] | torch.Tensor] = None,
+        cls_labels: Optional[list[torch.Tensor] | torch.Tensor] = None,
+    ) -> Dict[str, torch.Tensor]:
         cosine_sim = self.cosine_similarity(predictions, targets).mean()
         # cosine_loss = -cosine_sim if self.maximize_cosine else cosine_sim
         cosine_loss = 1 - cosine_sim
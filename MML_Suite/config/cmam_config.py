@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 from config.base_config import BaseConfig
 from config.model_config import ModelConfig
@@ -28,6 +29,12 @@ class CMAMConfig(BaseExperimentConfig):
 
     cmam: ModelConfig
     target_modality: Modality
+    cache_target_embeddings: bool = True  # encode the target modality with the frozen teacher once per split
+    target_embeddings_dir: Optional[str] = None  # optional on-disk store, keyed by the teacher encoder fingerprint
+    ## train the association network from precomputed input/target embeddings (frozen input encoders). The samples
+    ## are encoded unmasked, so the metrics only hold the full-pattern bucket of the dataloader mode
+    embedding_space: bool = False
+    embedding_store_dir: Optional[str] = None  # optional on-disk stores, keyed by the encoder fingerprints
 
     def __post_init__(self):
         super().__post_init__()
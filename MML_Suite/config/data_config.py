@@ -7,7 +7,7 @@ from typing import Any, Dict, List, Optional, Set
 from config import BaseConfig
 from experiment_utils import get_console, get_logger
 from experiment_utils.utils import format_path_with_env
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, SequentialSampler
 
 from .resolvers import resolve_dataset_name
 
@@ -89,6 +89,9 @@ class DatasetConfig(BaseConfig):
     pin_memory: bool = False
     drop_last: bool = False
     num_workers: int = 0
+    batch_sampler: bool = False  # Fetch whole batches through the dataset's `__getitems__` fast path
+    pattern_bucketed: bool = False  # Evaluation only: load each sample once and evaluate every pattern in the model
+    length_bucketing: bool = False  # Batch variable-length sequences of similar length together (unaligned MOSI/MOSEI)
     selected_missing_types: Optional[List[str]] = None
     kwargs: Dict[str, Any] = field(default_factory=dict)
 
@@ -222,6 +225,7 @@ class DataConfig(BaseConfig):
     def build_dataloader(
         self,
         target_split: str,
+        seed: int = 0,
     ) -> DataLoader:
         """
         Build a DataLoader for the specified split with enhanced error handling
@@ -229,6 +233,7 @@ class DataConfig(BaseConfig):
 
         Args:
             target_split: The split to build the DataLoader for
+            seed: Base seed for the length-bucketing batch sampler's shuffling
             batch_size: Optional batch size override
             print_fn: Function to use for printing status messages
 
@@ -244,19 +249,39 @@ class DataConfig(BaseConfig):
             # Build the dataset
             dataset = dataset_config.build_dataset()
 
+            if dataset_config.pattern_bucketed:
+                if dataset_config.split == "train":
+                    logger.warning("Pattern-bucketed loading is only supported for evaluation splits, ignoring")
+                else:
+                    dataset.pattern_bucketed = True
+                    logger.debug(f"Using pattern-bucketed evaluation for {target_split} split")
+
             # Get DataLoader arguments
             dataloader_args = dataset_config.get_dataloader_args()
 
+            # Datasets holding per-process file handles open them in each worker
+            if dataset_config.num_workers > 0 and hasattr(dataset, "worker_init_fn"):
+                dataloader_args["worker_init_fn"] = dataset.worker_init_fn
+
             # Add collate function if available
             if hasattr(dataset, "collate"):
                 dataloader_args["collate_fn"] = dataset.collate
                 logger.debug("Using custom collate function from dataset")
 
+            if dataset_config.batch_sampler or dataset_config.length_bucketing:
+                dataloader_args = self._with_batch_sampler(
+                    dataset,
+                    dataloader_args,
+                    batched_indexing=dataset_config.batch_sampler,
+                    length_bucketing=dataset_config.length_bucketing,
+                    seed=seed,
+                )
+
             # Create the DataLoader
             dataloader = DataLoader(dataset, **dataloader_args)
 
             # Log success
-            logger.info(f"Created DataLoader for {target_split} split " f"(batch_size={dataloader_args['batch_size']})")
+            logger.info(f"Created DataLoader for {target_split} split " f"(batch_size={dataset_config.batch_size})")
             console.print(f"[green]✓[/] Created DataLoader for {target_split} split")
 
             return dataloader
@@ -267,12 +292,74 @@ class DataConfig(BaseConfig):
             console.print(f"[red]✗[/] {error_msg}")
             raise e
 
-    def build_all_dataloaders(self) -> Dict[str, DataLoader]:
-        """Build DataLoaders for all configured splits."""
+    @staticmethod
+    def _with_batch_sampler(
+        dataset: Dataset,
+        dataloader_args: Dict[str, Any],
+        batched_indexing: bool = True,
+        length_bucketing: bool = False,
+        seed: int = 0,
+    ) -> Dict[str, Any]:
+        """
+        Replace the per-sample sampling arguments with an explicit batch sampler.
+
+        With `batched_indexing` the DataLoader hands each list of batch indices to the dataset's `__getitems__`,
+        which slices the whole batch with one fancy-index per modality and returns it already collated.
+        With `length_bucketing` the batches are drawn by a `LengthBucketBatchSampler` from the dataset's
+        `get_sequence_lengths`, so each batch holds sequences of similar length.
+
+        Args:
+            dataset: The dataset the DataLoader is built for
+            dataloader_args: DataLoader arguments from `DatasetConfig.get_dataloader_args`
+            batched_indexing: Whether to enable the dataset's `__getitems__` fast path
+            length_bucketing: Whether to group rows of similar sequence length into the same batch
+            seed: Base seed for the length-bucketing sampler, offset by the epoch each pass
+
+        Returns:
+            DataLoader arguments using a batch sampler
+        """
+        if batched_indexing and not hasattr(dataset, "__getitems__"):
+            logger.warning(f"{dataset.__class__.__name__} has no __getitems__ fast path, using per-sample loading")
+            console.print(f"[bold yellow]![/] {dataset.__class__.__name__} does not support batched indexing")
+            batched_indexing = False
+
+        lengths = None
+        if length_bucketing and hasattr(dataset, "get_sequence_lengths"):
+            lengths = dataset.get_sequence_lengths()
+        if length_bucketing and lengths is None:
+            logger.warning(f"{dataset.__class__.__name__} has no variable-length sequences, ignoring length bucketing")
+            console.print(f"[bold yellow]![/] {dataset.__class__.__name__} does not support length bucketing")
+            length_bucketing = False
+
+        if not batched_indexing and not length_bucketing:
+            return dataloader_args
+
+        args = dict(dataloader_args)
+        batch_size = args.pop("batch_size")
+        shuffle = args.pop("shuffle")
+        drop_last = args.pop("drop_last")
+
+        if length_bucketing:
+            from data.samplers import LengthBucketBatchSampler
+
+            args["batch_sampler"] = LengthBucketBatchSampler(
+                lengths, batch_size=batch_size, shuffle=shuffle, drop_last=drop_last, seed=seed
+            )
+            logger.debug(f"Using length-bucketing batch sampler for {dataset.__class__.__name__}")
+        else:
+            sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+            args["batch_sampler"] = BatchSampler(sampler, batch_size=batch_size, drop_last=drop_last)
+            logger.debug(f"Using whole-batch index sampler for {dataset.__class__.__name__}")
+
+        dataset.batched_indexing = batched_indexing
+        return args
+
+    def build_all_dataloaders(self, seed: int = 0) -> Dict[str, DataLoader]:
+        """Build DataLoaders for all configured splits, seeding length-bucketed batching with `seed`."""
         dataloaders = {}
         for split in self.datasets:
             try:
-                dataloaders[split] = self.build_dataloader(split)
+                dataloaders[split] = self.build_dataloader(split, seed=seed)
             except Exception as e:
                 logger.error(f"Failed to build DataLoader for {split}: {str(e)}")
         return dataloaders
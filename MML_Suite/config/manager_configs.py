@@ -15,16 +15,22 @@ class FeatureManagerConfig(BaseConfig):
         modality_dims: Mapping of modalities to their feature dimensions
         num_samples: Number of training samples to track
         device: Device to store tensors on
+        dtype: Storage dtype of the features, "fp32", "fp16" or "bf16"
+        offload: Whether to keep the features in pinned CPU memory instead of on the device
     """
 
     modality_dims: Dict[Modality, int]
     num_samples: int
     device: str = "cuda"
+    dtype: str = "fp32"
+    offload: bool = False
 
     def __post_init__(self):
         # Validate modalities
         if Modality.MULTIMODAL not in self.modality_dims:
             raise ValueError("FeatureManager requires MULTIMODAL dimension")
+        if self.dtype not in ("fp32", "fp16", "bf16"):
+            raise ValueError(f"Invalid feature storage dtype '{self.dtype}', must be fp32, fp16 or bf16")
 
 
 @dataclass
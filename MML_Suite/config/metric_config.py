@@ -24,6 +24,8 @@ class MetricConfig(BaseConfig):
 
     metrics: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     groups: Dict[str, List[str]] = field(default_factory=dict)
+    device_side: bool = False  # Keep the streaming metric states on the model's device, see `MetricRecorder`
+    num_classes: Optional[int] = None  # Size of the device-side confusion matrices
     _docs_cache: Dict[str, str] = field(default_factory=dict, init=False)
 
     def __str__(self) -> str:
@@ -33,6 +35,7 @@ class MetricConfig(BaseConfig):
             [
                 f"Metrics: {metrics}",
                 f"Groups: {self.groups}",
+                f"Device side: {self.device_side}",
             ]
         )
 
@@ -44,7 +47,12 @@ class MetricConfig(BaseConfig):
     def from_dict(cls, data: Dict[str, Any]) -> "MetricConfig":
         """Create MetricConfig from a dictionary."""
 
-        return cls(metrics=data.get("metrics", {}), groups=data.get("groups", {}))
+        return cls(
+            metrics=data.get("metrics", {}),
+            groups=data.get("groups", {}),
+            device_side=data.get("device_side", False),
+            num_classes=data.get("num_classes"),
+        )
 
     def __post_init__(self):
         """Validate metrics configuration and display summary."""
@@ -247,4 +255,9 @@ class MetricConfig(BaseConfig):
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert config to dictionary for serialization."""
-        return {"metrics": self.metrics, "groups": self.groups}
+        return {
+            "metrics": self.metrics,
+            "groups": self.groups,
+            "device_side": self.device_side,
+            "num_classes": self.num_classes,
+        }
@@ -24,6 +24,8 @@ class ModelConfig(BaseConfig):
     pretrained_path: Optional[str] = None
     kwargs: Dict[str, Any] = field(default_factory=dict)
     version: str = field(default="1.0.0")
+    ## `true` or {method: compile|script, modules: [...], options: {...}, warmup: bool}, see models/compilation.py
+    compile: Optional[bool | Dict[str, Any]] = None
 
     def __post_init__(self):
         """Initialize and validate the model configuration."""
@@ -59,6 +61,10 @@ class ModelConfig(BaseConfig):
                 logger.warning(f"Could not import model type {self.model_type}: {str(e)}")
                 console.print(f"[bold yellow]![/] Model type import warning: {self.model_type}")
 
+        # Validate compile option
+        if self.compile is not None and not isinstance(self.compile, (bool, dict)):
+            raise ValueError(f"compile must be a boolean or a mapping, got {type(self.compile).__name__}")
+
         # Log kwargs validation
         logger.info(f"Model configuration includes {len(self.kwargs)} additional parameters")
 
@@ -76,6 +82,7 @@ class ModelConfig(BaseConfig):
             "Pretrained Path",
             str(self.pretrained_path) if self.pretrained_path else "None",
         )
+        config_table.add_row("Compile", str(self.compile) if self.compile else "None")
 
         console.print(config_table)
 
@@ -99,6 +106,7 @@ class ModelConfig(BaseConfig):
             model_type = data.pop("model_type")
             pretrained_path = data.pop("pretrained_path", None)
             version = data.pop("version", "1.0.0")
+            compile = data.pop("compile", None)
 
             # All remaining fields go to kwargs
             kwargs = data
@@ -109,6 +117,7 @@ class ModelConfig(BaseConfig):
                 pretrained_path=pretrained_path,
                 kwargs=kwargs,
                 version=version,
+                compile=compile,
             )
         except KeyError as e:
             error_msg = f"Missing required field in model configuration: {str(e)}"
@@ -132,6 +141,9 @@ class ModelConfig(BaseConfig):
         if self.pretrained_path:
             base_dict["pretrained_path"] = self.pretrained_path
 
+        if self.compile:
+            base_dict["compile"] = self.compile
+
         # Add all kwargs to the base dictionary
         base_dict.update(self.kwargs)
 
@@ -151,7 +163,7 @@ class ModelConfig(BaseConfig):
             param: Parameter name
             default: Default value if parameter not found
         """
-        if param in {"name", "model_type", "pretrained_path", "version"}:
+        if param in {"name", "model_type", "pretrained_path", "version", "compile"}:
             return getattr(self, param)
         return self.kwargs.get(param, default)
 
@@ -16,6 +16,7 @@ from config.monitor_config import MonitorConfig
 from config.optimizer_config import OptimizerConfig, ParameterGroupsOptimizer
 from config.resolvers import (
     resolve_criterion,
+    resolve_model_name,
     resolve_scheduler,
 )
 from experiment_utils import format_path_with_env, get_console, get_logger
@@ -45,6 +46,7 @@ class TrainingConfig(BaseConfig):
     early_stopping: bool = False
     early_stopping_patience: int = 10
     early_stopping_min_delta: float = 0.001
+    precision: str = "fp32"  # "fp32", "bf16" (autocast) or "fp16" (autocast + GradScaler, CUDA only)
 
     def __post_init__(self):
         """Validate training configuration."""
@@ -68,6 +70,9 @@ class TrainingConfig(BaseConfig):
             else:
                 self.missing_rates = [0.0] * self.num_modalities
 
+            if self.precision not in ("fp32", "bf16", "fp16"):
+                raise ValueError(f"Precision must be one of fp32, bf16 or fp16, got {self.precision}")
+
             logger.info("Training configuration validated successfully")
 
         except Exception as e:
@@ -86,6 +91,7 @@ class TrainingConfig(BaseConfig):
         # Add basic parameters
         table.add_row("Epochs", str(self.epochs))
         table.add_row("Criterion", f"{self.criterion} {self.criterion_kwargs}")
+        table.add_row("Precision", self.precision)
 
         if self.scheduler:
             table.add_row("Scheduler", f"{self.scheduler} {self.scheduler_args}")
@@ -219,6 +225,7 @@ class StandardMultimodalConfig(BaseExperimentConfig):
     def _validate_components(self) -> None:
         """Validate all configuration components."""
         try:
+            self._validate_reverse_views()
             # Add more cross-component validations as needed
             logger.info("All configuration components validated successfully")
 
@@ -228,6 +235,32 @@ class StandardMultimodalConfig(BaseExperimentConfig):
             console.print(f"[red]✗[/] {error_msg}")
             raise
 
+    def _validate_reverse_views(self) -> None:
+        """
+        Enable the ``{modality}_reverse`` views of every dataset when the model reads them (e.g. MMIN).
+
+        The per-sample masking path always writes them, but batch masking and the batched `__getitems__` path
+        only do so when the dataset is built with ``reverse_views=True``.
+
+        Raises:
+            ValueError: If a dataset explicitly disables the reverse views the model needs.
+        """
+        try:
+            model_cls = resolve_model_name(self.model.name)
+        except ValueError:
+            return
+        if not getattr(model_cls, "requires_reverse_views", False):
+            return
+
+        for split, dataset_config in self.data.datasets.items():
+            if dataset_config.kwargs.get("reverse_views") is False:
+                raise ValueError(
+                    f"{model_cls.__name__} reads the reversed modality views, "
+                    f"but reverse_views is disabled for the {split} dataset"
+                )
+            dataset_config.kwargs["reverse_views"] = True
+            logger.debug(f"Enabled reverse views for the {split} dataset ({model_cls.__name__})")
+
     def _display_summary(self) -> None:
         """Display complete configuration summary."""
         console.print(Panel("[bold blue]Experiment Configuration Summary[/]"))
@@ -1,4 +1,7 @@
+import os
 import random
+import shutil
+import tempfile
 from functools import lru_cache
 from os import PathLike
 from pathlib import Path
@@ -8,7 +11,7 @@ import numpy as np
 import pandas as pd
 import torch
 from data.base_dataset import MultimodalBaseDataset
-from data.pattern import PatternSpecificDataset
+from data.pattern import MultiplexedPatternDataset
 from experiment_utils import get_logger
 from matplotlib import cm
 from modalities import Modality
@@ -18,6 +21,113 @@ from torchvision.transforms.v2 import PILToTensor, ToDtype
 
 logger = get_logger()
 
+PACK_MARKER: str = "COMPLETE"
+_PIL_TO_TENSOR = PILToTensor()
+
+
+def decode_image(path: str) -> torch.Tensor:
+    """
+    Decode a pickled AVMNIST digit into its final grayscale image.
+
+    Args:
+        path (str): Path to the image file.
+
+    Returns:
+        torch.Tensor: uint8 tensor of shape (1, H, W).
+    """
+    img_data = np.array(torch.load(path, weights_only=False))
+    img = Image.fromarray(np.uint8(cm.gist_earth(img_data) * 255)).convert("L")
+    return _PIL_TO_TENSOR(img)
+
+
+def csv_fingerprint(data_fp: Path | PathLike) -> str:
+    """Size and modification time of the CSV a pack was built from, stored in the pack marker."""
+    stat = Path(data_fp).stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def pack_avmnist(
+    data_fp: Path | PathLike,
+    pack_dir: Path | PathLike,
+    *,
+    audio_column: str = "audio",
+    image_column: str = "image",
+    labels_column: str = "label",
+    audio_dtype: np.dtype = np.float16,
+) -> Path:
+    """
+    Decode every row of an AVMNIST CSV once and store the results as contiguous ``.npy`` arrays.
+
+    ``image.npy`` holds the decoded uint8 images of shape (N, 1, H, W), ``audio.npy`` the audio spectrograms
+    in `audio_dtype` and ``label.npy`` the int64 labels, all indexed by CSV row. The pack is written to a
+    temporary directory and renamed into place, so concurrent runs either see a complete pack or none at all.
+    The marker file holds the `csv_fingerprint` of the CSV, and a pack of another version of the CSV is rebuilt.
+
+    Args:
+        data_fp (PathLike): Path to the data CSV file.
+        pack_dir (PathLike): Directory to write the pack to.
+        audio_column (str): Name of the audio column in the CSV.
+        image_column (str): Name of the image column in the CSV.
+        labels_column (str): Name of the labels column in the CSV.
+        audio_dtype (np.dtype): Storage dtype of the audio arrays.
+
+    Returns:
+        Path: The pack directory.
+    """
+    data_fp, pack_dir = Path(data_fp), Path(pack_dir)
+    fingerprint = csv_fingerprint(data_fp)
+    marker = pack_dir / PACK_MARKER
+    if marker.exists() and marker.read_text() == fingerprint:
+        return pack_dir
+
+    data = pd.read_csv(data_fp)
+    num_rows = len(data)
+    if num_rows == 0:
+        raise ValueError(f"No rows to pack in {data_fp}")
+
+    pack_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{pack_dir.name}_", dir=pack_dir.parent))
+    stale_dir = None
+    try:
+        first_image = decode_image(data[image_column].iloc[0]).numpy()
+        first_audio = torch.load(data[audio_column].iloc[0], weights_only=True).numpy()
+        images = np.lib.format.open_memmap(
+            tmp_dir / "image.npy", mode="w+", dtype=np.uint8, shape=(num_rows, *first_image.shape)
+        )
+        audio = np.lib.format.open_memmap(
+            tmp_dir / "audio.npy", mode="w+", dtype=audio_dtype, shape=(num_rows, *first_audio.shape)
+        )
+        for row, (image_fp, audio_fp) in enumerate(zip(data[image_column], data[audio_column])):
+            images[row] = decode_image(image_fp).numpy()
+            audio[row] = torch.load(audio_fp, weights_only=True).numpy()
+        images.flush()
+        audio.flush()
+        del images, audio
+        np.save(tmp_dir / "label.npy", data[labels_column].to_numpy(dtype=np.int64))
+
+        (tmp_dir / PACK_MARKER).write_text(fingerprint)
+        if pack_dir.exists():
+            # Pack of an older CSV, moved aside so the new one can be renamed into place
+            stale_dir = Path(tempfile.mkdtemp(prefix=f".{pack_dir.name}_stale_", dir=pack_dir.parent))
+            try:
+                os.rename(pack_dir, stale_dir / pack_dir.name)
+            except FileNotFoundError:
+                pass
+        try:
+            os.rename(tmp_dir, pack_dir)
+        except OSError:
+            # Another process finished packing first
+            if not (marker.exists() and marker.read_text() == fingerprint):
+                raise
+    finally:
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if stale_dir is not None:
+            shutil.rmtree(stale_dir, ignore_errors=True)
+
+    logger.info(f"Packed {num_rows} AVMNIST rows from {data_fp} into {pack_dir}")
+    return pack_dir
+
 
 class AVMNIST(MultimodalBaseDataset):
     """
@@ -55,6 +165,10 @@ class AVMNIST(MultimodalBaseDataset):
         image_column: str = "image",
         labels_column: str = "label",
         split_indices: Optional[List[int]] = None,
+        batch_masking: bool = False,
+        reverse_views: bool = False,
+        packed: bool = False,
+        pack_dir: Optional[Path | PathLike] = None,
     ) -> None:
         """
         Initialize the AVMNIST dataset.
@@ -69,13 +183,23 @@ class AVMNIST(MultimodalBaseDataset):
             image_column (str): Name of the image column in the CSV.
             labels_column (str): Name of the labels column in the CSV.
             split_indices (Optional[List[int]]): Optional indices for dataset splitting.
+            batch_masking (bool): Defer masking to collate time and draw the masks for the whole batch at once.
+            reverse_views (bool): Whether batch masking should also materialise the reversed modality views.
+            packed (bool): Read the decoded images and audio from memory-mapped arrays built by `pack_avmnist`.
+            pack_dir (Optional[PathLike]): Location of the pack, defaults to ``{stem}_packed`` beside the CSV.
         """
         m_patterns = missing_patterns or {
             "ai": {"audio": 1.0, "image": 1.0},  # Both modalities present
             "a": {"audio": 1.0, "image": 0.0},  # Audio only
             "i": {"audio": 0.0, "image": 1.0},  # Image only
         }
-        super().__init__(split=split, selected_patterns=selected_patterns, missing_patterns=m_patterns)
+        super().__init__(
+            split=split,
+            selected_patterns=selected_patterns,
+            missing_patterns=m_patterns,
+            batch_masking=batch_masking,
+            reverse_views=reverse_views,
+        )
 
         assert split in AVMNIST.VALID_SPLITS, f"Invalid split provided, must be one of {AVMNIST.VALID_SPLITS}"
 
@@ -87,10 +211,13 @@ class AVMNIST(MultimodalBaseDataset):
         self.audio_column = audio_column
         self.image_column = image_column
         self.labels_column = labels_column
+        self.packed = packed
+        self.pack_dir = (
+            Path(pack_dir) if pack_dir is not None else self.data_fp.with_name(f"{self.data_fp.stem}_packed")
+        )
 
         # Set up transforms
         self.transforms = {
-            "pil_to_tensor": PILToTensor(),
             "scale": ToDtype(torch.float32, scale=True),
         }
 
@@ -128,6 +255,8 @@ class AVMNIST(MultimodalBaseDataset):
             split_indices (Optional[List[int]]): Optional indices for filtering rows.
         """
         self.data = pd.read_csv(self.data_fp)
+        # CSV row of every sample, which is also its row in the packed arrays
+        self.rows = np.arange(len(self.data)) if split_indices is None else np.asarray(split_indices, dtype=np.int64)
         if split_indices is not None:
             self.data = self.data.iloc[split_indices].reset_index(drop=True)
 
@@ -137,6 +266,35 @@ class AVMNIST(MultimodalBaseDataset):
         if missing_columns:
             raise ValueError(f"Missing required columns: {missing_columns}")
 
+        self._packed_arrays: Dict[str, np.ndarray] = {}
+        if self.packed:
+            self._check_pack()
+
+    def _check_pack(self) -> None:
+        """Build the pack on first use, and rebuild it when the CSV changed since it was packed."""
+        pack_avmnist(
+            self.data_fp,
+            self.pack_dir,
+            audio_column=self.audio_column,
+            image_column=self.image_column,
+            labels_column=self.labels_column,
+        )
+
+    @property
+    def packed_arrays(self) -> Dict[str, np.ndarray]:
+        """Memory-mapped arrays of the pack, opened lazily in every process."""
+        if not self._packed_arrays:
+            self._packed_arrays = {
+                key: np.load(self.pack_dir / f"{key}.npy", mmap_mode="r") for key in ("image", "audio", "label")
+            }
+        return self._packed_arrays
+
+    def __getstate__(self) -> Dict[str, Any]:
+        ## pickling a memmap copies its data, workers started with spawn map the pack themselves
+        state = self.__dict__.copy()
+        state["_packed_arrays"] = {}
+        return state
+
     def __len__(self) -> int:
         """
         Return the total length of the dataset.
@@ -144,10 +302,7 @@ class AVMNIST(MultimodalBaseDataset):
         Returns:
             int: Total number of samples.
         """
-        if self.split == "train":
-            return self.num_samples
-        else:
-            return self.num_samples * len(self.selected_patterns)
+        return self.get_num_rows()
 
     def _get_pattern_and_sample_idx(self, idx: int) -> Tuple[str, int]:
         """
@@ -161,6 +316,8 @@ class AVMNIST(MultimodalBaseDataset):
         """
         if self.split == "train":
             return random.choice(self.selected_patterns), idx
+        elif self.pattern_bucketed:
+            return self.get_full_pattern_name(), idx
         else:
             pattern_idx = idx // self.num_samples
             sample_idx = idx % self.num_samples
@@ -190,10 +347,23 @@ class AVMNIST(MultimodalBaseDataset):
         Returns:
             torch.Tensor: Processed image data as a tensor.
         """
-        img_data = np.array(torch.load(path, weights_only=False))
-        img = Image.fromarray(np.uint8(cm.gist_earth(img_data) * 255)).convert("L")
-        img_tensor = self.transforms["pil_to_tensor"](img)
-        return self.transforms["scale"](img_tensor)
+        return self.transforms["scale"](decode_image(path))
+
+    def _read_packed(self, mod_name: str, sample_idx: int | np.ndarray) -> torch.Tensor:
+        """
+        Read decoded modality data from the pack.
+
+        Args:
+            mod_name (str): "audio" or "image".
+            sample_idx (int | np.ndarray): Sample index, or array of sample indices for a whole batch.
+
+        Returns:
+            torch.Tensor: float32 data, images scaled to [0, 1] as by the unpacked pipeline.
+        """
+        data = torch.from_numpy(np.asarray(self.packed_arrays[mod_name][self.rows[sample_idx]]))
+        if mod_name == "image":
+            return self.transforms["scale"](data)
+        return data.float()
 
     def __getitem__(self, idx: int) -> Dict[str, Any]:
         """
@@ -206,45 +376,83 @@ class AVMNIST(MultimodalBaseDataset):
             Dict[str, Any]: A dictionary containing the sample data and metadata.
         """
         pattern_name, sample_idx = self._get_pattern_and_sample_idx(idx)
-        pattern = self.missing_patterns[pattern_name]
-        row = self.data.iloc[sample_idx]
+        pattern = self.get_pattern(pattern_name)
+
+        if self.packed:
+            label = torch.tensor(self.packed_arrays["label"][self.rows[sample_idx]])
+            modality_loaders = {
+                "audio": (lambda x: self._read_packed("audio", x), Modality.AUDIO),
+                "image": (lambda x: self._read_packed("image", x), Modality.IMAGE),
+            }
+        else:
+            label = torch.tensor(self.data.iloc[sample_idx][self.labels_column])
+            modality_loaders = {
+                "audio": (lambda x: self._load_audio(self.data.iloc[x][self.audio_column]), Modality.AUDIO),
+                "image": (lambda x: self._load_image(self.data.iloc[x][self.image_column]), Modality.IMAGE),
+            }
 
         sample = {
-            "label": torch.tensor(row[self.labels_column]),
+            "label": label,
             "pattern_name": pattern_name,
             "missing_mask": {},
             "sample_idx": sample_idx,
         }
 
         # Load and apply masking for each modality
-        modality_loaders = {
-            "audio": (lambda x: self._load_audio(self.data.iloc[x][self.audio_column]), Modality.AUDIO),
-            "image": (lambda x: self._load_image(self.data.iloc[x][self.image_column]), Modality.IMAGE),
-        }
         sample = self.get_sample_and_apply_mask(pattern, sample, modality_loaders, sample_idx)
         return sample
 
-    def get_pattern_batches(self, batch_size: int, **dataloader_kwargs) -> Dict[str, DataLoader]:
+    def __getitems__(self, indices: List[int]) -> Dict[str, Any] | List[Dict[str, Any]]:
+        """
+        Get a whole batch with a single fancy-index into each packed array.
+
+        Only used when `batched_indexing` is enabled and the dataset is packed; otherwise this falls back to
+        per-sample `__getitem__` calls. Missing patterns are applied to the batch by the masking engine.
+
+        Args:
+            indices (List[int]): Dataset indices of the batch.
+
+        Returns:
+            Dict[str, Any] | List[Dict[str, Any]]: The collated batch, or the list of samples when not batched.
+        """
+        if not (self.batched_indexing and self.packed):
+            return [self[idx] for idx in indices]
+
+        pattern_names, sample_idx = self._get_patterns_and_sample_indices(indices)
+        batch = {
+            "label": torch.from_numpy(np.asarray(self.packed_arrays["label"][self.rows[sample_idx]])),
+            "pattern_name": pattern_names,
+            "missing_mask": {},
+            "sample_idx": torch.from_numpy(sample_idx),
+        }
+        for mod_name, mod_enum in self.AVAILABLE_MODALITIES.items():
+            if self.target_modality == Modality.MULTIMODAL or self.target_modality == mod_enum:
+                batch[mod_enum] = self._read_packed(mod_name, sample_idx)
+
+        return batch if self.pattern_bucketed else self.masking_engine.apply(batch)
+
+    def get_pattern_batches(self, batch_size: int, **dataloader_kwargs) -> DataLoader:
         """
-        Get separate DataLoaders for each pattern.
+        Get a single DataLoader that evaluates every selected pattern in one pass over the data.
+
+        Each sample is decoded once and fanned out to all selected patterns inside its batch (see
+        `MultiplexedPatternDataset`), so a batch holds ``batch_size * len(selected_patterns)`` rows tagged with
+        their "pattern_name".
 
         Args:
-            batch_size (int): Batch size for the DataLoader.
+            batch_size (int): Number of samples per batch, before the fan-out.
             **dataloader_kwargs: Additional DataLoader keyword arguments.
 
         Returns:
-            Dict[str, DataLoader]: A dictionary of DataLoaders for each pattern.
+            DataLoader: DataLoader over the multiplexed view of the dataset.
         """
         if self.split == "train":
             raise ValueError("Pattern-specific batches only available for validation/test")
 
-        pattern_loaders = {}
-        for pattern in self.selected_patterns:
-            pattern_dataset = PatternSpecificDataset(self, pattern)
-            pattern_loaders[pattern] = DataLoader(
-                pattern_dataset, batch_size=batch_size, shuffle=False, collate_fn=self.collate_fn, **dataloader_kwargs
-            )
-        return pattern_loaders
+        multiplexed = MultiplexedPatternDataset(self)
+        return DataLoader(
+            multiplexed, batch_size=batch_size, shuffle=False, collate_fn=multiplexed.collate, **dataloader_kwargs
+        )
 
     def collate_fn(self, batch: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
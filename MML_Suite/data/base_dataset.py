@@ -1,19 +1,30 @@
 import random
-from itertools import Dict, combinations
-from typing import Any, Callable, List, Literal, Optional, Tuple
+from collections.abc import Mapping
+from itertools import combinations
+from typing import Any, Callable, Dict, List, Literal, Optional, Sequence, Tuple
 
+import numpy as np
+from data.masking import BatchMaskingEngine
 from modalities import Modality
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, default_collate
 
 
 class MultimodalBaseDataset(Dataset):
     """Base class for multimodal datasets with mi ssing modality support."""
 
+    # Set by DataConfig when the dataloader uses a whole-batch index sampler, see `__getitems__` in the subclasses
+    batched_indexing: bool = False
+    # Set by DataConfig for pattern-bucketed evaluation: every sample is returned once, unmasked, and the
+    # model evaluates all selected patterns from a single encoder pass (see `get_bucketed_patterns`)
+    pattern_bucketed: bool = False
+
     def __init__(
         self,
         split: Literal["train", "valid", "test"],
         selected_patterns: Optional[List[str]] = None,
         missing_patterns: Optional[Dict[str, Dict[str, float]]] = None,
+        batch_masking: bool = False,
+        reverse_views: bool = False,
     ) -> None:
         self.split = split.lower()
         assert split in self.VALID_SPLITS, f"Invalid split provided, must be one of {self.VALID_SPLITS}"
@@ -30,14 +41,59 @@ class MultimodalBaseDataset(Dataset):
             del self.missing_patterns["m"]
         self.pattern_indices = None
 
+        # When enabled, samples are returned unmasked and the masks are drawn for the whole batch in `collate`
+        self.batch_masking = batch_masking
+        self.reverse_views = reverse_views
+        self._masking_engine: Optional[BatchMaskingEngine] = None
+
+    @property
+    def masking_engine(self) -> BatchMaskingEngine:
+        """Lazily built collate-time masking engine (target modality is only known after subclass init)."""
+        if self._masking_engine is None:
+            self._masking_engine = BatchMaskingEngine(
+                self.missing_patterns,
+                self.AVAILABLE_MODALITIES,
+                self.split,
+                target_modality=getattr(self, "target_modality", Modality.MULTIMODAL),
+                with_reverse=self.reverse_views,
+            )
+        return self._masking_engine
+
+    def collate(self, batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Collate a list of samples, applying the missing patterns to the whole batch when batch masking is enabled.
+
+        Args:
+            batch (List[Dict[str, Any]]): List of samples.
+
+        Returns:
+            Dict[str, Any]: Collated batch.
+        """
+        if isinstance(batch, Mapping):
+            # Already collated by a batched `__getitems__`
+            return batch
+        collated = default_collate(batch)
+        if self.batch_masking and not self.pattern_bucketed:
+            collated = self.masking_engine.apply(collated)
+        return collated
+
     def get_sample_and_apply_mask(
-        self, pattern: str, sample, modality_loaders: Dict[str, Tuple[Callable, Modality]]
+        self,
+        pattern: Dict[str, float],
+        sample: Dict[str, Any],
+        modality_loaders: Dict[str, Tuple[Callable, Modality]],
+        idx: Optional[int] = None,
     ) -> Dict[str, Any]:
         """Load data for each modality and apply masking."""
         for mod_name, (loader_fn, mod_enum) in modality_loaders.items():
             if self.target_modality == Modality.MULTIMODAL or self.target_modality == mod_enum:
                 # Load data
-                data = loader_fn()
+                data = loader_fn(idx) if idx is not None else loader_fn()
+
+                if self.batch_masking:
+                    # Masking is deferred to `collate`, which draws it for the whole batch
+                    sample[mod_enum] = data
+                    continue
 
                 # Apply masking
                 if mod_name in pattern:
@@ -65,11 +121,74 @@ class MultimodalBaseDataset(Dataset):
         """
         if self.split == "train":
             return random.choice(self.selected_patterns), idx
+        elif self.pattern_bucketed:
+            return self.get_full_pattern_name(), idx
         else:
             pattern_idx = idx // self.num_samples
             sample_idx = idx % self.num_samples
             return self.selected_patterns[pattern_idx], sample_idx
 
+    def _get_patterns_and_sample_indices(self, indices: Sequence[int]) -> Tuple[List[str], np.ndarray]:
+        """
+        Batched version of `_get_pattern_and_sample_idx`.
+
+        Args:
+            indices (Sequence[int]): Dataset indices of the batch.
+
+        Returns:
+            Tuple[List[str], np.ndarray]: Pattern name and sample index of every dataset index.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if self.split == "train":
+            return random.choices(self.selected_patterns, k=len(indices)), indices
+        if self.pattern_bucketed:
+            return [self.get_full_pattern_name()] * len(indices), indices
+        pattern_names = [self.selected_patterns[p] for p in (indices // self.num_samples).tolist()]
+        return pattern_names, indices % self.num_samples
+
+    def get_pattern(self, pattern_name: str) -> Dict[str, float]:
+        """
+        Get the per-modality presence probabilities of a pattern.
+
+        Args:
+            pattern_name (str): Name of the pattern.
+
+        Returns:
+            Dict[str, float]: Presence probability of each modality. All ones when pattern-bucketed.
+        """
+        if self.pattern_bucketed:
+            return {mod_name: 1.0 for mod_name in self.AVAILABLE_MODALITIES}
+        return self.missing_patterns[pattern_name]
+
+    @classmethod
+    def get_full_pattern_name(cls) -> str:
+        """Return the name of the pattern with every modality present."""
+        return "".join(sorted(mod_name[0] for mod_name in cls.AVAILABLE_MODALITIES))
+
+    def get_bucketed_patterns(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get the patterns a model has to evaluate for every sample in pattern-bucketed mode.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Selected pattern names mapped to their per-modality presence.
+        """
+        return {pattern: self.missing_patterns[pattern] for pattern in self.selected_patterns}
+
+    def get_num_rows(self) -> int:
+        """Number of rows: one per sample for training and bucketed evaluation, otherwise one per sample and pattern."""
+        if self.split == "train" or self.pattern_bucketed:
+            return self.num_samples
+        return self.num_samples * len(self.selected_patterns)
+
+    def get_sequence_lengths(self) -> Optional[np.ndarray]:
+        """
+        Sequence length of every dataset row, used by `LengthBucketBatchSampler`.
+
+        Returns:
+            Optional[np.ndarray]: Length per row (see `get_num_rows`), or None if the samples are not variable-length.
+        """
+        return None
+
     def set_pattern_indices(self, n_samples: int) -> None:
         # For validation/test, organize samples by pattern
         if self.split != "train":
@@ -0,0 +1,109 @@
+from typing import Any, Dict, List, Sequence
+
+import torch
+from modalities import Modality
+from torch import Tensor
+
+
+class BatchMaskingEngine:
+    """
+    Collate-time masking stage that applies missing-modality patterns to a whole batch at once.
+
+    The per-pattern modality probabilities are stored as a single ``(P, M)`` table. For a batch of
+    ``B`` samples the pattern names are mapped to integer codes, the ``(B, M)`` probability rows are
+    gathered in one indexing op and (for the training split) a Bernoulli draw is taken over the whole
+    matrix. Each modality tensor is then masked by broadcasting its column of the mask, so no
+    per-sample Python work or per-sample tensor copies are required.
+    """
+
+    def __init__(
+        self,
+        missing_patterns: Dict[str, Dict[str, float]],
+        modalities: Dict[str, Modality],
+        split: str,
+        *,
+        target_modality: Modality = Modality.MULTIMODAL,
+        with_reverse: bool = False,
+    ) -> None:
+        """
+        Initialize the masking engine.
+
+        Args:
+            missing_patterns (Dict[str, Dict[str, float]]): Mapping of pattern name to per-modality presence probability.
+            modalities (Dict[str, Modality]): Available modalities of the dataset, keyed by name.
+            split (str): Dataset split. Masks are sampled for "train" and used as-is otherwise.
+            target_modality (Modality): Target modality of the dataset. Only this modality is masked unless MULTIMODAL.
+            with_reverse (bool): Whether to materialise the ``{modality}_reverse`` views of the batch.
+        """
+        self.modalities = modalities
+        self.split = split
+        self.target_modality = target_modality
+        self.with_reverse = with_reverse
+
+        self.pattern_names: List[str] = list(missing_patterns.keys())
+        self.pattern_codes: Dict[str, int] = {name: code for code, name in enumerate(self.pattern_names)}
+        self.probabilities = torch.tensor(
+            [[missing_patterns[name].get(mod_name, 0.0) for mod_name in modalities] for name in self.pattern_names],
+            dtype=torch.float32,
+        )
+
+    def encode(self, pattern_names: Sequence[str]) -> Tensor:
+        """
+        Convert pattern names to integer pattern codes.
+
+        Args:
+            pattern_names (Sequence[str]): Pattern name of every sample in the batch.
+
+        Returns:
+            Tensor: Long tensor of shape (B,) with the code of each pattern.
+        """
+        return torch.tensor([self.pattern_codes[name] for name in pattern_names], dtype=torch.long)
+
+    def draw(self, codes: Tensor) -> Tensor:
+        """
+        Draw the modality mask for a batch of pattern codes.
+
+        Args:
+            codes (Tensor): Long tensor of shape (B,) with the pattern code of each sample.
+
+        Returns:
+            Tensor: Float tensor of shape (B, M), 1.0 where a modality is present.
+        """
+        probabilities = self.probabilities[codes]
+        if self.split == "train":
+            return torch.bernoulli(probabilities)
+        return probabilities
+
+    def apply(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Mask every modality of a collated batch.
+
+        Args:
+            batch (Dict[str, Any]): Collated batch holding the raw modality tensors and the "pattern_name" list.
+
+        Returns:
+            Dict[str, Any]: The batch with masked modalities, "missing_mask" and "pattern_code" entries.
+        """
+        codes = self.encode(batch["pattern_name"])
+        mask = self.draw(codes)
+
+        batch["pattern_code"] = codes
+        batch["missing_mask"] = {}
+        for column, mod_enum in enumerate(self.modalities.values()):
+            if self.target_modality != Modality.MULTIMODAL and self.target_modality != mod_enum:
+                continue
+            if mod_enum not in batch:
+                continue
+
+            data = batch[mod_enum]
+            mod_mask = mask[:, column]
+            masked = data * mod_mask.view(-1, *([1] * (data.dim() - 1)))
+
+            batch[mod_enum] = masked
+            ## the original view was always identical to the masked one, share the tensor instead of copying it
+            batch[f"{str(mod_enum)}_original"] = masked
+            if self.with_reverse:
+                batch[f"{str(mod_enum)}_reverse"] = data - masked
+            batch["missing_mask"][mod_enum] = mod_mask
+
+        return batch
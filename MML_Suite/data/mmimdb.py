@@ -1,11 +1,15 @@
+import os
+from collections import OrderedDict
 from os import PathLike
 from pathlib import Path
-from typing import Any, Dict, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
 
 import h5py as h5
+import numpy as np
 import torch
 from data.base_dataset import MultimodalBaseDataset
 from modalities import Modality
+from torch.utils.data import get_worker_info
 
 
 class MMIMDb(MultimodalBaseDataset):
@@ -50,6 +54,10 @@ class MMIMDb(MultimodalBaseDataset):
         text_key: str = "features",
         labels_key: str = "genres",
         imdb_ids_key: str = "imdb_ids",
+        batch_masking: bool = False,
+        reverse_views: bool = False,
+        block_cache_blocks: int = 0,
+        block_rows: Optional[int] = None,
     ):
         """
         Initialize the MMIMDb dataset.
@@ -64,14 +72,30 @@ class MMIMDb(MultimodalBaseDataset):
             text_key (str): Key for text features in the HDF5 file.
             labels_key (str): Key for labels in the HDF5 file.
             imdb_ids_key (str): Key for IMDb IDs in the HDF5 file.
+            batch_masking (bool): Defer masking to collate time and draw the masks for the whole batch at once.
+            reverse_views (bool): Whether batch masking should also materialise the reversed modality views.
+            block_cache_blocks (int): Number of row blocks kept in the per-process LRU block cache, 0 disables it.
+            block_rows (Optional[int]): Rows per cached block, defaults to the HDF5 chunk size of each key.
         """
         m_patterns = missing_patterns or {
             "it": {"image": 1.0, "text": 1.0},  # Both modalities present
             "i": {"image": 1.0, "text": 0.0},  # Image only
             "t": {"image": 0.0, "text": 1.0},  # Text only
         }
-        super().__init__(split=split, selected_patterns=selected_patterns, missing_patterns=m_patterns)
-        self.data = h5.File(Path(data_fp), "r")
+        super().__init__(
+            split=split,
+            selected_patterns=selected_patterns,
+            missing_patterns=m_patterns,
+            batch_masking=batch_masking,
+            reverse_views=reverse_views,
+        )
+        self.data_fp = Path(data_fp)
+        self.block_cache_blocks = block_cache_blocks
+        self.block_rows = block_rows
+        # The HDF5 handle is opened lazily in every process that reads from it (see `data`), never inherited
+        self._file: Optional[h5.File] = None
+        self._file_pid: Optional[int] = None
+        self._block_cache: OrderedDict[Tuple[str, int], np.ndarray] = OrderedDict()
 
         if isinstance(target_modality, str):
             target_modality = Modality.from_str(target_modality)
@@ -84,6 +108,7 @@ class MMIMDb(MultimodalBaseDataset):
         ], "Invalid modality provided, must be one of [text, image, multimodal]"
 
         self.modality = target_modality
+        self.target_modality = target_modality
         self.split = split
 
         # Ensure required keys exist in the dataset
@@ -96,6 +121,87 @@ class MMIMDb(MultimodalBaseDataset):
         self.text_features = text_key
         self.image_features = image_key
         self.labels = labels_key
+        self.num_samples = len(self.data[labels_key])
+        # Close the handle again so forked dataloader workers do not share it
+        self.close()
+
+    @property
+    def data(self) -> h5.File:
+        """HDF5 handle of the current process, opened on first access."""
+        if self._file is None or self._file_pid != os.getpid():
+            self._file = h5.File(self.data_fp, "r")
+            self._file_pid = os.getpid()
+            self._block_cache.clear()
+        return self._file
+
+    def close(self) -> None:
+        """Close the HDF5 handle of the current process."""
+        if self._file is not None and self._file_pid == os.getpid():
+            self._file.close()
+        self._file = None
+        self._file_pid = None
+        self._block_cache.clear()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        ## handles and cached blocks are per process, workers started with spawn open their own
+        state = self.__dict__.copy()
+        state["_file"], state["_file_pid"], state["_block_cache"] = None, None, OrderedDict()
+        return state
+
+    @staticmethod
+    def worker_init_fn(worker_id: int) -> None:
+        """DataLoader `worker_init_fn` opening the HDF5 handle of each worker up front."""
+        worker_info = get_worker_info()
+        if worker_info is not None:
+            worker_info.dataset.data  # opens the handle
+
+    def _block_size(self, key: str) -> int:
+        if self.block_rows is not None:
+            return self.block_rows
+        chunks = self.data[key].chunks
+        return chunks[0] if chunks else 256
+
+    def _read_block(self, key: str, block: int, block_size: int) -> np.ndarray:
+        cache_key = (key, block)
+        if cache_key in self._block_cache:
+            self._block_cache.move_to_end(cache_key)
+            return self._block_cache[cache_key]
+
+        values = self.data[key][block * block_size : (block + 1) * block_size]
+        self._block_cache[cache_key] = values
+        if len(self._block_cache) > self.block_cache_blocks:
+            self._block_cache.popitem(last=False)
+        return values
+
+    def _read_rows(self, key: str, rows: Sequence[int]) -> np.ndarray:
+        """
+        Read sorted, unique rows of a key in as few large reads as possible.
+
+        With the block cache, every touched block is read whole (chunk-aligned) and kept in the LRU cache.
+        Otherwise each run of consecutive rows is read as one contiguous hyperslab.
+
+        Args:
+            key (str): HDF5 key.
+            rows (Sequence[int]): Sorted, unique row indices.
+
+        Returns:
+            np.ndarray: The rows, in the given order.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.block_cache_blocks > 0:
+            block_size = self._block_size(key)
+            blocks = rows // block_size
+            return np.concatenate(
+                [
+                    self._read_block(key, block, block_size)[rows[blocks == block] - block * block_size]
+                    for block in np.unique(blocks).tolist()
+                ]
+            )
+
+        run_starts = np.flatnonzero(np.diff(rows, prepend=-2) != 1)
+        run_ends = np.append(run_starts[1:], rows.size)
+        dataset = self.data[key]
+        return np.concatenate([dataset[rows[start] : rows[end - 1] + 1] for start, end in zip(run_starts, run_ends)])
 
     def _load_image(self, idx: int) -> torch.Tensor:
         """
@@ -107,7 +213,7 @@ class MMIMDb(MultimodalBaseDataset):
         Returns:
             torch.Tensor: Image features tensor.
         """
-        return torch.as_tensor(self.data[self.image_features][idx]).float()
+        return torch.as_tensor(self._read_rows(self.image_features, [idx])[0]).float()
 
     def _load_text(self, idx: int) -> torch.Tensor:
         """
@@ -119,7 +225,7 @@ class MMIMDb(MultimodalBaseDataset):
         Returns:
             torch.Tensor: Text features tensor.
         """
-        return torch.as_tensor(self.data[self.text_features][idx]).float()
+        return torch.as_tensor(self._read_rows(self.text_features, [idx])[0]).float()
 
     def _load_label(self, idx: int) -> torch.Tensor:
         """
@@ -131,7 +237,7 @@ class MMIMDb(MultimodalBaseDataset):
         Returns:
             torch.Tensor: Label tensor.
         """
-        return torch.as_tensor(self.data[self.labels][idx]).float()
+        return torch.as_tensor(self._read_rows(self.labels, [idx])[0]).float()
 
     def _load_id(self, idx: int) -> str:
         """
@@ -155,12 +261,12 @@ class MMIMDb(MultimodalBaseDataset):
         Returns:
             Dict[str, Any]: A dictionary containing sample data and metadata.
         """
-        pattern, idx = self._get_pattern_and_sample_idx(idx)
-        pattern = self.missing_patterns[pattern]
+        pattern_name, idx = self._get_pattern_and_sample_idx(idx)
+        pattern = self.get_pattern(pattern_name)
         label = self._load_label(idx)
         sample = {
             "label": label,
-            "pattern_name": pattern,
+            "pattern_name": pattern_name,
             "missing_mask": {},
             "sample_idx": idx,
         }
@@ -172,6 +278,43 @@ class MMIMDb(MultimodalBaseDataset):
         sample = self.get_sample_and_apply_mask(pattern, sample, modality_loaders, idx=idx)
         return sample
 
+    def __getitems__(self, indices: List[int]) -> Dict[str, Any] | List[Dict[str, Any]]:
+        """
+        Get a whole batch with a single HDF5 read per key.
+
+        The batch is read in sorted order, as contiguous slabs of consecutive rows (or whole cached blocks),
+        and scattered back into sampler order. Only used when `batched_indexing` is enabled, otherwise this
+        falls back to per-sample `__getitem__` calls.
+
+        Args:
+            indices (List[int]): Dataset indices of the batch.
+
+        Returns:
+            Dict[str, Any] | List[Dict[str, Any]]: The collated batch, or the list of samples when not batched.
+        """
+        if not self.batched_indexing:
+            return [self[idx] for idx in indices]
+
+        pattern_names, sample_idx = self._get_patterns_and_sample_indices(indices)
+        unique_idx, inverse = np.unique(sample_idx, return_inverse=True)
+
+        def _read(key: str) -> torch.Tensor:
+            return torch.as_tensor(self._read_rows(key, unique_idx)[inverse]).float()
+
+        batch = {
+            "label": _read(self.labels),
+            "pattern_name": pattern_names,
+            "missing_mask": {},
+            "sample_idx": torch.from_numpy(sample_idx),
+        }
+
+        modality_keys = {Modality.IMAGE: self.image_features, Modality.TEXT: self.text_features}
+        for mod_enum, key in modality_keys.items():
+            if self.target_modality == Modality.MULTIMODAL or self.target_modality == mod_enum:
+                batch[mod_enum] = _read(key)
+
+        return batch if self.pattern_bucketed else self.masking_engine.apply(batch)
+
     def __len__(self) -> int:
         """
         Get the length of the dataset.
@@ -179,4 +322,4 @@ class MMIMDb(MultimodalBaseDataset):
         Returns:
             int: Number of samples in the dataset.
         """
-        return self.num_samples if self.split == "train" else self.num_samples * len(self.selected_patterns)
+        return self.get_num_rows()
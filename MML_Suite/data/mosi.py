@@ -1,8 +1,12 @@
+import os
 import pickle
+import shutil
+import tempfile
 from os import PathLike
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+import numpy as np
 import torch
 from data.base_dataset import MultimodalBaseDataset
 from experiment_utils import get_logger
@@ -13,6 +17,79 @@ logger = get_logger()
 
 add_modality("video")
 
+MEMMAP_CACHE_MARKER: str = "COMPLETE"
+
+
+def source_fingerprint(data_fp: Path | PathLike) -> str:
+    """Size and modification time of a source file, recorded in a cache marker to detect a changed source."""
+    stat = Path(data_fp).stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def build_memmap_cache(data_fp: Path | PathLike, cache_dir: Path | PathLike) -> Path:
+    """
+    Convert a MOSI/MOSEI pickle into a per-split, per-key directory of ``.npy`` files.
+
+    Every numeric entry of every split is written as ``{cache_dir}/{split}/{key}.npy`` (floating point
+    arrays are stored as float32). The cache is written to a temporary directory and renamed into place,
+    so concurrent runs on the same node either see a complete cache or none at all. The marker file holds the
+    `source_fingerprint` of the pickle, and a cache built from another version of the pickle is replaced.
+
+    Args:
+        data_fp (PathLike): Path to the pickled dataset.
+        cache_dir (PathLike): Directory to write the cache to.
+
+    Returns:
+        Path: The cache directory.
+    """
+    data_fp, cache_dir = Path(data_fp), Path(cache_dir)
+    fingerprint = source_fingerprint(data_fp)
+    marker = cache_dir / MEMMAP_CACHE_MARKER
+    if marker.exists() and marker.read_text() == fingerprint:
+        return cache_dir
+
+    with open(data_fp, "rb") as f:
+        raw_data = pickle.load(f)
+
+    cache_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{cache_dir.name}_", dir=cache_dir.parent))
+    stale_dir = None
+    try:
+        for split, split_data in raw_data.items():
+            (tmp_dir / split).mkdir()
+            for key, value in split_data.items():
+                try:
+                    array = np.asarray(value)
+                except ValueError:
+                    continue
+                if array.dtype.kind not in "biuf":
+                    continue
+                if array.dtype.kind == "f":
+                    array = array.astype(np.float32, copy=False)
+                np.save(tmp_dir / split / f"{key}.npy", np.ascontiguousarray(array))
+        (tmp_dir / MEMMAP_CACHE_MARKER).write_text(fingerprint)
+        if cache_dir.exists():
+            # Stale cache of an older pickle, moved aside so the new one can be renamed into place
+            stale_dir = Path(tempfile.mkdtemp(prefix=f".{cache_dir.name}_stale_", dir=cache_dir.parent))
+            try:
+                os.rename(cache_dir, stale_dir / cache_dir.name)
+            except FileNotFoundError:
+                pass
+        try:
+            os.rename(tmp_dir, cache_dir)
+        except OSError:
+            # Another process finished the conversion first
+            if not (marker.exists() and marker.read_text() == fingerprint):
+                raise
+    finally:
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if stale_dir is not None:
+            shutil.rmtree(stale_dir, ignore_errors=True)
+
+    logger.info(f"Built memory-mapped cache for {data_fp} at {cache_dir}")
+    return cache_dir
+
 
 class MultimodalSentimentDataset(MultimodalBaseDataset):
     """
@@ -42,6 +119,10 @@ class MultimodalSentimentDataset(MultimodalBaseDataset):
         aligned: bool = False,
         length: Optional[int] = None,
         num_classes: Optional[int] = None,
+        batch_masking: bool = False,
+        reverse_views: bool = False,
+        memmap: bool = False,
+        cache_dir: Optional[Path | PathLike] = None,
     ) -> None:
         """
         Initialize the Multimodal Sentiment Dataset.
@@ -56,6 +137,10 @@ class MultimodalSentimentDataset(MultimodalBaseDataset):
             aligned (bool): Whether the data is aligned across modalities.
             length (Optional[int]): Length of aligned sequences.
             num_classes (Optional[int]): Number of output classes (overrides default).
+            batch_masking (bool): Defer masking to collate time and draw the masks for the whole batch at once.
+            reverse_views (bool): Whether batch masking should also materialise the reversed modality views.
+            memmap (bool): Read the data from a memory-mapped ``.npy`` cache instead of unpickling the whole file.
+            cache_dir (Optional[PathLike]): Location of the ``.npy`` cache, defaults to ``{stem}_npy`` beside the pickle.
         """
         # Set up missing patterns
         m_patterns = missing_patterns or {
@@ -72,12 +157,22 @@ class MultimodalSentimentDataset(MultimodalBaseDataset):
         if num_classes is not None:
             self.NUM_CLASSES = num_classes
 
-        super().__init__(split=split, selected_patterns=selected_patterns, missing_patterns=m_patterns)
+        super().__init__(
+            split=split,
+            selected_patterns=selected_patterns,
+            missing_patterns=m_patterns,
+            batch_masking=batch_masking,
+            reverse_views=reverse_views,
+        )
 
         self.data_fp = Path(data_fp)
         self.aligned = aligned
         self.length = length if aligned else None
         self.labels_key = labels_key
+        self.memmap = memmap
+        self.cache_dir = (
+            Path(cache_dir) if cache_dir is not None else self.data_fp.with_name(f"{self.data_fp.stem}_npy")
+        )
 
         # Process target modality
         if isinstance(target_modality, str):
@@ -116,6 +211,9 @@ class MultimodalSentimentDataset(MultimodalBaseDataset):
         Returns:
             Dict[str, torch.Tensor]: Dictionary of tensors for each modality and labels.
         """
+        if self.memmap:
+            return self._load_memmap_data(labels_key)
+
         if not self.data_fp.exists():
             raise FileNotFoundError(f"Data file not found: {self.data_fp}")
 
@@ -148,6 +246,53 @@ class MultimodalSentimentDataset(MultimodalBaseDataset):
             }
         )
 
+    def _load_memmap_data(self, labels_key: str) -> Dict[str, torch.Tensor]:
+        """
+        Load the split from the memory-mapped ``.npy`` cache, building the cache on first use.
+
+        The arrays are opened copy-on-write, so the tensors share their pages with every other process
+        reading the same cache through the OS page cache.
+
+        Args:
+            labels_key (str): Key to access labels in the data.
+
+        Returns:
+            Dict[str, torch.Tensor]: Dictionary of tensors for each modality and labels.
+        """
+        if self.data_fp.exists():
+            # Reuses the cache unless it was built from another version of the pickle
+            build_memmap_cache(self.data_fp, self.cache_dir)
+        elif not (self.cache_dir / MEMMAP_CACHE_MARKER).exists():
+            raise FileNotFoundError(f"Data file not found: {self.data_fp}")
+
+        split_dir = self.cache_dir / self.split
+        if not split_dir.exists():
+            raise KeyError(f"Split '{self.split}' not found in data")
+        if not (split_dir / f"{labels_key}.npy").exists():
+            raise KeyError(f"Labels key '{labels_key}' not found in data")
+
+        def _open(key: str) -> torch.Tensor:
+            # Served as float like the pickled path; float32 arrays stay memory-mapped, integer ones are copied
+            return torch.from_numpy(np.load(split_dir / f"{key}.npy", mmap_mode="c")).float()
+
+        labels = np.load(split_dir / f"{labels_key}.npy", mmap_mode="r")
+        core_data = {
+            Modality.AUDIO: _open("audio"),
+            Modality.VIDEO: _open("vision"),
+            Modality.TEXT: _open("text"),
+            "label": torch.tensor(labels, dtype=torch.float32 if "regression" in self.labels_key else torch.long),
+        }
+
+        return (
+            core_data
+            if self.aligned
+            else core_data
+            | {
+                "audio_lengths": _open("audio_lengths"),
+                "video_lengths": _open("vision_lengths"),
+            }
+        )
+
     def __len__(self) -> int:
         """
         Return the total number of samples in the dataset.
@@ -155,7 +300,7 @@ class MultimodalSentimentDataset(MultimodalBaseDataset):
         Returns:
             int: Number of samples.
         """
-        return self.num_samples if self.split == "train" else self.num_samples * len(self.selected_patterns)
+        return self.get_num_rows()
 
     def __getitem__(self, idx: int) -> Dict[str, Any]:
         """
@@ -168,7 +313,7 @@ class MultimodalSentimentDataset(MultimodalBaseDataset):
             Dict[str, Any]: A dictionary containing the sample data and metadata.
         """
         pattern_name, sample_idx = self._get_pattern_and_sample_idx(idx)
-        pattern = self.missing_patterns[pattern_name]
+        pattern = self.get_pattern(pattern_name)
 
         sample = {
             "label": self.data["label"][sample_idx],
@@ -190,6 +335,55 @@ class MultimodalSentimentDataset(MultimodalBaseDataset):
         sample = self.get_sample_and_apply_mask(pattern=pattern, sample=sample, modality_loaders=modality_loaders)
         return sample
 
+    def __getitems__(self, indices: List[int]) -> Dict[str, Any] | List[Dict[str, Any]]:
+        """
+        Get a whole batch with a single fancy-index per modality.
+
+        Only used when `batched_indexing` is enabled (see `DataConfig.build_dataloader`); otherwise this
+        falls back to per-sample `__getitem__` calls, which is what the DataLoader would do by default.
+        Missing patterns are applied to the batch by the masking engine.
+
+        Args:
+            indices (List[int]): Dataset indices of the batch.
+
+        Returns:
+            Dict[str, Any] | List[Dict[str, Any]]: The collated batch, or the list of samples when not batched.
+        """
+        if not self.batched_indexing:
+            return [self[idx] for idx in indices]
+
+        pattern_names, sample_idx = self._get_patterns_and_sample_indices(indices)
+        sample_idx = torch.from_numpy(sample_idx)
+
+        batch = {
+            "label": self.data["label"][sample_idx],
+            "pattern_name": pattern_names,
+            "missing_mask": {},
+            "sample_idx": sample_idx,
+        }
+
+        if not self.aligned:
+            batch["audio_length"] = self.data["audio_lengths"][sample_idx]
+            batch["video_length"] = self.data["video_lengths"][sample_idx]
+
+        for mod_enum in self.AVAILABLE_MODALITIES.values():
+            if self.target_modality == Modality.MULTIMODAL or self.target_modality == mod_enum:
+                batch[mod_enum] = self.data[mod_enum][sample_idx]
+
+        return batch if self.pattern_bucketed else self.masking_engine.apply(batch)
+
+    def get_sequence_lengths(self) -> Optional[np.ndarray]:
+        """
+        Longest of the audio and video lengths of every dataset row.
+
+        Returns:
+            Optional[np.ndarray]: Length per row, or None for aligned data where all sequences share one length.
+        """
+        if self.aligned:
+            return None
+        lengths = torch.maximum(self.data["audio_lengths"], self.data["video_lengths"]).long().numpy()
+        return np.tile(lengths, self.get_num_rows() // self.num_samples)
+
     def collate_fn(self, batch: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Collate a batch of samples with pattern-aware batching.
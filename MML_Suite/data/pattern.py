@@ -1,6 +1,9 @@
-from typing import Any, Dict
+import copy
+from collections.abc import Mapping
+from typing import Any, Dict, List
 
 from data.base_dataset import MultimodalBaseDataset
+from torch import Tensor
 
 
 class PatternSpecificDataset(MultimodalBaseDataset):
@@ -17,3 +20,75 @@ class PatternSpecificDataset(MultimodalBaseDataset):
     def __getitem__(self, idx: int) -> Dict[str, Any]:
         real_idx = idx + (self.parent.selected_patterns.index(self.pattern) * self.parent.num_samples)
         return self.parent[real_idx]
+
+
+def _repeat(value: Any, times: int) -> Any:
+    """Repeat every per-sample entry of a collated batch ``times`` times along the batch dimension."""
+    if isinstance(value, Tensor) and value.dim() > 0:
+        return value.repeat(times, *([1] * (value.dim() - 1)))
+    if isinstance(value, Mapping):
+        return {key: _repeat(v, times) for key, v in value.items()}
+    if isinstance(value, list):
+        return value * times
+    return value
+
+
+def _is_masked_view(key: Any) -> bool:
+    """Whether a batch entry is derived from the missing pattern of its rows (masks, original and reverse views)."""
+    return key in ("pattern_name", "missing_mask") or (
+        isinstance(key, str) and key.endswith(("_original", "_reverse"))
+    )
+
+
+class MultiplexedPatternDataset(MultimodalBaseDataset):
+    """
+    Evaluation view of the main dataset that loads every sample once and fans it out to all selected patterns.
+
+    Samples are read unmasked (as in pattern-bucketed mode), and `collate` repeats a batch of ``B`` samples once
+    per selected pattern, giving ``B * P`` rows ordered pattern by pattern. The rows are tagged with their
+    "pattern_name" and masked by the parent's masking engine, so the model sees an ordinary masked batch and
+    `MetricRecorder.update_all` splits the results per pattern.
+    """
+
+    def __init__(self, parent_dataset: MultimodalBaseDataset):
+        if parent_dataset.split == "train":
+            raise ValueError("Multiplexed pattern batches are only available for validation/test")
+        self.parent = parent_dataset
+        self.patterns: List[str] = list(parent_dataset.selected_patterns)
+        ## a shallow copy shares the loaded data but returns every sample once and unmasked
+        self.source = copy.copy(parent_dataset)
+        self.source.pattern_bucketed = True
+
+    def __len__(self) -> int:
+        return self.source.get_num_rows()
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        return self.source[idx]
+
+    def __getitems__(self, indices: List[int]) -> Dict[str, Any] | List[Dict[str, Any]]:
+        if hasattr(self.source, "__getitems__"):
+            return self.source.__getitems__(indices)
+        return [self.source[idx] for idx in indices]
+
+    def collate(self, batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Collate the unmasked samples and fan them out to every selected pattern.
+
+        Args:
+            batch (List[Dict[str, Any]]): List of samples, or a batch already collated by `__getitems__`.
+
+        Returns:
+            Dict[str, Any]: Masked batch of ``B * P`` rows with per-row "pattern_name" tags.
+        """
+        collated = self.source.collate(batch)
+        num_samples = len(collated["pattern_name"])
+
+        ## the masked views of the unmasked source rows are rebuilt per pattern by the masking engine, so none of
+        ## them may be fanned out (the engine only writes the "_reverse" views when `with_reverse` is set)
+        fanned = {
+            key: _repeat(value, len(self.patterns))
+            for key, value in collated.items()
+            if not _is_masked_view(key)
+        }
+        fanned["pattern_name"] = [pattern for pattern in self.patterns for _ in range(num_samples)]
+        return self.parent.masking_engine.apply(fanned)
@@ -0,0 +1,84 @@
+from typing import Iterator, List, Sequence
+
+import numpy as np
+from torch.utils.data import Sampler
+
+
+class LengthBucketBatchSampler(Sampler[List[int]]):
+    """
+    Batch sampler that groups dataset rows of similar sequence length into the same batch.
+
+    The (optionally shuffled) indices are split into pools of ``batch_size * bucket_size_multiplier`` rows.
+    Each pool is sorted by length and cut into batches, and the order of the batches is shuffled again, so
+    every batch holds sequences of similar length while the epoch stays randomised. Padded sequences then
+    carry little padding, which packed RNN encoders skip entirely.
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: int,
+        *,
+        shuffle: bool = True,
+        drop_last: bool = False,
+        bucket_size_multiplier: int = 100,
+        seed: int = 0,
+    ) -> None:
+        """
+        Initialize the sampler.
+
+        Args:
+            lengths (Sequence[int]): Sequence length of every dataset row.
+            batch_size (int): Number of rows per batch.
+            shuffle (bool): Whether to shuffle the rows and the batch order every epoch.
+            drop_last (bool): Whether to drop the last incomplete batch of each pool.
+            bucket_size_multiplier (int): Pool size in batches. Larger pools give tighter length buckets.
+            seed (int): Seed of the shuffling, combined with the epoch counter.
+        """
+        if batch_size <= 0:
+            raise ValueError(f"batch_size must be a positive integer, got {batch_size}")
+        if bucket_size_multiplier <= 0:
+            raise ValueError(f"bucket_size_multiplier must be a positive integer, got {bucket_size_multiplier}")
+
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.pool_size = batch_size * bucket_size_multiplier
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        """Set the epoch used to seed the shuffling."""
+        self.epoch = epoch
+
+    def _batches(self) -> List[List[int]]:
+        rng = np.random.default_rng(self.seed + self.epoch)
+        indices = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+
+        batches = []
+        for start in range(0, len(indices), self.pool_size):
+            pool = indices[start : start + self.pool_size]
+            pool = pool[np.argsort(self.lengths[pool], kind="stable")]
+            for b_start in range(0, len(pool), self.batch_size):
+                batch = pool[b_start : b_start + self.batch_size]
+                if self.drop_last and len(batch) < self.batch_size:
+                    continue
+                batches.append(batch.tolist())
+
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = self._batches()
+        if self.shuffle:
+            ## a new permutation every epoch, as with RandomSampler
+            self.epoch += 1
+        yield from batches
+
+    def __len__(self) -> int:
+        num_pools, remainder = divmod(len(self.lengths), self.pool_size)
+        if self.drop_last:
+            return num_pools * (self.pool_size // self.batch_size) + remainder // self.batch_size
+        return num_pools * (self.pool_size // self.batch_size) + -(-remainder // self.batch_size)
@@ -11,10 +11,11 @@ from .experiment_report import (
     TimingReport,
 )
 from .logging import LoggerSingleton, configure_logger, get_logger
-from .loss import LossFunctionGroup
+from .loss import LossFunctionGroup, RunningLoss
 from .managers import CenterManager, FeatureManager, LabelManager
 from .metric_recorder import MetricRecorder
 from .monitoring import ExperimentMonitor
+from .precision import PrecisionPolicy
 from .printing import EnhancedConsole, configure_console, get_console, get_table_width
 from .themes import (
     catppuccin,
@@ -27,7 +28,15 @@ from .themes import (
     solarized_dark,
     tokyo_night,
 )
-from .utils import SafeDict, clean_checkpoints, format_path_with_env, gpu_memory, safe_detach, to_gpu_safe
+from .utils import (
+    SafeDict,
+    clean_checkpoints,
+    format_path_with_env,
+    gpu_memory,
+    model_fingerprint,
+    safe_detach,
+    to_gpu_safe,
+)
 
 __all__ = [
     "ExperimentReport",
@@ -40,6 +49,7 @@ __all__ = [
     "get_console",
     "configure_console",
     "gpu_memory",
+    "model_fingerprint",
     "clean_checkpoints",
     "monokai_theme",
     "ExperimentReportGenerator",
@@ -71,4 +81,6 @@ __all__ = [
     "LoggerSingleton",
     "to_gpu_safe",
     "LossFunctionGroup",
+    "RunningLoss",
+    "PrecisionPolicy",
 ]
@@ -1,17 +1,61 @@
+import os
+import shutil
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 import torch
 
 from .logging import get_logger
+from .precision import PrecisionPolicy
 from .printing import get_console
 
 logger = get_logger()
 console = get_console()
 
 
+def _snapshot(obj: Any) -> Any:
+    """Copy every tensor of a (nested) state dict to the cpu, so training can keep updating the originals."""
+    if isinstance(obj, torch.Tensor):
+        obj = obj.detach()
+        return obj.clone() if obj.device.type == "cpu" else obj.to("cpu")
+    if isinstance(obj, dict):
+        return type(obj)((k, _snapshot(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_snapshot(v) for v in obj)
+    return obj
+
+
+def _atomic_save(state: Dict[str, Any], path: Path) -> None:
+    """Serialise to a temporary file next to `path` and rename it into place."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        ## a failed write must not leave a partial file behind
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _atomic_link(source: Path, path: Path) -> None:
+    """Point `path` at the already written `source`, as a hardlink where supported and a copy otherwise."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.unlink(missing_ok=True)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, path)
+
+
 class CheckpointManager:
-    """Manages model checkpointing and loading."""
+    """
+    Manages model checkpointing and loading.
+
+    Checkpoints are written by a background thread: `save_checkpoint` only snapshots the state dicts to the
+    cpu and returns. Call `flush` to wait for the pending writes (`load_checkpoint` does so itself).
+    """
 
     def __init__(
         self,
@@ -19,6 +63,7 @@ class CheckpointManager:
         save_metric: str = "loss",
         mode: str = "minimize",
         device: str = "cuda",
+        async_save: bool = True,
     ):
         self.model_dir = Path(model_dir)
         self.save_metric = save_metric
@@ -26,6 +71,9 @@ class CheckpointManager:
         self.device = device
         self.best_metric = float("inf") if mode == "minimize" else float("-inf")
         self.best_epoch = -1
+        self.async_save = async_save
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: List[Future] = []
 
         # Create directory if it doesn't exist
         self.model_dir.mkdir(parents=True, exist_ok=True)
@@ -44,8 +92,9 @@ class CheckpointManager:
         epoch: int,
         metrics: Dict[str, float],
         is_best: bool = False,
+        precision: Optional[PrecisionPolicy] = None,
     ) -> None:
-        """Save model checkpoint."""
+        """Save model checkpoint, in the background unless `async_save` is disabled."""
         state = {
             "model_state_dict": model.state_dict(),
             "optimizer_state_dict": optimizer.state_dict(),
@@ -54,17 +103,20 @@ class CheckpointManager:
         if scheduler is not None:
             state["scheduler_state_dict"] = scheduler.state_dict()
 
-        # Save regular checkpoint
-        checkpoint_path = self.model_dir / f"epoch_{epoch}.pth"
-        torch.save(state, checkpoint_path)
-        logger.info(f"Saved checkpoint for epoch {epoch}")
+        ## the fp16 loss scale, a resumed run would otherwise restart from the initial scale
+        if precision is not None:
+            state["precision_state_dict"] = precision.state_dict()
 
-        # Save best checkpoint if applicable
-        if is_best:
-            best_path = self.model_dir / "best.pth"
-            torch.save(state, best_path)
-            logger.info(f"Saved best checkpoint (epoch {epoch})")
-            console.print(f"[green]✓[/] New best model saved (epoch {epoch})")
+        checkpoint_path = self.model_dir / f"epoch_{epoch}.pth"
+        if self.async_save:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-writer")
+            self._pending = [f for f in self._pending if not f.done() or f.exception() is not None]
+            self._pending.append(
+                self._executor.submit(self._write_checkpoint, _snapshot(state), checkpoint_path, epoch, is_best)
+            )
+        else:
+            self._write_checkpoint(state, checkpoint_path, epoch, is_best)
 
         # Update best metric if needed
         metric_value = metrics[self.save_metric]
@@ -72,6 +124,40 @@ class CheckpointManager:
             self.best_metric = metric_value
             self.best_epoch = epoch
 
+    def _write_checkpoint(self, state: Dict[str, Any], checkpoint_path: Path, epoch: int, is_best: bool) -> None:
+        # Save regular checkpoint
+        _atomic_save(state, checkpoint_path)
+        logger.info(f"Saved checkpoint for epoch {epoch}")
+
+        # The best checkpoint is the same file, link it instead of serialising the state a second time
+        if is_best:
+            _atomic_link(checkpoint_path, self.model_dir / "best.pth")
+            logger.info(f"Saved best checkpoint (epoch {epoch})")
+            console.print(f"[green]✓[/] New best model saved (epoch {epoch})")
+
+    def flush(self) -> None:
+        """Wait for all pending checkpoint writes, reporting every failed write and re-raising the first error."""
+        pending, self._pending = self._pending, []
+        errors = []
+        for future in pending:
+            error = future.exception()
+            if error is not None:
+                error_msg = f"Error writing checkpoint: {str(error)}"
+                logger.error(error_msg)
+                console.print(f"[red]✗[/] {error_msg}")
+                errors.append(error)
+        if errors:
+            raise errors[0]
+
+    def close(self) -> None:
+        """Flush the pending writes and stop the writer thread."""
+        try:
+            self.flush()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
     def load_checkpoint(
         self,
         model: torch.nn.Module,
@@ -79,8 +165,10 @@ class CheckpointManager:
         scheduler: Optional[Any] = None,
         epoch: Optional[int] = None,
         load_best: bool = False,
+        precision: Optional[PrecisionPolicy] = None,
     ) -> Dict[str, Any]:
         """Load model checkpoint."""
+        self.flush()
         try:
             if load_best:
                 checkpoint_path = self.model_dir / "best.pth"
@@ -105,6 +193,10 @@ class CheckpointManager:
             if scheduler is not None and "scheduler_state_dict" in checkpoint:
                 scheduler.load_state_dict(checkpoint["scheduler_state_dict"])
 
+            # Load the mixed-precision state (the GradScaler's loss scale) if provided
+            if precision is not None:
+                precision.load_state_dict(checkpoint.get("precision_state_dict"))
+
             logger.info(f"Loaded checkpoint from {checkpoint_path}")
             console.print("[green]✓[/] Successfully loaded checkpoint")
 
@@ -1,5 +1,6 @@
 from typing import Any, Dict
 
+from torch import Tensor
 from torch.nn import Module
 
 
@@ -15,3 +16,39 @@ class LossFunctionGroup(Dict[str, Module]):
             ## If there is only one loss term, return it directly
             return list(loss_terms.values())[0]
         return loss_terms
+
+
+class RunningLoss:
+    """
+    Running means of the loss terms returned by the train/validation steps.
+
+    The steps return detached loss tensors, which are summed on their device without synchronising with the
+    host. The means are materialised once, by `compute` or `mean`, typically at the end of the epoch. Plain
+    Python numbers are summed on the host, so steps that still return floats keep working.
+    """
+
+    def __init__(self) -> None:
+        self.sums: Dict[str, Tensor | float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def update(self, step_results: Dict[str, Any]) -> None:
+        """Add the scalar loss terms of a step's results."""
+        for key, value in step_results.items():
+            if isinstance(value, Tensor):
+                if value.numel() != 1:
+                    continue
+                value = value.detach().reshape(())
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            self.sums[key] = self.sums[key] + value if key in self.sums else value
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def mean(self, key: str = "loss") -> float:
+        """Mean of a single term, synchronising with the device once."""
+        if key not in self.sums:
+            return float("nan")
+        return float(self.sums[key]) / self.counts[key]
+
+    def compute(self) -> Dict[str, float]:
+        """Means of every recorded term."""
+        return {key: self.mean(key) for key in self.sums}
@@ -1,4 +1,4 @@
-from typing import Dict, Optional
+from typing import Dict, List, Literal, Optional, Tuple
 
 import torch
 from experiment_utils import get_console, safe_detach
@@ -6,18 +6,36 @@ from modalities import Modality
 
 console = get_console()
 
+STORAGE_DTYPES = {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}
+
+## rows per matrix-vector product when summing a whole feature map in fp32
+_SUM_CHUNK_SIZE = 65536
+
 
 class FeatureManager:
     """
     Manages feature representations for multiple modalities across training samples.
     Tracks embeddings/features for each modality and their fusion.
 
+    The feature maps can be stored compactly in fp16/bf16, and/or offloaded to pinned CPU memory. An offloaded
+    store copies the updated rows to the host asynchronously and only writes them into the maps before the next
+    read, and indexed reads are copied back to `device` asynchronously, so the memory bank never occupies
+    device memory.
+
     Args:
         modality_dims (Dict[Modality, int]): Dictionary mapping modalities to their feature dimensions
-        device (torch.device): Device to store the features on
+        device (torch.device): Device the features are used on
+        dtype (str): Storage dtype of the feature maps, one of "fp32", "fp16" or "bf16"
+        offload (bool): Whether to keep the feature maps in (pinned) CPU memory instead of on `device`
     """
 
-    def __init__(self, modality_dims: Dict[str, int], device: torch.device):
+    def __init__(
+        self,
+        modality_dims: Dict[str, int],
+        device: torch.device,
+        dtype: Literal["fp32", "fp16", "bf16"] = "fp32",
+        offload: bool = False,
+    ):
         self.device = device
         self.modality_dims = modality_dims
         self.fully_init = False
@@ -26,6 +44,14 @@ class FeatureManager:
             self.device = "cpu"
             console.print("[bold yellow]Warning!:[/] CUDA not available, switching to CPU device.")
 
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Invalid storage dtype '{dtype}', must be one of {list(STORAGE_DTYPES)}")
+        self.dtype = STORAGE_DTYPES[dtype]
+        self.offload = offload
+        self.storage_device = "cpu" if offload else self.device
+        self.pin_memory = offload and torch.cuda.is_available()
+        self._pending: List[Tuple[Modality, torch.Tensor, torch.Tensor, Optional[torch.cuda.Event]]] = []
+
     def is_initialized(self) -> bool:
         """
         Check if the FeatureManager has been fully initialized.
@@ -43,11 +69,40 @@ class FeatureManager:
             num_samples (int): Number of samples to initialize features for
         """
         self.feature_maps = {
-            modality: torch.zeros(num_samples, dim, requires_grad=False).to(self.device)
+            modality: torch.zeros(
+                num_samples, dim, dtype=self.dtype, device=self.storage_device, pin_memory=self.pin_memory
+            )
             for modality, dim in self.modality_dims.items()
         }
+        self._pending = []
         self.fully_init = True
 
+    def _scatter_offloaded(self, modality: Modality, indexes: torch.Tensor, feature: torch.Tensor) -> None:
+        """Start the device-to-host copy of updated rows, they are written into the maps by `_flush`."""
+        staging = torch.empty(feature.shape, dtype=self.dtype, pin_memory=self.pin_memory)
+        staging.copy_(feature, non_blocking=self.pin_memory)
+        event = None
+        if feature.is_cuda:
+            event = torch.cuda.Event()
+            event.record()
+        self._pending.append((modality, indexes.cpu(), staging, event))
+
+    def _flush(self) -> None:
+        """Write the pending offloaded updates into the feature maps, in the order they were made."""
+        for modality, indexes, staging, event in self._pending:
+            if event is not None:
+                event.synchronize()
+            self.feature_maps[modality][indexes] = staging
+        self._pending.clear()
+
+    def _gather_offloaded(self, modality: Modality, indexes: torch.Tensor) -> torch.Tensor:
+        """Copy rows of an offloaded feature map to the device, without waiting for the copy."""
+        feature_map = self.feature_maps[modality]
+        indexes = indexes.cpu()
+        rows = torch.empty((len(indexes), feature_map.size(1)), dtype=self.dtype, pin_memory=self.pin_memory)
+        torch.index_select(feature_map, 0, indexes, out=rows)
+        return rows.to(self.device, non_blocking=self.pin_memory)
+
     def update(self, features: Dict[Modality, torch.Tensor], indexes: torch.Tensor) -> None:
         """
         Update feature maps with new features at specified indexes.
@@ -73,7 +128,11 @@ class FeatureManager:
                     f"Feature dimension mismatch for {modality}. "
                     f"Expected {self.modality_dims[modality]}, got {feature.shape[1]}"
                 )
-            self.feature_maps[modality][indexes] = safe_detach(feature, to_np=False)
+            feature = safe_detach(feature, to_np=False).to(self.dtype)
+            if self.offload:
+                self._scatter_offloaded(modality, indexes, feature)
+            else:
+                self.feature_maps[modality][indexes] = feature
 
     def get_features(self, modality: Modality, indexes: Optional[torch.Tensor] = None) -> torch.Tensor:
         """
@@ -85,7 +144,8 @@ class FeatureManager:
                 If None, returns all features for the modality.
 
         Returns:
-            torch.Tensor: Feature tensor for specified modality and indexes
+            torch.Tensor: Feature tensor for specified modality and indexes. Indexed rows are returned in fp32 on
+                `device`, the whole feature map is returned as stored.
 
         Raises:
             ValueError: If FeatureManager is not initialized
@@ -97,9 +157,14 @@ class FeatureManager:
         if modality not in self.feature_maps:
             raise KeyError(f"Unknown modality: {modality}")
 
+        if self._pending:
+            self._flush()
+
         if indexes is None:
             return self.feature_maps[modality]
-        return self.feature_maps[modality][indexes]
+        if self.offload:
+            return self._gather_offloaded(modality, indexes).float()
+        return self.feature_maps[modality][indexes].float()
 
     def __getitem__(self, k: Modality):
         return self.get_features(k, None)
@@ -110,6 +175,10 @@ class CenterManager:
     Manages prototype/center representations for different classes across modalities.
     For sentiment analysis, maintains positive and negative centers for each modality.
 
+    Besides the full recomputation of `update`, the manager keeps running per-polarity feature sums and row counts:
+    `reset` computes them from all rows once, and `update_rows` adjusts them for the rows changed by a training
+    step, so keeping the centers up to date costs O(batch_size * dim) instead of O(num_samples * dim).
+
     Args:
         config (CenterManagerConfig): Config containing initialization parameters
     """
@@ -133,6 +202,93 @@ class CenterManager:
             for modality, dim in modality_dims.items()
         }
 
+        # Running per-polarity feature sums and row counts, see `reset` and `update_rows`
+        self.sums = {
+            modality: {polarity: torch.zeros(dim, device=self.device) for polarity in ("pos", "neg")}
+            for modality, dim in modality_dims.items()
+        }
+        self.counts = {
+            modality: {polarity: torch.zeros((), device=self.device) for polarity in ("pos", "neg")}
+            for modality in modality_dims
+        }
+
+    def _polarity_masks(self, labels: torch.Tensor) -> Dict[str, torch.Tensor]:
+        neg_mask = labels < 0
+        pos_mask = labels > 0 if self.exclude_zero else labels >= 0
+        return {"pos": pos_mask, "neg": neg_mask}
+
+    def _masked_sums(self, feature: torch.Tensor, labels: torch.Tensor) -> Dict[str, Tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Feature sum and row count of each polarity, accumulated in fp32 whatever the storage dtype.
+
+        Autocast is disabled here, since the model steps call this inside the precision policy's autocast, where the
+        matmul would run in fp16/bf16 and overflow (reset) or drift (incremental updates).
+        """
+        sums = {}
+        with torch.autocast(device_type=feature.device.type, enabled=False):
+            for polarity, mask in self._polarity_masks(labels.to(feature.device)).items():
+                mask = mask.to(torch.float32)
+                total = sum(
+                    mask[start : start + _SUM_CHUNK_SIZE] @ feature[start : start + _SUM_CHUNK_SIZE].float()
+                    for start in range(0, len(feature), _SUM_CHUNK_SIZE)
+                ) + torch.zeros(feature.size(1), device=feature.device)
+                sums[polarity] = (total.to(self.device), mask.sum().to(self.device))
+        return sums
+
+    def _refresh_centers(self, modality: Modality) -> None:
+        for polarity in ("pos", "neg"):
+            count = self.counts[modality][polarity]
+            ## a polarity without rows keeps its previous center, as in `update`
+            self.center_maps[modality][polarity] = torch.where(
+                count > 0, self.sums[modality][polarity] / count.clamp(min=1), self.center_maps[modality][polarity]
+            )
+
+    def reset(self, features: Dict[Modality, torch.Tensor], labels: Dict[Modality, torch.Tensor]) -> None:
+        """
+        Recompute the running sums, counts and centers from all samples.
+
+        Args:
+            features (Dict[Modality, torch.Tensor]): Feature maps of shape (num_samples, feature_dim) per modality
+            labels (Dict[Modality, torch.Tensor]): Labels of shape (num_samples,) per modality, the polarity of
+                each modality's rows is taken from its own labels
+        """
+        for modality, feature in features.items():
+            if modality not in self.center_maps:
+                raise KeyError(f"Unknown modality: {modality}")
+            for polarity, (total, count) in self._masked_sums(feature, labels[modality]).items():
+                self.sums[modality][polarity] = total
+                self.counts[modality][polarity] = count
+            self._refresh_centers(modality)
+
+    def update_rows(
+        self,
+        old_features: Dict[Modality, torch.Tensor],
+        old_labels: Dict[Modality, torch.Tensor],
+        new_features: Dict[Modality, torch.Tensor],
+        new_labels: Dict[Modality, torch.Tensor],
+    ) -> None:
+        """
+        Adjust the running sums, counts and centers for rows whose features or labels changed.
+
+        Args:
+            old_features (Dict[Modality, torch.Tensor]): Features of the rows before the change, shape (b, feature_dim)
+            old_labels (Dict[Modality, torch.Tensor]): Labels of the rows before the change, shape (b,)
+            new_features (Dict[Modality, torch.Tensor]): Features of the same rows after the change
+            new_labels (Dict[Modality, torch.Tensor]): Labels of the same rows after the change
+
+        Note:
+            Each row must appear once, otherwise its contribution is counted several times.
+        """
+        for modality, feature in new_features.items():
+            if modality not in self.center_maps:
+                raise KeyError(f"Unknown modality: {modality}")
+            removed = self._masked_sums(old_features[modality], old_labels[modality])
+            added = self._masked_sums(feature, new_labels[modality])
+            for polarity in ("pos", "neg"):
+                self.sums[modality][polarity] += added[polarity][0] - removed[polarity][0]
+                self.counts[modality][polarity] += added[polarity][1] - removed[polarity][1]
+            self._refresh_centers(modality)
+
     def update(self, features: Dict[Modality, torch.Tensor], labels: torch.Tensor) -> None:
         """
         Update center representations based on current features and labels.
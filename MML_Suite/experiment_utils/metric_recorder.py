@@ -5,15 +5,23 @@ import re
 from collections import OrderedDict, defaultdict
 from functools import partial
 from os import PathLike
-from typing import Any, Callable, DefaultDict, Dict, List, Optional, Set, Tuple, Union
+from typing import Any, Callable, DefaultDict, Dict, List, Optional, Sequence, Set, Tuple, Union
 
 import numpy as np
+import torch
 from config.metric_config import MetricConfig
 from numpy import ndarray
 from torch import Tensor
 
 from .logging import get_logger
 from .printing import get_console
+from .streaming_metrics import (
+    DEVICE_STATE_TYPES,
+    STATE_TYPES,
+    StreamingMetric,
+    is_multi_output,
+    resolve_streaming_metric,
+)
 from .utils import safe_detach
 
 logger = get_logger()
@@ -26,8 +34,15 @@ class MetricRecorder:
     and calculates metrics at epoch end.
 
     This recorder is designed to handle multi-modal data where different modalities might
-    require separate metric calculations. It stores predictions and ground truths throughout
-    an epoch and computes all metrics at the end.
+    require separate metric calculations. Metrics with a streaming implementation (see
+    `experiment_utils.streaming_metrics`) fold every batch into a small per-modality state; the
+    predictions and ground truths are only stored throughout the epoch for the remaining metrics,
+    which are computed from them at the end. Set `streaming: false` on a metric to always buffer it.
+
+    With `device_side: true` in the metric config, tensors passed to `update`/`update_all` stay on their device:
+    the streaming states are device-resident and the buffered values are kept as detached tensors, so the
+    training loop never synchronises with the host for metrics. Everything is copied to the host once, in
+    `calculate_metrics`. Confusion-matrix metrics then need `num_classes` in the metric config.
 
     Example:
         ```python
@@ -59,7 +74,11 @@ class MetricRecorder:
     Attributes:
         config (MetricConfig): Configuration object containing metric definitions
         metrics (OrderedDict[str, Callable]): Mapping of metric names to their functions
-        modality_data (DefaultDict[Any, List[Tuple[ndarray, ndarray]]]): Stored predictions and targets per modality
+        streaming_metrics (Dict[str, StreamingMetric]): Metrics computed from accumulated states
+        modality_states (DefaultDict[Any, Dict[str, Any]]): Accumulated states per modality
+        modality_data (DefaultDict[Any, List[Tuple[ndarray, ndarray]]]): Stored predictions and targets per modality,
+            only used by metrics without a streaming implementation
+        device_side (bool): Whether states and buffers are kept on the device of the recorded tensors
         current_results (Dict[str, float]): Most recently calculated metric results
     """
 
@@ -78,9 +97,17 @@ class MetricRecorder:
         self._validate_config(config)
         self.config = config
         self.metrics: OrderedDict[str, Callable] = self._load_metrics()
+        self.streaming_metrics: Dict[str, StreamingMetric] = self._load_streaming_metrics()
+        self.buffered_metrics: List[str] = [name for name in self.metrics if name not in self.streaming_metrics]
+        self._state_types: Set[str] = {metric.state for metric in self.streaming_metrics.values()}
+        self.modality_states: DefaultDict[Any, Dict[str, Any]] = defaultdict(dict)
         self.modality_data: DefaultDict[Any, List[Tuple[ndarray, ndarray]]] = defaultdict(list)
+        self.device_side: bool = config.device_side
+        if self.device_side and "confusion" in self._state_types and config.num_classes is None:
+            raise ValueError("Device-side classification metrics need `num_classes` in the metric config")
         self.current_results: Dict[str, float] = {}
         self.tensorboard_path = tensorboard_path
+        self.writer = None
 
         if self.tensorboard_path:
             try:
@@ -132,9 +159,48 @@ class MetricRecorder:
                 raise type(e)(f"Error loading metric '{metric_name}': {str(e)}")
         return metrics
 
+    def _load_streaming_metrics(self) -> Dict[str, StreamingMetric]:
+        """
+        Resolve the streaming implementation of every configured metric that has one.
+
+        Returns:
+            Dict mapping metric names to their streaming implementations
+        """
+        streaming = {}
+        for metric_name, metric_info in self.config.metrics.items():
+            if not metric_info.get("streaming", True):
+                continue
+            metric = resolve_streaming_metric(metric_info["function"], metric_info.get("kwargs", {}))
+            if metric is not None:
+                streaming[metric_name] = metric
+        logger.debug(f"Streaming metrics: {list(streaming)}")
+        return streaming
+
+    def _new_state(self, state_type: str) -> Any:
+        if not self.device_side:
+            return STATE_TYPES[state_type]()
+        if state_type == "confusion":
+            return DEVICE_STATE_TYPES[state_type](self.config.num_classes)
+        return DEVICE_STATE_TYPES[state_type]()
+
+    def _prepare(self, values: Tensor | ndarray) -> Tensor | ndarray:
+        """
+        Detach recorded values, keeping tensors on their device in device-side mode.
+
+        Reduced-precision floats (e.g. the outputs of a step under bf16 autocast) are upcast to fp32, numpy has no
+        bfloat16 and the accumulators expect full-precision sums. Scalars, such as the ``.squeeze()``d outputs of a
+        batch of one, are returned as a single row.
+        """
+        if isinstance(values, Tensor) and values.dtype in (torch.float16, torch.bfloat16):
+            values = values.float()
+        if self.device_side:
+            values = safe_detach(values, to_np=False) if isinstance(values, Tensor) else torch.as_tensor(values)
+            return values.reshape(1) if values.ndim == 0 else values
+        return np.atleast_1d(safe_detach(values, to_np=True))
+
     def update(self, predictions: Tensor | ndarray, targets: Tensor | ndarray, modality: str) -> None:
         """
-        Store predictions and targets for later metric calculation.
+        Accumulate predictions and targets for later metric calculation.
 
         Args:
             predictions: Model predictions
@@ -144,30 +210,109 @@ class MetricRecorder:
         Raises:
             ValueError: If predictions and targets have mismatched shapes
         """
-        predictions = safe_detach(predictions, to_np=True)
-        targets = safe_detach(targets, to_np=True)
+        predictions = self._prepare(predictions)
+        targets = self._prepare(targets)
 
         if predictions.shape != targets.shape:
             raise ValueError(f"Shape mismatch between predictions {predictions.shape} and " f"targets {targets.shape}")
 
-        self.modality_data[modality].append((predictions, targets))
+        if "confusion" in self._state_types and is_multi_output(targets):
+            self._buffer_classification_metrics(targets.shape)
+
+        states = self.modality_states[modality]
+        for state_type in self._state_types:
+            if state_type not in states:
+                states[state_type] = self._new_state(state_type)
+            states[state_type].update(targets, predictions)
 
-    def update_all(self, predictions: Tensor | ndarray, targets: Tensor | ndarray, m_types: Set[str]) -> None:
+        if self.buffered_metrics:
+            self.modality_data[modality].append((predictions, targets))
+
+    def _buffer_classification_metrics(self, shape: Sequence[int]) -> None:
+        """
+        Compute the confusion-matrix metrics from buffered values from now on.
+
+        The streaming confusion matrix counts one class id per row, so multilabel targets such as MM-IMDb's
+        (B, 23) genre indicators would silently turn into a flat binary problem, unlike the sklearn metrics.
+
+        Raises:
+            ValueError: If single-label rows were already streamed, as they were not buffered
+        """
+        if any("confusion" in states for states in self.modality_states.values()):
+            raise ValueError(f"Got targets of shape {tuple(shape)} after streaming single-label targets")
+
+        demoted = [name for name, metric in self.streaming_metrics.items() if metric.state == "confusion"]
+        for name in demoted:
+            del self.streaming_metrics[name]
+        self.buffered_metrics = [name for name in self.metrics if name not in self.streaming_metrics]
+        self._state_types = {metric.state for metric in self.streaming_metrics.values()}
+        logger.info(f"Targets of shape {tuple(shape)} are multi-output, buffering {demoted} instead of streaming")
+
+    def update_all(
+        self, predictions: Tensor | ndarray, targets: Tensor | ndarray, m_types: ndarray | List[str]
+    ) -> None:
         """
         Store predictions and targets for later metric calculation. Applies the mask here instead of in the model code.
 
+        Args:
+            predictions: Model predictions of the batch
+            targets: Ground truth values of the batch
+            m_types: Missing pattern name of every row of the batch, used to split the rows per pattern
         """
-        if not isinstance(m_types, set):
-            try:
-                m_types = set(m_types)
-            except Exception as e:
-                raise TypeError(f"m_types must be a set or set-like object: {str(e)}")
+        predictions = self._prepare(predictions)
+        targets = self._prepare(targets)
+        m_types = np.atleast_1d(np.asarray(m_types))
+        if m_types.shape[:1] != (len(predictions),):
+            raise ValueError(f"m_types must hold one pattern per row, got {m_types.shape} for {len(predictions)} rows")
 
-        for m_type in m_types:
-            mask = m_types == m_type
-            mask_preds = predictions[mask]
-            mask_labels = targets[mask]
-            self.update(predictions=mask_preds, targets=mask_labels, modality=m_type)
+        pattern_names, pattern_codes = np.unique(m_types, return_inverse=True)
+        self.update_grouped(predictions, targets, pattern_codes=pattern_codes, pattern_names=pattern_names)
+
+    def update_grouped(
+        self,
+        predictions: Tensor | ndarray,
+        targets: Tensor | ndarray,
+        pattern_codes: Tensor | ndarray,
+        pattern_names: Sequence[str],
+    ) -> None:
+        """
+        Route the rows of a batch to their missing patterns in a single pass.
+
+        The rows are ordered by pattern code once and split by run length, so every pattern present in the batch
+        receives exactly one `update` call holding all of its rows.
+
+        Args:
+            predictions: Model predictions of the batch
+            targets: Ground truth values of the batch
+            pattern_codes: Integer pattern code of every row, e.g. the "pattern_code" entry of a masked batch
+            pattern_names: Pattern name of every code
+        """
+        ## the codes come from the collate function, so the grouping itself is always computed on the host
+        pattern_codes = np.asarray(safe_detach(pattern_codes)).reshape(-1)
+        predictions = self._prepare(predictions)
+        targets = self._prepare(targets)
+        if len(pattern_codes) != len(predictions):
+            raise ValueError(f"Expected one pattern code per row, got {len(pattern_codes)} for {len(predictions)} rows")
+
+        counts = np.bincount(pattern_codes, minlength=len(pattern_names))
+        present = np.flatnonzero(counts)
+        if len(present) == 1:
+            self.update(predictions=predictions, targets=targets, modality=str(pattern_names[present[0]]))
+            return
+
+        order = np.argsort(pattern_codes, kind="stable")
+        sizes = counts[present].tolist()
+        if self.device_side:
+            order = torch.from_numpy(order).to(predictions.device, non_blocking=True)
+            grouped_preds = torch.split(predictions.index_select(0, order), sizes)
+            grouped_targets = torch.split(targets.index_select(0, order.to(targets.device)), sizes)
+        else:
+            boundaries = np.cumsum(sizes)[:-1]
+            grouped_preds = np.split(predictions[order], boundaries)
+            grouped_targets = np.split(targets[order], boundaries)
+
+        for code, mask_preds, mask_labels in zip(present, grouped_preds, grouped_targets):
+            self.update(predictions=mask_preds, targets=mask_labels, modality=str(pattern_names[code]))
 
     def calculate_metrics(
         self, metric_group: Optional[str] = None, epoch: Optional[int] = None, loss: Optional[float] = None
@@ -183,20 +328,32 @@ class MetricRecorder:
         """
         results = {"loss": loss} if loss is not None else {}
 
-        for modality, data in self.modality_data.items():
-            if not data:
-                continue
-
-            try:
-                all_preds = np.concatenate([p for p, _ in data], axis=0)
-                all_targets = np.concatenate([t for _, t in data], axis=0)
-            except ValueError as e:
-                logger.error(f"Error concatenating data for modality {modality}: {str(e)}")
-                continue
+        for modality, states in self.modality_states.items():
+            data = self.modality_data.get(modality)
+            if self.device_side:
+                ## the only host synchronisation of a device-side recorder
+                states = {state_type: state.to_host() for state_type, state in states.items()}
+                data = [(safe_detach(p), safe_detach(t)) for p, t in data or []]
+            all_preds = all_targets = None
+            if data:
+                try:
+                    all_preds = np.concatenate([p for p, _ in data], axis=0)
+                    all_targets = np.concatenate([t for _, t in data], axis=0)
+                except ValueError as e:
+                    logger.error(f"Error concatenating data for modality {modality}: {str(e)}")
 
             for metric_name, metric_func in self.metrics.items():
                 try:
-                    value = metric_func(all_targets, all_preds)
+                    if metric_name in self.streaming_metrics:
+                        streaming_metric = self.streaming_metrics[metric_name]
+                        state = states.get(streaming_metric.state)
+                        if state is None or state.num_samples == 0:
+                            continue
+                        value = streaming_metric.compute(state)
+                    elif all_preds is None:
+                        continue
+                    else:
+                        value = metric_func(all_targets, all_preds)
                     metric_key = f"{metric_name}"
 
                     _modality = f"{modality.replace('z', '').upper()}" if modality else metric_name
@@ -245,6 +402,7 @@ class MetricRecorder:
 
     def reset(self) -> None:
         """Reset all stored data and results."""
+        self.modality_states.clear()
         self.modality_data.clear()
         self.current_results.clear()
 
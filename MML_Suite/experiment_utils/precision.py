@@ -0,0 +1,131 @@
+import inspect
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Literal, Optional
+
+import torch
+from torch import Tensor
+from torch.optim import Optimizer
+
+from .printing import get_console
+
+console = get_console()
+
+PRECISIONS = ("fp32", "bf16", "fp16")
+
+
+class PrecisionPolicy:
+    """
+    Mixed-precision policy shared by every model's train/validation steps.
+
+    - ``fp32``: no autocast, plain ``loss.backward()`` and ``optimizer.step()``
+    - ``bf16``: bfloat16 autocast (CPU and CUDA), no gradient scaling is needed thanks to the fp32 exponent range
+    - ``fp16``: float16 autocast with a `torch.amp.GradScaler`, only on CUDA; other devices fall back to bf16
+
+    The training loops run each step through `run_step`. Train steps take the policy, run their forward pass and
+    loss inside `autocast` and route their backward pass and optimizer step through `backward`, `unscale_`
+    (before gradient clipping) and `step`, which all run outside of autocast. Steps that do not take the policy
+    (the validation and evaluation steps) run entirely under autocast, as they have no optimizer step.
+    """
+
+    def __init__(self, precision: Literal["fp32", "bf16", "fp16"] = "fp32", device: torch.device | str = "cpu"):
+        """
+        Initialize the policy.
+
+        Args:
+            precision (str): One of "fp32", "bf16" or "fp16".
+            device (torch.device | str): Device the model runs on.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Invalid precision '{precision}', must be one of {PRECISIONS}")
+        self.device_type = torch.device(device).type
+
+        if precision == "fp16" and self.device_type != "cuda":
+            console.print(f"[bold yellow]![/] fp16 needs CUDA for gradient scaling, using bf16 on {self.device_type}")
+            precision = "bf16"
+        self.precision = precision
+        self.dtype = {"fp32": torch.float32, "bf16": torch.bfloat16, "fp16": torch.float16}[precision]
+        self.scaler = torch.amp.GradScaler(self.device_type) if precision == "fp16" else None
+        self._step_kwargs: Dict[Callable, Dict[str, Any]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the policy runs in reduced precision."""
+        return self.precision != "fp32"
+
+    def autocast(self):
+        """Autocast context of the policy, a no-op for fp32."""
+        if not self.enabled:
+            return nullcontext()
+        return torch.autocast(device_type=self.device_type, dtype=self.dtype)
+
+    def backward(self, loss: Tensor) -> None:
+        """Backward pass outside of autocast, scaling the loss for fp16."""
+        with torch.autocast(device_type=self.device_type, enabled=False):
+            (self.scaler.scale(loss) if self.scaler is not None else loss).backward()
+
+    def unscale_(self, optimizer: Optimizer) -> None:
+        """Unscale the gradients of an optimizer in place, call before clipping them."""
+        if self.scaler is not None:
+            self.scaler.unscale_(optimizer)
+
+    def step(self, optimizer: Optimizer) -> None:
+        """Optimizer step outside of autocast, skipped by the scaler when fp16 gradients overflowed."""
+        with torch.autocast(device_type=self.device_type, enabled=False):
+            if self.scaler is None:
+                optimizer.step()
+                return
+            self.scaler.step(optimizer)
+            self.scaler.update()
+
+    def step_kwargs(self, step_fn: Callable) -> Dict[str, Any]:
+        """
+        Keyword arguments that hand the policy to a model step, resolved once per step function.
+
+        Args:
+            step_fn (Callable): The model's ``train_step`` or ``validation_step``.
+
+        Returns:
+            Dict[str, Any]: ``{"precision": self}`` if the step accepts it, otherwise empty.
+
+        Raises:
+            ValueError: If the policy runs in reduced precision but a train step does not take it, its
+                optimizer step would otherwise run under autocast (and without gradient scaling for fp16).
+        """
+        ## bound methods are recreated on every attribute access, the underlying function is stable
+        key = getattr(step_fn, "__func__", step_fn)
+        if key not in self._step_kwargs:
+            if "precision" in inspect.signature(step_fn).parameters:
+                kwargs = {"precision": self}
+            elif self.enabled and step_fn.__name__.endswith("train_step"):
+                raise ValueError(
+                    f"{step_fn.__qualname__} does not support {self.precision} mixed precision, use fp32"
+                )
+            else:
+                kwargs = {}
+            self._step_kwargs[key] = kwargs
+        return self._step_kwargs[key]
+
+    def run_step(self, step_fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a model step under the policy.
+
+        Steps that take the policy autocast their own forward pass and loss, the others run under autocast.
+        """
+        step_kwargs = self.step_kwargs(step_fn)
+        if step_kwargs:
+            return step_fn(*args, **kwargs, **step_kwargs)
+        with self.autocast():
+            return step_fn(*args, **kwargs)
+
+    def state_dict(self) -> Dict[str, Any]:
+        """State of the policy, holding the GradScaler's loss scale for fp16."""
+        return {"precision": self.precision, "scaler": self.scaler.state_dict() if self.scaler is not None else None}
+
+    def load_state_dict(self, state_dict: Optional[Dict[str, Any]]) -> None:
+        """Restore the GradScaler's loss scale saved by `state_dict`, if both runs use fp16."""
+        if state_dict and self.scaler is not None and state_dict.get("scaler") is not None:
+            self.scaler.load_state_dict(state_dict["scaler"])
+
+
+## Default of the model steps when no policy is passed
+FP32 = PrecisionPolicy("fp32")
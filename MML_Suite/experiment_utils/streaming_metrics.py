@@ -0,0 +1,455 @@
+"""
+Streaming (constant-memory) implementations of the metrics most commonly used in the experiment configs.
+
+Each batch is folded into a small per-modality state instead of being buffered until the end of the epoch:
+
+- classification metrics (accuracy, balanced accuracy, precision, recall, F1, confusion matrix) read a
+  ``(K, K)`` confusion matrix indexed by the integer class ids,
+- regression metrics (MAE, MSE, Pearson correlation) read running sums and Welford/Chan co-moments,
+- `metrics.msa_binary_classification` reads the Non0/Has0 binary confusion matrices.
+
+With ``device_side`` enabled on the metric config, the `MetricRecorder` keeps the device-resident counterparts of
+these states instead (`DEVICE_STATE_TYPES`). They are updated with ``index_add_`` and tensor reductions only, so
+recording a batch never synchronises with the host, and are copied to their host states in `calculate_metrics`.
+
+`resolve_streaming_metric` maps a configured metric (function path and kwargs) to its streaming kernel, or
+returns None when the metric or one of its kwargs has no streaming equivalent, in which case the
+`MetricRecorder` keeps buffering predictions and targets for it. The confusion matrix holds one class id per row,
+so the `MetricRecorder` also buffers the classification metrics once it sees multilabel or multi-output targets
+(see `is_multi_output`), and the confusion states refuse them.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import numpy as np
+import torch
+from metrics.msa import msa_binary_confusion, msa_binary_scores
+from numpy import ndarray
+from torch import Tensor
+
+
+def is_multi_output(values: Tensor | ndarray) -> bool:
+    """Whether values hold more than one label per row, e.g. (B, C) multilabel indicators; (B, 1) is one label."""
+    return len(values.shape) > 1 and int(np.prod(values.shape[1:])) > 1
+
+
+def _check_single_label(targets: Tensor | ndarray) -> None:
+    if is_multi_output(targets):
+        raise ValueError(
+            f"Streaming classification metrics need one class label per row, got targets of shape "
+            f"{tuple(targets.shape)}, set `streaming: false` on the metric to compute it from buffered values"
+        )
+
+
+class ConfusionMatrixState:
+    """Confusion matrix over integer class ids (rows are targets, columns are predictions), grown on demand."""
+
+    def __init__(self) -> None:
+        self.matrix = np.zeros((0, 0), dtype=np.int64)
+
+    def update(self, targets: ndarray, predictions: ndarray) -> None:
+        _check_single_label(targets)
+        targets = _as_class_ids(targets)
+        predictions = _as_class_ids(predictions)
+        if targets.size == 0:
+            return
+
+        num_classes = max(int(targets.max()), int(predictions.max())) + 1
+        self.grow(num_classes)
+        num_classes = self.matrix.shape[0]
+        counts = np.bincount(targets * num_classes + predictions, minlength=num_classes * num_classes)
+        self.matrix += counts.reshape(num_classes, num_classes)
+
+    def grow(self, num_classes: int) -> None:
+        """Make room for class ids up to ``num_classes - 1``."""
+        size = self.matrix.shape[0]
+        if num_classes > size:
+            self.matrix = np.pad(self.matrix, ((0, num_classes - size), (0, num_classes - size)))
+
+    @property
+    def num_samples(self) -> int:
+        return int(self.matrix.sum())
+
+    def present_labels(self) -> ndarray:
+        """Sorted class ids seen in the targets or the predictions, as sklearn infers them."""
+        return np.flatnonzero(self.matrix.sum(axis=0) + self.matrix.sum(axis=1))
+
+    def select(self, labels: Optional[Sequence[int]] = None) -> tuple[ndarray, ndarray, ndarray]:
+        """
+        Per-class true positives, predicted counts and true counts for a set of labels.
+
+        Args:
+            labels: Class ids to report, defaults to every label present in the targets or predictions.
+
+        Returns:
+            Tuple of (true_positives, predicted, actual), each of shape (len(labels),).
+        """
+        labels = self.present_labels() if labels is None else np.asarray(labels, dtype=np.int64)
+        if labels.size:
+            self.grow(int(labels.max()) + 1)
+        true_positives = self.matrix[labels, labels]
+        predicted = self.matrix[:, labels].sum(axis=0)
+        actual = self.matrix[labels, :].sum(axis=1)
+        return true_positives, predicted, actual
+
+
+class RegressionState:
+    """Running error sums and Welford/Chan (co-)moments of targets and predictions."""
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.sum_abs_error = 0.0
+        self.sum_squared_error = 0.0
+        self.mean_targets = 0.0
+        self.mean_predictions = 0.0
+        self.m2_targets = 0.0
+        self.m2_predictions = 0.0
+        self.co_moment = 0.0
+
+    @property
+    def num_samples(self) -> int:
+        return self.n
+
+    def update(self, targets: ndarray, predictions: ndarray) -> None:
+        targets = np.asarray(targets, dtype=np.float64).ravel()
+        predictions = np.asarray(predictions, dtype=np.float64).ravel()
+        n_b = targets.size
+        if n_b == 0:
+            return
+
+        error = predictions - targets
+        self.sum_abs_error += float(np.abs(error).sum())
+        self.sum_squared_error += float(np.square(error).sum())
+
+        ## merge the batch moments into the running ones (Chan et al.)
+        mean_t, mean_p = float(targets.mean()), float(predictions.mean())
+        centred_t, centred_p = targets - mean_t, predictions - mean_p
+        n_a, n = self.n, self.n + n_b
+        delta_t, delta_p = mean_t - self.mean_targets, mean_p - self.mean_predictions
+        self.mean_targets += delta_t * n_b / n
+        self.mean_predictions += delta_p * n_b / n
+        self.m2_targets += float(centred_t @ centred_t) + delta_t * delta_t * n_a * n_b / n
+        self.m2_predictions += float(centred_p @ centred_p) + delta_p * delta_p * n_a * n_b / n
+        self.co_moment += float(centred_t @ centred_p) + delta_t * delta_p * n_a * n_b / n
+        self.n = n
+
+
+class MSABinaryState:
+    """Binary confusion matrices of the Non0 and Has0 subsets of `metrics.msa_binary_classification`."""
+
+    def __init__(self) -> None:
+        self.counts = np.zeros((2, 2, 2), dtype=np.int64)
+
+    @property
+    def num_samples(self) -> int:
+        ## every sample is counted in the Has0 subset
+        return int(self.counts[1].sum())
+
+    def update(self, targets: ndarray, predictions: ndarray) -> None:
+        self.counts += msa_binary_confusion(targets, predictions)
+
+
+class DeviceConfusionMatrixState:
+    """
+    Device-resident `ConfusionMatrixState` over a fixed number of classes.
+
+    Rows outside ``[0, num_classes)`` are not counted but remembered, and `to_host` raises for them, since growing
+    the matrix would need the largest label on the host.
+    """
+
+    def __init__(self, num_classes: int) -> None:
+        self.num_classes = num_classes
+        self.matrix: Optional[Tensor] = None
+        self.out_of_range: Optional[Tensor] = None
+
+    def update(self, targets: Tensor, predictions: Tensor) -> None:
+        _check_single_label(targets)
+        targets = targets.detach().reshape(-1).long()
+        predictions = predictions.detach().reshape(-1).long().to(targets.device)
+        num_classes = self.num_classes
+        if self.matrix is None:
+            self.matrix = torch.zeros(num_classes * num_classes, dtype=torch.long, device=targets.device)
+            self.out_of_range = torch.zeros((), dtype=torch.long, device=targets.device)
+
+        valid = (targets >= 0) & (targets < num_classes) & (predictions >= 0) & (predictions < num_classes)
+        cells = (targets * num_classes + predictions).clamp_(0, num_classes * num_classes - 1)
+        self.matrix.index_add_(0, cells, valid.long())
+        self.out_of_range += (~valid).sum()
+
+    def to_host(self) -> ConfusionMatrixState:
+        state = ConfusionMatrixState()
+        if self.matrix is None:
+            return state
+        if int(self.out_of_range) > 0:
+            raise ValueError(
+                f"{int(self.out_of_range)} labels outside [0, {self.num_classes}) were not counted, "
+                f"set `num_classes` in the metric config to the number of classes"
+            )
+        state.matrix = self.matrix.view(self.num_classes, self.num_classes).cpu().numpy()
+        return state
+
+
+class DeviceRegressionState:
+    """Device-resident `RegressionState`, merging the batch moments on the device (Chan et al.)."""
+
+    ## layout of `values`
+    FIELDS = (
+        "sum_abs_error",
+        "sum_squared_error",
+        "mean_targets",
+        "mean_predictions",
+        "m2_targets",
+        "m2_predictions",
+        "co_moment",
+    )
+
+    def __init__(self) -> None:
+        ## the sample count is known from the batch shapes, so it stays on the host
+        self.n = 0
+        self.values: Optional[Tensor] = None
+
+    def update(self, targets: Tensor, predictions: Tensor) -> None:
+        targets = targets.detach().reshape(-1).double()
+        predictions = predictions.detach().reshape(-1).double().to(targets.device)
+        n_b = targets.numel()
+        if n_b == 0:
+            return
+        if self.values is None:
+            self.values = torch.zeros(len(self.FIELDS), dtype=torch.float64, device=targets.device)
+
+        error = predictions - targets
+        mean_t, mean_p = targets.mean(), predictions.mean()
+        centred_t, centred_p = targets - mean_t, predictions - mean_p
+        n_a, n = self.n, self.n + n_b
+        delta_t, delta_p = mean_t - self.values[2], mean_p - self.values[3]
+        weight = n_a * n_b / n
+        self.values += torch.stack(
+            (
+                error.abs().sum(),
+                error.square().sum(),
+                delta_t * n_b / n,
+                delta_p * n_b / n,
+                centred_t @ centred_t + delta_t * delta_t * weight,
+                centred_p @ centred_p + delta_p * delta_p * weight,
+                centred_t @ centred_p + delta_t * delta_p * weight,
+            )
+        )
+        self.n = n
+
+    def to_host(self) -> RegressionState:
+        state = RegressionState()
+        if self.values is None:
+            return state
+        state.n = self.n
+        for field, value in zip(self.FIELDS, self.values.tolist()):
+            setattr(state, field, value)
+        return state
+
+
+class DeviceMSABinaryState:
+    """Device-resident `MSABinaryState`, see `metrics.msa_binary_confusion` for the cell layout."""
+
+    def __init__(self) -> None:
+        self.counts: Optional[Tensor] = None
+
+    def update(self, targets: Tensor, predictions: Tensor) -> None:
+        truth = targets.detach().reshape(-1) - 1
+        preds = predictions.detach().reshape(-1).to(truth.device) - 1
+        if self.counts is None:
+            self.counts = torch.zeros(8, dtype=torch.long, device=truth.device)
+
+        non_zeros_cells = (truth > 0).long() * 2 + (preds > 0).long()
+        has_zeros_cells = 4 + (truth >= 0).long() * 2 + (preds >= 0).long()
+        self.counts.index_add_(0, non_zeros_cells, (truth != 0).long())
+        self.counts.index_add_(0, has_zeros_cells, torch.ones_like(has_zeros_cells))
+
+    def to_host(self) -> MSABinaryState:
+        state = MSABinaryState()
+        if self.counts is not None:
+            state.counts = self.counts.view(2, 2, 2).cpu().numpy()
+        return state
+
+
+STATE_TYPES: Dict[str, type] = {
+    "confusion": ConfusionMatrixState,
+    "regression": RegressionState,
+    "msa_binary": MSABinaryState,
+}
+
+DEVICE_STATE_TYPES: Dict[str, type] = {
+    "confusion": DeviceConfusionMatrixState,
+    "regression": DeviceRegressionState,
+    "msa_binary": DeviceMSABinaryState,
+}
+
+
+@dataclass(frozen=True)
+class StreamingMetric:
+    """A metric computed from an accumulated state instead of the full predictions and targets."""
+
+    state: str
+    compute: Callable[[Any], Any]
+
+
+def _as_class_ids(values: ndarray) -> ndarray:
+    values = np.asarray(values).ravel()
+    if values.dtype == bool:
+        return values.astype(np.int64)
+    if not np.issubdtype(values.dtype, np.integer):
+        if not np.all(np.mod(values, 1) == 0):
+            raise ValueError(
+                "Streaming classification metrics need integer class labels, "
+                "set `streaming: false` on the metric to compute it from buffered values"
+            )
+        values = values.astype(np.int64)
+    if values.size and values.min() < 0:
+        raise ValueError("Streaming classification metrics need non-negative class labels")
+    return values
+
+
+def _zero_division_value(zero_division: Any) -> float:
+    return 0.0 if zero_division == "warn" else float(zero_division)
+
+
+def _safe_divide(numerator: ndarray, denominator: ndarray, zero_division: float) -> ndarray:
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    result = np.full(np.broadcast(numerator, denominator).shape, zero_division, dtype=np.float64)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+def _prf_score(
+    state: ConfusionMatrixState,
+    score: str,
+    average: Optional[str] = "binary",
+    labels: Optional[Sequence[int]] = None,
+    pos_label: int = 1,
+    zero_division: Any = "warn",
+) -> float | ndarray:
+    """Precision, recall or F1 from a confusion matrix, following `sklearn.metrics.precision_recall_fscore_support`."""
+    zero_division = _zero_division_value(zero_division)
+
+    if average == "binary":
+        present = state.present_labels()
+        if present.size > 2 or not set(present.tolist()) <= {0, pos_label, 1}:
+            raise ValueError(
+                f"Target is multiclass but average='binary'. Please choose another average setting, "
+                f"one of [None, 'micro', 'macro', 'weighted']. Labels: {present.tolist()}"
+            )
+        labels = [pos_label]
+
+    true_positives, predicted, actual = state.select(labels)
+    if average == "micro":
+        true_positives, predicted, actual = true_positives.sum(), predicted.sum(), actual.sum()
+
+    match score:
+        case "precision":
+            per_class = _safe_divide(true_positives, predicted, zero_division)
+        case "recall":
+            per_class = _safe_divide(true_positives, actual, zero_division)
+        case "f1":
+            ## 2PR / (P + R) == 2TP / (2TP + FP + FN), with FP + TP = predicted and FN + TP = actual
+            per_class = _safe_divide(2 * true_positives, predicted + actual, zero_division)
+        case _:
+            raise ValueError(f"Unknown score: {score}")
+
+    match average:
+        case None:
+            return per_class
+        case "binary" | "micro":
+            return float(per_class.item() if per_class.ndim else per_class)
+        case "macro":
+            return float(per_class.mean()) if per_class.size else zero_division
+        case "weighted":
+            if actual.sum() == 0:
+                return zero_division
+            return float(np.average(per_class, weights=actual))
+        case _:
+            raise ValueError(f"Unsupported average: {average}")
+
+
+def _accuracy(state: ConfusionMatrixState, normalize: bool = True) -> float:
+    correct = float(np.trace(state.matrix))
+    return correct / state.num_samples if normalize else correct
+
+
+def _balanced_accuracy(state: ConfusionMatrixState, adjusted: bool = False) -> float:
+    true_positives, _, actual = state.select()
+    recall = true_positives[actual > 0] / actual[actual > 0]
+    score = float(recall.mean())
+    if adjusted:
+        chance = 1 / recall.size
+        score = (score - chance) / (1 - chance)
+    return score
+
+
+def _confusion_matrix(state: ConfusionMatrixState, labels: Optional[Sequence[int]] = None) -> ndarray:
+    labels = state.present_labels() if labels is None else np.asarray(labels, dtype=np.int64)
+    if labels.size:
+        state.grow(int(labels.max()) + 1)
+    return state.matrix[np.ix_(labels, labels)].copy()
+
+
+def _mean_absolute_error(state: RegressionState) -> float:
+    return state.sum_abs_error / state.n
+
+
+def _mean_squared_error(state: RegressionState) -> float:
+    return state.sum_squared_error / state.n
+
+
+def _pearson(state: RegressionState) -> float:
+    return state.co_moment / np.sqrt(state.m2_targets * state.m2_predictions)
+
+
+def _msa_binary_classification(state: MSABinaryState) -> Dict[str, float]:
+    return {name: round(float(value), 4) for name, value in msa_binary_scores(state.counts).items()}
+
+
+## function path -> (state type, kernel, kwargs the kernel understands)
+_KERNELS: Dict[str, tuple[str, Callable[..., Any], frozenset]] = {
+    "sklearn.metrics.accuracy_score": ("confusion", _accuracy, frozenset({"normalize"})),
+    "sklearn.metrics.balanced_accuracy_score": ("confusion", _balanced_accuracy, frozenset({"adjusted"})),
+    "sklearn.metrics.confusion_matrix": ("confusion", _confusion_matrix, frozenset({"labels"})),
+    "sklearn.metrics.mean_absolute_error": ("regression", _mean_absolute_error, frozenset()),
+    "sklearn.metrics.mean_squared_error": ("regression", _mean_squared_error, frozenset()),
+    "metrics.pearson": ("regression", _pearson, frozenset()),
+    "metrics.corr.pearson": ("regression", _pearson, frozenset()),
+    "metrics.msa_binary_classification": ("msa_binary", _msa_binary_classification, frozenset()),
+    "metrics.msa.msa_binary_classification": ("msa_binary", _msa_binary_classification, frozenset()),
+}
+_PRF_KWARGS = frozenset({"average", "labels", "pos_label", "zero_division"})
+for _score, _func_name in (("precision", "precision_score"), ("recall", "recall_score"), ("f1", "f1_score")):
+    _KERNELS[f"sklearn.metrics.{_func_name}"] = (
+        "confusion",
+        lambda state, _score=_score, **kwargs: _prf_score(state, _score, **kwargs),
+        _PRF_KWARGS,
+    )
+
+
+def resolve_streaming_metric(function_path: str, kwargs: Optional[Dict[str, Any]] = None) -> Optional[StreamingMetric]:
+    """
+    Get the streaming implementation of a configured metric.
+
+    Args:
+        function_path: Import path of the metric function, as given in the metric config
+        kwargs: Keyword arguments of the metric function
+
+    Returns:
+        The streaming metric, or None if the metric has to be computed from buffered predictions and targets
+    """
+    kwargs = kwargs or {}
+    if function_path not in _KERNELS:
+        return None
+
+    state, kernel, supported_kwargs = _KERNELS[function_path]
+    if not set(kwargs) <= supported_kwargs:
+        return None
+    if kwargs.get("average", "binary") not in ("binary", "micro", "macro", "weighted"):
+        return None
+
+    return StreamingMetric(state=state, compute=lambda s: kernel(s, **kwargs))
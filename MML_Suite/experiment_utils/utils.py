@@ -1,3 +1,4 @@
+import hashlib
 import os
 import re
 import warnings
@@ -63,6 +64,23 @@ def to_gpu_safe(x: Tensor | Dict[str | Modality, Tensor | Any]) -> Tensor | Dict
     return {k: v.to(device) if isinstance(v, Tensor) else v for k, v in x.items()}
 
 
+def model_fingerprint(model: torch.nn.Module) -> str:
+    """
+    Content hash of a model's parameters and buffers, used to namespace stores computed from its weights.
+
+    Args:
+        model (torch.nn.Module): The (frozen) model.
+
+    Returns:
+        str: Hex digest identifying the weights.
+    """
+    digest = hashlib.sha1()
+    for name, tensor in model.state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
 def kaiming_init(module):
     if isinstance(module, (Conv2d, Linear)):
         init.kaiming_normal_(module.weight, mode="fan_out", nonlinearity="relu")
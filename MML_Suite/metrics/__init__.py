@@ -1,4 +1,4 @@
 from .corr import pearson
-from .msa import msa_binary_classification
+from .msa import msa_binary_classification, msa_binary_confusion, msa_binary_scores
 
-__all__ = ["pearson", "msa_binary_classification"]
+__all__ = ["pearson", "msa_binary_classification", "msa_binary_confusion", "msa_binary_scores"]
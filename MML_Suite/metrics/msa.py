@@ -1,5 +1,5 @@
 import traceback
-from typing import Dict
+from typing import Dict, Optional
 
 import numpy as np
 from sklearn.metrics import accuracy_score, f1_score
@@ -9,7 +9,7 @@ def msa_binarize(preds: np.ndarray, labels: np.ndarray) -> tuple[np.ndarray, np.
     test_preds = preds - 1
     test_truth = labels - 1
 
-    non_zeros = np.array([i for i, e in enumerate(test_truth) if e != 0])
+    non_zeros = np.flatnonzero(test_truth != 0)
     non_zeros_binary_truth = test_truth[non_zeros] > 0
     non_zeros_binary_preds = test_preds[non_zeros] > 0
 
@@ -25,6 +25,83 @@ def msa_binarize(preds: np.ndarray, labels: np.ndarray) -> tuple[np.ndarray, np.
     )
 
 
+MSA_SUBSETS = ("Non0", "Has0")
+
+
+def msa_binary_confusion(
+    y_true: np.ndarray, y_pred: np.ndarray, groups: Optional[np.ndarray] = None, num_groups: Optional[int] = None
+) -> np.ndarray:
+    """
+    Binary confusion matrices of the Non0 and Has0 subsets, built with a single bincount.
+
+    Labels are shifted by one as in `msa_binarize`: Has0 compares ``>= 0`` over every sample, Non0 compares
+    ``> 0`` over the samples whose shifted label is non-zero.
+
+    Args:
+        y_true: Ground truth labels, shape (N,)
+        y_pred: Predicted labels, shape (N,)
+        groups: Optional group id (e.g. missing pattern code) of every sample, shape (N,)
+        num_groups: Number of groups, defaults to ``groups.max() + 1``
+
+    Returns:
+        Counts of shape (2, 2, 2) indexed [subset (Non0, Has0), truth, prediction],
+        or (G, 2, 2, 2) when `groups` is given
+    """
+    truth = np.asarray(y_true).ravel() - 1
+    preds = np.asarray(y_pred).ravel() - 1
+    group_ids = np.zeros(truth.size, dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64).ravel()
+    if num_groups is None:
+        num_groups = int(group_ids.max()) + 1 if group_ids.size else 1
+
+    non_zeros = truth != 0
+    non_zeros_cells = ((group_ids[non_zeros] * 2) * 2 + (truth[non_zeros] > 0)) * 2 + (preds[non_zeros] > 0)
+    has_zeros_cells = ((group_ids * 2 + 1) * 2 + (truth >= 0)) * 2 + (preds >= 0)
+    counts = np.bincount(np.concatenate((non_zeros_cells, has_zeros_cells)), minlength=num_groups * 8)
+    counts = counts.reshape(num_groups, len(MSA_SUBSETS), 2, 2)
+    return counts if groups is not None else counts[0]
+
+
+def msa_binary_scores(confusion: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Accuracy, F1, recall and precision (weighted/macro/micro) of binary confusion matrices.
+
+    Follows sklearn with ``zero_division=0``: macro averages run over the labels present in the truth or the
+    predictions, weighted averages are weighted by the truth support, and micro averages equal the accuracy.
+
+    Args:
+        confusion: Counts of shape (..., 2, 2, 2) from `msa_binary_confusion`
+
+    Returns:
+        Scores of shape (...) keyed as in `msa_binary_classification`
+    """
+    confusion = np.asarray(confusion, dtype=np.float64)
+    true_positives = np.diagonal(confusion, axis1=-2, axis2=-1)
+    predicted = confusion.sum(axis=-2)
+    actual = confusion.sum(axis=-1)
+    total = actual.sum(axis=-1)
+    present = (predicted + actual) > 0
+
+    def _divide(numerator, denominator):
+        return np.divide(numerator, denominator, out=np.zeros(np.shape(numerator)), where=denominator != 0)
+
+    accuracy = _divide(true_positives.sum(axis=-1), total)
+    per_class = {
+        "F1": _divide(2 * true_positives, predicted + actual),
+        "Recall": _divide(true_positives, actual),
+        "Precision": _divide(true_positives, predicted),
+    }
+
+    scores = {}
+    for subset_idx, subset in enumerate(MSA_SUBSETS):
+        scores[f"{subset}_Accuracy"] = accuracy[..., subset_idx]
+        for name, values in per_class.items():
+            values, weights, mask = values[..., subset_idx, :], actual[..., subset_idx, :], present[..., subset_idx, :]
+            scores[f"{subset}_{name}_weighted"] = _divide((values * weights).sum(axis=-1), weights.sum(axis=-1))
+            scores[f"{subset}_{name}_macro"] = _divide((values * mask).sum(axis=-1), mask.sum(axis=-1))
+            scores[f"{subset}_{name}_micro"] = accuracy[..., subset_idx]
+    return scores
+
+
 def __multiclass_acc(y_pred, y_true):
     """
     Compute the multiclass accuracy w.r.t. groundtruth
@@ -37,53 +114,8 @@ def __multiclass_acc(y_pred, y_true):
 
 
 def msa_binary_classification(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
-    binary_preds, binary_truth, non_zeros, non_zeros_binary_preds, non_zeros_binary_truth = msa_binarize(y_pred, y_true)
-
-    non_zeros_accuracy = accuracy_score(non_zeros_binary_preds, non_zeros_binary_truth)
-
-    non_zeros_f1_weighted_score = f1_score(non_zeros_binary_truth, non_zeros_binary_preds, average="weighted")
-    non_zeros_f1_macro_score = f1_score(non_zeros_binary_truth, non_zeros_binary_preds, average="macro")
-    non_zeros_f1_micro_score = f1_score(non_zeros_binary_truth, non_zeros_binary_preds, average="micro")
-    non_zeros_recall_weighted_score = f1_score(non_zeros_binary_truth, non_zeros_binary_preds, average="weighted")
-    non_zeros_recall_macro_score = f1_score(non_zeros_binary_truth, non_zeros_binary_preds, average="macro")
-    non_zeros_recall_micro_score = f1_score(non_zeros_binary_truth, non_zeros_binary_preds, average="micro")
-    non_zeros_precision_weighted_score = f1_score(non_zeros_binary_truth, non_zeros_binary_preds, average="weighted")
-    non_zeros_precision_macro_score = f1_score(non_zeros_binary_truth, non_zeros_binary_preds, average="macro")
-    non_zeros_precision_micro_score = f1_score(non_zeros_binary_truth, non_zeros_binary_preds, average="micro")
-
-    binary_accuracy = accuracy_score(binary_preds, binary_truth)
-    binary_f1_weighted_score = f1_score(binary_truth, binary_preds, average="weighted")
-    binary_f1_macro_score = f1_score(binary_truth, binary_preds, average="macro")
-    binary_f1_micro_score = f1_score(binary_truth, binary_preds, average="micro")
-    binary_recall_weighted_score = f1_score(binary_truth, binary_preds, average="weighted")
-    binary_recall_macro_score = f1_score(binary_truth, binary_preds, average="macro")
-    binary_recall_micro_score = f1_score(binary_truth, binary_preds, average="micro")
-    binary_precision_weighted_score = f1_score(binary_truth, binary_preds, average="weighted")
-    binary_precision_macro_score = f1_score(binary_truth, binary_preds, average="macro")
-    binary_precision_micro_score = f1_score(binary_truth, binary_preds, average="micro")
-
-    return {
-        "Non0_Accuracy": round(non_zeros_accuracy, 4),
-        "Non0_F1_weighted": round(non_zeros_f1_weighted_score, 4),
-        "Non0_F1_macro": round(non_zeros_f1_macro_score, 4),
-        "Non0_F1_micro": round(non_zeros_f1_micro_score, 4),
-        "Non0_Recall_weighted": round(non_zeros_recall_weighted_score, 4),
-        "Non0_Recall_macro": round(non_zeros_recall_macro_score, 4),
-        "Non0_Recall_micro": round(non_zeros_recall_micro_score, 4),
-        "Non0_Precision_weighted": round(non_zeros_precision_weighted_score, 4),
-        "Non0_Precision_macro": round(non_zeros_precision_macro_score, 4),
-        "Non0_Precision_micro": round(non_zeros_precision_micro_score, 4),
-        "Has0_Accuracy": round(binary_accuracy, 4),
-        "Has0_F1_weighted": round(binary_f1_weighted_score, 4),
-        "Has0_F1_macro": round(binary_f1_macro_score, 4),
-        "Has0_F1_micro": round(binary_f1_micro_score, 4),
-        "Has0_Recall_weighted": round(binary_recall_weighted_score, 4),
-        "Has0_Recall_macro": round(binary_recall_macro_score, 4),
-        "Has0_Recall_micro": round(binary_recall_micro_score, 4),
-        "Has0_Precision_weighted": round(binary_precision_weighted_score, 4),
-        "Has0_Precision_macro": round(binary_precision_macro_score, 4),
-        "Has0_Precision_micro": round(binary_precision_micro_score, 4),
-    }
+    scores = msa_binary_scores(msa_binary_confusion(y_true, y_pred))
+    return {name: round(float(value), 4) for name, value in scores.items()}
 
 
 def old_mosei_regression(y_true, y_pred):
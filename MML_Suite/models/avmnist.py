@@ -1,6 +1,6 @@
 from collections import defaultdict
 from functools import partial
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Optional, Tuple, Union
 
 import numpy as np
 import torch
@@ -8,6 +8,7 @@ from data.avmnist import AVMNIST as AVMNISTDataset
 from experiment_utils import get_console
 from experiment_utils.loss import LossFunctionGroup
 from experiment_utils.metric_recorder import MetricRecorder
+from experiment_utils.precision import FP32, PrecisionPolicy
 from experiment_utils.utils import safe_detach
 from modalities import Modality
 from models.conv import ConvBlock, ConvBlockArgs
@@ -22,11 +23,10 @@ from torch.nn import (
     ReLU,
     Sequential,
 )
-from torch.nn.functional import softmax
 from torch.optim import Optimizer
 from torch.utils.data import DataLoader
 
-from .mixins import MultiModalMonitoringMixin
+from .mixins import MultiModalMonitoringMixin, MissingModalityMixin
 
 console = get_console()
 
@@ -173,7 +173,7 @@ class MNISTImage(Module):
         return str(self.net)
 
 
-class AVMNIST(Module, MultiModalMonitoringMixin):
+class AVMNIST(Module, MultiModalMonitoringMixin, MissingModalityMixin):
     """
     Multimodal model for the AVMNIST dataset, fusing audio and image encoders.
     """
@@ -223,6 +223,36 @@ class AVMNIST(Module, MultiModalMonitoringMixin):
             case _:
                 raise ValueError(f"Unknown fusion function: {fusion_fn}")
 
+    def get_encoder(self, modality: Modality) -> Module:
+        """
+        Get the encoder module for a specific modality.
+
+        Args:
+            modality (Modality): Modality identifier.
+
+        Returns:
+            Module: Corresponding encoder module.
+        """
+        match modality:
+            case Modality.AUDIO:
+                return self.audio_encoder
+            case Modality.IMAGE:
+                return self.image_encoder
+            case _:
+                raise ValueError(f"Unknown modality: {modality}")
+
+    def classify_embeddings(self, embeddings: Dict[Modality, Tensor]) -> Tensor:
+        """
+        Fuse the audio and image embeddings and classify them.
+
+        Args:
+            embeddings (Dict[Modality, Tensor]): Audio and image embeddings.
+
+        Returns:
+            Tensor: Logits for classification.
+        """
+        return self.net(self.fusion_fn((embeddings[Modality.AUDIO], embeddings[Modality.IMAGE])))
+
     def forward(
         self,
         A: Optional[Tensor] = None,
@@ -230,6 +260,7 @@ class AVMNIST(Module, MultiModalMonitoringMixin):
         *,
         is_embd_A: bool = False,
         is_embd_I: bool = False,
+        missing_mask: Optional[Dict[Modality, Tensor]] = None,
     ) -> Tensor:
         """
         Perform a forward pass through the model.
@@ -239,6 +270,8 @@ class AVMNIST(Module, MultiModalMonitoringMixin):
             I (Optional[Tensor]): Image input or embedding.
             is_embd_A (bool): Whether the audio input is pre-embedded.
             is_embd_I (bool): Whether the image input is pre-embedded.
+            missing_mask (Optional[Dict[Modality, Tensor]]): Per-modality presence of every row. Rows where a
+                modality is absent use the cached zero-input embedding instead of running the encoder.
 
         Returns:
             Tensor: Logits for classification.
@@ -249,8 +282,9 @@ class AVMNIST(Module, MultiModalMonitoringMixin):
         A = A if A is not None else torch.zeros(I.size(0), self.embd_size_A)
         I = I if I is not None else torch.zeros(A.size(0), self.embd_size_I)
 
-        audio = self.audio_encoder(A) if not is_embd_A else A
-        image = self.image_encoder(I) if not is_embd_I else I
+        missing_mask = missing_mask or {}
+        audio = self.encode_present(Modality.AUDIO, A, missing_mask.get(Modality.AUDIO)) if not is_embd_A else A
+        image = self.encode_present(Modality.IMAGE, I, missing_mask.get(Modality.IMAGE)) if not is_embd_I else I
         fused = self.fusion_fn((audio, image))
         return self.net(fused)
 
@@ -261,6 +295,7 @@ class AVMNIST(Module, MultiModalMonitoringMixin):
         criterion: Module,
         device: torch.device,
         metric_recorder: MetricRecorder,
+        precision: PrecisionPolicy = FP32,
         **kwargs,
     ) -> Dict[str, Any]:
         """
@@ -272,6 +307,7 @@ class AVMNIST(Module, MultiModalMonitoringMixin):
             criterion (Module): Loss function.
             device (torch.device): Device to run training on.
             metric_recorder (MetricRecorder): Metric recorder for performance tracking.
+            precision (PrecisionPolicy): Mixed-precision policy of the forward pass, backward pass and optimizer step.
 
         Returns:
             Dict[str, Any]: Dictionary containing the training loss.
@@ -285,17 +321,16 @@ class AVMNIST(Module, MultiModalMonitoringMixin):
 
         self.train()
         optimizer.zero_grad()
-        logits = self.forward(A=A, I=I)
-        loss = criterion(logits, labels)
-        loss.backward()
-        optimizer.step()
-
-        predictions = softmax(logits, dim=1).argmax(dim=1).detach().cpu().numpy()
-        labels = labels.detach().cpu().numpy()
-        miss_type = np.array(miss_type)
+        with precision.autocast():
+            logits = self.forward(A=A, I=I, missing_mask=batch.get("missing_mask"))
+            loss = criterion(logits, labels)
+        precision.backward(loss)
+        precision.step(optimizer)
 
-        metric_recorder.update_all(predictions=predictions, targets=labels, m_types=miss_type)
-        return {"loss": loss.item()}
+        ## the recorder copies to the host unless it keeps its metric states on the device
+        predictions = logits.detach().argmax(dim=1)
+        metric_recorder.update_all(predictions=predictions, targets=labels, m_types=np.array(miss_type))
+        return {"loss": loss.detach()}
 
     def validation_step(
         self,
@@ -304,6 +339,7 @@ class AVMNIST(Module, MultiModalMonitoringMixin):
         device: torch.device,
         metric_recorder: MetricRecorder,
         return_test_info: bool = False,
+        patterns: Optional[Dict[str, Dict[str, float]]] = None,
     ) -> Dict[str, Any]:
         """
         Perform a validation step.
@@ -313,7 +349,10 @@ class AVMNIST(Module, MultiModalMonitoringMixin):
             criterion (LossFunctionGroup): Loss function group.
             device (torch.device): Device for validation.
             metric_recorder (MetricRecorder): Metric recorder for performance tracking.
-            return_test_info (bool): Whether to return additional test information.
+            return_test_info (bool): Whether to return additional test information. In pattern-bucketed evaluation
+                the rows of every sample are returned once per pattern.
+            patterns (Optional[Dict[str, Dict[str, float]]]): Pattern-bucketed evaluation. The batch holds unmasked
+                samples and every pattern is evaluated from a single encoder pass.
 
         Returns:
             Dict[str, Any]: Validation results, including loss and optionally predictions.
@@ -327,23 +366,40 @@ class AVMNIST(Module, MultiModalMonitoringMixin):
                 batch["pattern_name"],
             )
 
-            logits = self.forward(A=A, I=I)
+            if patterns is not None:
+                pattern_logits = self.pattern_logits({Modality.AUDIO: A, Modality.IMAGE: I}, patterns)
+                losses, predictions = [], []
+                for pattern_name, logits in pattern_logits.items():
+                    losses.append(criterion(logits, labels))
+                    predictions.append(logits.argmax(dim=1))
+                    metric_recorder.update(predictions=predictions[-1], targets=labels, modality=pattern_name)
+                loss = torch.stack(losses).mean()
+                if return_test_info:
+                    ## one block of rows per pattern, in the order of `patterns`
+                    return {
+                        "loss": loss,
+                        "predictions": torch.cat(predictions).cpu().numpy(),
+                        "labels": labels.repeat(len(pattern_logits)).cpu().numpy(),
+                        "miss_types": np.repeat(list(pattern_logits), len(labels)),
+                    }
+                return {"loss": loss}
+
+            logits = self.forward(A=A, I=I, missing_mask=batch.get("missing_mask"))
             loss = criterion(logits, labels)
-            predictions = softmax(logits, dim=1).argmax(dim=1).detach().cpu().numpy()
-            labels = labels.detach().cpu().numpy()
+            predictions = logits.argmax(dim=1)
             miss_type = np.array(miss_type)
 
             metric_recorder.update_all(predictions=predictions, targets=labels, m_types=miss_type)
 
             if return_test_info:
                 return {
-                    "loss": loss.item(),
-                    "predictions": predictions,
-                    "labels": labels,
+                    "loss": loss.detach(),
+                    "predictions": predictions.cpu().numpy(),
+                    "labels": labels.cpu().numpy(),
                     "miss_types": miss_type,
                 }
 
-        return {"loss": loss.item()}
+        return {"loss": loss.detach()}
 
     def get_embeddings(self, dataloader: DataLoader, device: torch.device) -> Dict[Modality, np.ndarray]:
         """
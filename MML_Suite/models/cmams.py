@@ -1,10 +1,12 @@
-from typing import Any, Dict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
 
 import numpy as np
 import torch
 from cmam_loss import CMAMLoss
 from config.resolvers import resolve_encoder
 from experiment_utils.metric_recorder import MetricRecorder
+from experiment_utils.precision import FP32, PrecisionPolicy
 from modalities import Modality
 from models.msa.utt_fusion import UttFusionModel
 from models.protocols import MultimodalModelProtocol
@@ -20,6 +22,7 @@ from torch.nn import (
     Sequential,
 )
 from torch.optim import Optimizer
+from torch.utils.data import DataLoader
 
 
 class AssociationNetwork(Module):
@@ -44,6 +47,210 @@ class InputEncoders(Dict[Modality, Module]):
     pass
 
 
+@torch.no_grad()
+def _encode_split(
+    dataloader: DataLoader,
+    encode_fn: Callable[[Dict[str, Any]], Dict[str, torch.Tensor]],
+    modules: List[Module],
+) -> Dict[str, torch.Tensor]:
+    """
+    Run `encode_fn` once over every sample of a dataloader's dataset and gather its outputs by `sample_idx`.
+
+    The dataset is read unmasked (one row per sample, as in pattern-bucketed evaluation) and in order, with the
+    `modules` in eval mode.
+
+    Args:
+        dataloader (DataLoader): Dataloader of the split, used for its dataset, batch size and collate function.
+        encode_fn (Callable): Maps a batch to named (batch_size, ...) tensors.
+        modules (List[Module]): Modules run by `encode_fn`, put in eval mode for the pass.
+
+    Returns:
+        Dict[str, torch.Tensor]: The named outputs of every sample, on the cpu.
+    """
+    dataset = dataloader.dataset
+    batch_size = dataloader.batch_size or dataloader.batch_sampler.batch_size
+    was_bucketed, was_training = dataset.pattern_bucketed, [module.training for module in modules]
+    dataset.pattern_bucketed = True
+    for module in modules:
+        module.eval()
+    try:
+        loader = DataLoader(
+            dataset,
+            batch_size=batch_size,
+            shuffle=False,
+            num_workers=dataloader.num_workers,
+            collate_fn=dataloader.collate_fn,
+        )
+        outputs = {}
+        for batch in loader:
+            sample_idx = torch.as_tensor(batch["sample_idx"], dtype=torch.long).view(-1)
+            for name, value in encode_fn(batch).items():
+                value = value.cpu()
+                if name not in outputs:
+                    outputs[name] = torch.empty((dataset.num_samples, *value.shape[1:]), dtype=value.dtype)
+                outputs[name][sample_idx] = value
+    finally:
+        dataset.pattern_bucketed = was_bucketed
+        for module, training in zip(modules, was_training):
+            module.train(training)
+    return outputs
+
+
+class TargetEmbeddingStore:
+    """
+    Embeddings of the target modality produced by the frozen teacher encoder, indexed by `sample_idx`.
+
+    The teacher never changes while a C-MAM is trained, so its target embeddings are computed in a single
+    pass over each split and looked up for every batch instead of re-running the encoder.
+    """
+
+    def __init__(self, embeddings: torch.Tensor) -> None:
+        self.embeddings = embeddings
+
+    def __len__(self) -> int:
+        return self.embeddings.size(0)
+
+    def __getitem__(self, sample_idx: torch.Tensor) -> torch.Tensor:
+        sample_idx = torch.as_tensor(sample_idx, dtype=torch.long, device=self.embeddings.device)
+        return self.embeddings[sample_idx]
+
+    def to(self, device: torch.device | str) -> "TargetEmbeddingStore":
+        self.embeddings = self.embeddings.to(device)
+        return self
+
+    def save(self, path: Path | str) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        torch.save(self.embeddings.cpu(), path)
+
+    @classmethod
+    def load(cls, path: Path | str) -> "TargetEmbeddingStore":
+        return cls(torch.load(path, map_location="cpu"))
+
+    @classmethod
+    @torch.no_grad()
+    def build(
+        cls, encoder: Module, dataloader: DataLoader, modality: Modality, device: torch.device
+    ) -> "TargetEmbeddingStore":
+        """
+        Encode the target modality of every sample of a dataloader's dataset once.
+
+        The dataset is read unmasked (one row per sample, as in pattern-bucketed evaluation) and in order.
+
+        Args:
+            encoder (Module): Frozen teacher encoder of the target modality.
+            dataloader (DataLoader): Dataloader of the split, used for its dataset, batch size and collate function.
+            modality (Modality): Target modality.
+            device (torch.device): Device to run the encoder on.
+
+        Returns:
+            TargetEmbeddingStore: Embeddings of every sample, on the cpu.
+        """
+        outputs = _encode_split(
+            dataloader,
+            lambda batch: {"target": encoder(batch[modality].float().to(device))},
+            modules=[encoder],
+        )
+        return cls(outputs["target"])
+
+
+class CMAMEmbeddingStore:
+    """
+    Embeddings and labels of a split, stored as contiguous tensors, for training a C-MAM in embedding space.
+
+    With frozen input encoders and a frozen teacher, a C-MAM step only depends on the input embeddings, the
+    teacher's embeddings of the available modalities (the context of its classifier head), the target embedding
+    and the label. They are computed in a single pass, so each step only runs the association network and the
+    classifier head.
+
+    Tensors are named ``input_<modality>``, ``context_<modality>``, ``target``, ``label`` and ``pattern_code``.
+    The samples are encoded unmasked, so every row holds the code of the dataset's full pattern, the same bucket
+    the dataloader steps record their full-input rows under. `pattern_names` maps the codes back to names.
+    """
+
+    def __init__(self, tensors: Dict[str, torch.Tensor], pattern_names: List[str]) -> None:
+        self.tensors = tensors
+        self.pattern_names = pattern_names
+
+    def __len__(self) -> int:
+        return self.tensors["label"].size(0)
+
+    def num_batches(self, batch_size: int) -> int:
+        return -(-len(self) // batch_size)
+
+    def batches(self, batch_size: int, shuffle: bool = False) -> Iterator[Dict[str, torch.Tensor]]:
+        """
+        Iterate over the store in batches.
+
+        Args:
+            batch_size (int): Number of samples per batch, the last batch may be smaller.
+            shuffle (bool): Draw the samples in a random order, gathered with one `index_select` per tensor.
+
+        Yields:
+            Dict[str, torch.Tensor]: Named tensors of the batch, on the device of the store.
+        """
+        label = self.tensors["label"]
+        indices = torch.randperm(len(self), device=label.device) if shuffle else None
+        for start in range(0, len(self), batch_size):
+            if indices is None:
+                yield {name: tensor[start : start + batch_size] for name, tensor in self.tensors.items()}
+            else:
+                batch_indices = indices[start : start + batch_size]
+                yield {name: tensor.index_select(0, batch_indices) for name, tensor in self.tensors.items()}
+
+    def to(self, device: torch.device | str) -> "CMAMEmbeddingStore":
+        self.tensors = {name: tensor.to(device) for name, tensor in self.tensors.items()}
+        return self
+
+    def save(self, path: Path | str) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tensors = {name: tensor.cpu() for name, tensor in self.tensors.items()}
+        torch.save({"tensors": tensors, "pattern_names": self.pattern_names}, path)
+
+    @classmethod
+    def load(cls, path: Path | str) -> "CMAMEmbeddingStore":
+        state = torch.load(path, map_location="cpu")
+        return cls(state["tensors"], pattern_names=state["pattern_names"])
+
+    @classmethod
+    @torch.no_grad()
+    def build(
+        cls, cmam: "CMAM", trained_model: MultimodalModelProtocol, dataloader: DataLoader, device: torch.device
+    ) -> "CMAMEmbeddingStore":
+        """
+        Encode every sample of a dataloader's dataset once with the C-MAM's input encoders and the teacher.
+
+        Args:
+            cmam (CMAM): C-MAM whose (frozen) input encoders produce the input embeddings.
+            trained_model (MultimodalModelProtocol): Frozen teacher, provides the context and target embeddings.
+            dataloader (DataLoader): Dataloader of the split, used for its dataset, batch size and collate function.
+            device (torch.device): Device to run the encoders on.
+
+        Returns:
+            CMAMEmbeddingStore: Embeddings and labels of every sample, on the cpu.
+        """
+        target_encoder = trained_model.get_encoder(cmam.target_modality)
+        pattern_codes: Dict[str, int] = {}
+
+        def encode(batch: Dict[str, Any]) -> Dict[str, torch.Tensor]:
+            outputs = {
+                "target": target_encoder(batch[cmam.target_modality].float().to(device)),
+                "label": torch.as_tensor(batch["label"]),
+                "pattern_code": torch.as_tensor(
+                    [pattern_codes.setdefault(name, len(pattern_codes)) for name in batch["pattern_name"]]
+                ),
+            }
+            for name, encoder in cmam.input_encoders.items():
+                data = batch[Modality.from_str(name)].float().to(device)
+                outputs[f"input_{name}"] = encoder(data)
+                outputs[f"context_{name}"] = trained_model.get_encoder(Modality.from_str(name))(data)
+            return outputs
+
+        tensors = _encode_split(dataloader, encode, modules=[cmam.input_encoders, trained_model])
+        return cls(tensors, pattern_names=list(pattern_codes))
+
+
 class CMAM(Module):
     def __init__(
         self,
@@ -73,13 +280,38 @@ class CMAM(Module):
 
         self.grad_clip = grad_clip
         self.metric_recorder = metric_recorder
+        self.target_embeddings: Dict[str, TargetEmbeddingStore] = {}
 
     def to(self, device):
         super().to(device)
         self.input_encoders.to(device)
         self.association_network.to(device)
+        for store in self.target_embeddings.values():
+            store.to(device)
         return self
 
+    def set_target_embeddings(self, target_embeddings: Dict[str, TargetEmbeddingStore]) -> None:
+        """Use precomputed teacher embeddings of the target modality, keyed by split (see `TargetEmbeddingStore`)."""
+        self.target_embeddings = dict(target_embeddings)
+
+    def get_target_embedding(
+        self,
+        batch: Dict[Modality, torch.Tensor],
+        trained_model: MultimodalModelProtocol,
+        device: torch.device,
+        split: str,
+    ) -> torch.Tensor:
+        """Look up the target embedding of a batch, running the frozen teacher encoder only if it was not cached."""
+        store = self.target_embeddings.get(split)
+        if store is not None and "sample_idx" in batch:
+            return store[batch["sample_idx"]].to(device)
+
+        with torch.no_grad():
+            trained_model.to(device)
+            trained_model.eval()
+            trained_encoder = trained_model.get_encoder(self.target_modality)
+            return trained_encoder(batch[self.target_modality].float().to(device))
+
     def reset_metric_recorders(self):
         self.metric_recorder.reset()
 
@@ -88,6 +320,20 @@ class CMAM(Module):
         z = self.fusion_fn(embeddings, dim=1)
         return self.association_network(z)
 
+    def _classify(
+        self,
+        input_modalities: Dict[str, torch.Tensor],
+        rec_embd: torch.Tensor,
+        trained_model: MultimodalModelProtocol,
+    ) -> torch.Tensor:
+        """Classify the reconstructed target embedding with the teacher, alongside its embeddings of the inputs."""
+        with torch.no_grad():
+            context = {
+                Modality.from_str(name): trained_model.get_encoder(Modality.from_str(name))(data)
+                for name, data in input_modalities.items()
+            }
+        return trained_model.classify_embeddings({**context, self.target_modality: rec_embd})
+
     def train_step(
         self,
         batch: Dict[Modality, torch.Tensor],
@@ -97,26 +343,19 @@ class CMAM(Module):
         device: torch.device,
         trained_model: MultimodalModelProtocol,
         logits_transform: callable = lambda x: x.argmax(dim=1),
+        precision: PrecisionPolicy = FP32,
     ):
         self.train()
-        self.to(device)
+        trained_model.eval()
 
-        target_modality = batch[self.target_modality].float().to(device)
         input_modalities = {
-            modality: batch[Modality.from_str(modality)].float().to(device) for modality in self.encoders
+            name: batch[Modality.from_str(name)].float().to(device) for name in self.input_encoders
         }
 
-        mi_input_modalities = [v.clone() for k, v in input_modalities.items()]
+        mi_input_modalities = [v.clone() for v in input_modalities.values()]
 
         labels = labels.to(device)
 
-        # Get the target embedding without computing gradients
-        with torch.no_grad():
-            trained_model.to(device)
-            trained_model.eval()
-            trained_encoder = trained_model.get_encoder(self.target_modality)
-            target_embd = trained_encoder(target_modality.to(device))
-
         # Ensure trained_model's parameters do not require gradients
         for param in trained_model.parameters():
             param.requires_grad = False
@@ -124,50 +363,45 @@ class CMAM(Module):
         # Zero the gradients
         optimizer.zero_grad()
 
-        # Forward pass through CMAM
-        rec_embd = self.forward(input_modalities)
-
-        # Compute reconstruction loss
+        with precision.autocast():
+            # Get the target embedding without computing gradients, from the precomputed store when there is one
+            target_embd = self.get_target_embedding(batch, trained_model, device, split="train")
 
-        # Prepare input for the pretrained model
-        encoder_data = {str(k)[0].upper(): batch[Modality.from_str(k)].to(device=device) for k in self.encoders.keys()}
-        m_kwargs = {
-            **encoder_data,
-            f"{str(self.target_modality)[0]}": rec_embd.to(device=device),
-            f"is_embd_{str(self.target_modality)[0]}": True,
-        }
-        # Compute logits without torch.no_grad()
-        logits = trained_model(**m_kwargs, device=device)
-        predictions = logits_transform(logits)
+            # Forward pass through CMAM
+            rec_embd = self.forward(input_modalities)
 
-        self.metric_recorder.update(predictions, labels)
-        metrics = self.metric_recorder.calculate_metrics()
+            # Compute logits without torch.no_grad(), the classification loss is backpropagated through the teacher
+            logits = self._classify(input_modalities, rec_embd, trained_model)
 
-        # Total loss and backward pass
-        loss_dict = criterion(
-            predictions=rec_embd,
-            targets=target_embd,
-            originals=mi_input_modalities,
-            reconstructed=rec_embd,
-            forward_func=None,
-            cls_logits=logits,
-            cls_labels=labels,
-        )
+            # Total loss
+            loss_dict = criterion(
+                predictions=rec_embd,
+                targets=target_embd,
+                originals=mi_input_modalities,
+                reconstructed=rec_embd,
+                forward_func=None,
+                cls_logits=logits,
+                cls_labels=labels,
+            )
         total_loss = loss_dict["total_loss"]
-        total_loss.backward()
+        precision.backward(total_loss)
 
         # Optional gradient clipping
         if self.grad_clip > 0:
+            precision.unscale_(optimizer)
             torch.nn.utils.clip_grad_norm_(self.parameters(), self.grad_clip)
 
-        optimizer.step()
+        precision.step(optimizer)
 
-        other_losses = {k: v.item() for k, v in loss_dict.items() if k != "total_loss"}
+        self.metric_recorder.update_all(
+            predictions=logits_transform(logits.detach()), targets=labels, m_types=np.array(batch["pattern_name"])
+        )
+
+        other_losses = {k: v.detach() for k, v in loss_dict.items() if k != "total_loss"}
 
         return {
-            "loss": total_loss.item(),
+            "loss": total_loss.detach(),
             **other_losses,
-            **metrics,
         }
 
     def evaluate(
@@ -179,44 +413,30 @@ class CMAM(Module):
         trained_model,
         logits_transform: callable = lambda x: x.argmax(dim=1),
         return_eval_data=False,
+        split: str = "validation",
     ):
         self.eval()
         trained_model.eval()
-        self.to(device)
-        trained_model.to(device)
         with torch.no_grad():
-            target_modality = batch[self.target_modality].float().to(device)
             input_modalities = {
-                modality: batch[Modality.from_str(modality)].float().to(device) for modality in self.encoders
+                name: batch[Modality.from_str(name)].float().to(device) for name in self.input_encoders
             }
-            mi_input_modalities = [v.clone() for k, v in input_modalities.items()]
-            miss_type = batch["miss_type"]  ## should be a list of the same string/miss_type
+            mi_input_modalities = [v.clone() for v in input_modalities.values()]
 
             labels = labels.to(device)
 
             ## get the target
-            trained_model.to(device)
-            target_modality = target_modality.to(device)
-            trained_encoder = trained_model.get_encoder(self.target_modality)
-            target_embd = trained_encoder(target_modality)
+            target_embd = self.get_target_embedding(batch, trained_model, device, split=split)
             rec_embd = self.forward(input_modalities)
 
-            encoder_data = {
-                str(k)[0].upper(): batch[Modality.from_str(k)].to(device=device) for k in self.encoders.keys()
-            }
-            m_kwargs = {
-                **encoder_data,
-                f"{str(self.target_modality)[0]}": rec_embd.to(device=device),
-                f"is_embd_{str(self.target_modality)[0]}": True,
-            }
-            logits = trained_model(**m_kwargs, device=device)
+            logits = self._classify(input_modalities, rec_embd, trained_model)
             predictions = logits_transform(logits)
 
             ## compute all the losses
             loss_dict = criterion(
                 predictions=rec_embd,
                 targets=target_embd,
-                originals=mi_input_modalities,  ## None for now since they refer to the original and reconstructed data for Cyclic Consistency Loss
+                originals=mi_input_modalities,
                 reconstructed=rec_embd,
                 forward_func=None,
                 cls_logits=logits,
@@ -224,41 +444,139 @@ class CMAM(Module):
             )
 
             total_loss = loss_dict["total_loss"]
-            other_losses = {k: v.item() for k, v in loss_dict.items() if k != "total_loss"}
+            other_losses = {k: v.detach() for k, v in loss_dict.items() if k != "total_loss"}
 
-            metrics = self.metric_recorder.calculate_metrics(predictions, labels)
-            miss_type = np.array(miss_type)
-
-            for m_type in set(miss_type):
-                mask = miss_type == m_type
-                mask_preds = predictions[mask]
-                mask_labels = labels[mask]
-                mask_metrics = self.metric_recorder.calculate_metrics(
-                    predictions=mask_preds,
-                    targets=mask_labels,
-                    skip_metrics=["ConfusionMatrix"],
-                )
-                for k, v in mask_metrics.items():
-                    metrics[f"{k}_{m_type.replace('z', '').upper()}"] = v
+            self.metric_recorder.update_all(
+                predictions=predictions, targets=labels, m_types=np.array(batch["pattern_name"])
+            )
             self.train()
 
             if return_eval_data:
                 return {
-                    "loss": total_loss.item(),
+                    "loss": total_loss.detach(),
                     **other_losses,
                     "predictions": predictions,
                     "labels": labels,
                     "rec_embd": rec_embd,
                     "target_embd": target_embd,
-                    **metrics,
                 }
 
             return {
-                "loss": total_loss.item(),
+                "loss": total_loss.detach(),
                 **other_losses,
-                **metrics,
             }
 
+    def _embedding_forward(
+        self, batch: Dict[str, torch.Tensor], trained_model: MultimodalModelProtocol, device: torch.device
+    ) -> tuple[List[torch.Tensor], torch.Tensor, torch.Tensor]:
+        """Reconstruct the target embedding from a `CMAMEmbeddingStore` batch and classify it with the teacher."""
+        embeddings = [batch[f"input_{name}"].to(device) for name in self.input_encoders]
+        rec_embd = self.association_network(self.fusion_fn(embeddings, dim=1))
+        context = {Modality.from_str(name): batch[f"context_{name}"].to(device) for name in self.input_encoders}
+        logits = trained_model.classify_embeddings({**context, self.target_modality: rec_embd})
+        return embeddings, rec_embd, logits
+
+    def embedding_train_step(
+        self,
+        batch: Dict[str, torch.Tensor],
+        criterion: CMAMLoss,
+        optimizer: Optimizer,
+        device: torch.device,
+        trained_model: MultimodalModelProtocol,
+        pattern_names: List[str],
+        logits_transform: callable = lambda x: x.argmax(dim=1),
+        precision: PrecisionPolicy = FP32,
+    ) -> Dict[str, Any]:
+        """
+        Training step on a `CMAMEmbeddingStore` batch.
+
+        Only the association network runs forward and backward here; the input encoders and the teacher were
+        run once when the store was built, and the teacher's classifier head is only backpropagated through.
+
+        Args:
+            batch (Dict[str, torch.Tensor]): Batch of a `CMAMEmbeddingStore`.
+            criterion (CMAMLoss): C-MAM loss, the input embeddings are its `originals`.
+            optimizer (Optimizer): Optimizer of the association network.
+            device (torch.device): Device to train on.
+            trained_model (MultimodalModelProtocol): Frozen teacher, provides `classify_embeddings`.
+            pattern_names (List[str]): Pattern name of every ``pattern_code`` of the store.
+            logits_transform (callable): Maps the logits to predictions.
+            precision (PrecisionPolicy): Mixed-precision policy of the step.
+
+        Returns:
+            Dict[str, Any]: Total loss and the loss terms.
+        """
+        self.train()
+        trained_model.eval()
+
+        labels = batch["label"].to(device)
+        optimizer.zero_grad()
+
+        with precision.autocast():
+            embeddings, rec_embd, logits = self._embedding_forward(batch, trained_model, device)
+            loss_dict = criterion(
+                predictions=rec_embd,
+                targets=batch["target"].to(device),
+                originals=embeddings,
+                reconstructed=rec_embd,
+                forward_func=None,
+                cls_logits=logits,
+                cls_labels=labels,
+            )
+        total_loss = loss_dict["total_loss"]
+        precision.backward(total_loss)
+
+        if self.grad_clip > 0:
+            precision.unscale_(optimizer)
+            torch.nn.utils.clip_grad_norm_(self.association_network.parameters(), self.grad_clip)
+
+        precision.step(optimizer)
+
+        self.metric_recorder.update_grouped(
+            predictions=logits_transform(logits.detach()),
+            targets=labels,
+            pattern_codes=batch["pattern_code"],
+            pattern_names=pattern_names,
+        )
+
+        other_losses = {k: v.detach() for k, v in loss_dict.items() if k != "total_loss"}
+        return {"loss": total_loss.detach(), **other_losses}
+
+    @torch.no_grad()
+    def embedding_evaluate(
+        self,
+        batch: Dict[str, torch.Tensor],
+        criterion: CMAMLoss,
+        device: torch.device,
+        trained_model: MultimodalModelProtocol,
+        pattern_names: List[str],
+        logits_transform: callable = lambda x: x.argmax(dim=1),
+    ) -> Dict[str, Any]:
+        """Evaluation step on a `CMAMEmbeddingStore` batch, see `embedding_train_step`."""
+        self.eval()
+        trained_model.eval()
+
+        labels = batch["label"].to(device)
+        embeddings, rec_embd, logits = self._embedding_forward(batch, trained_model, device)
+        loss_dict = criterion(
+            predictions=rec_embd,
+            targets=batch["target"].to(device),
+            originals=embeddings,
+            reconstructed=rec_embd,
+            forward_func=None,
+            cls_logits=logits,
+            cls_labels=labels,
+        )
+        self.metric_recorder.update_grouped(
+            predictions=logits_transform(logits),
+            targets=labels,
+            pattern_codes=batch["pattern_code"],
+            pattern_names=pattern_names,
+        )
+
+        other_losses = {k: v.detach() for k, v in loss_dict.items() if k != "total_loss"}
+        return {"loss": loss_dict["total_loss"].detach(), **other_losses}
+
     def incongruent_train_step(
         self,
         batch: dict[torch.Tensor],
@@ -340,7 +658,7 @@ class CMAM(Module):
         optimizer.step()
 
         return {
-            "loss": loss.item(),
+            "loss": loss.detach(),
             **metrics,
         }
 
@@ -439,7 +757,7 @@ class CMAM(Module):
             self.train()
 
             return {
-                "loss": loss.item(),
+                "loss": loss.detach(),
                 **metrics,
             }
 
@@ -525,6 +843,7 @@ class DualCMAM(Module):
         optimizer: Optimizer,
         device: torch.device,
         trained_model: Module,
+        precision: PrecisionPolicy = FP32,
     ):
         self.train()
         target_one = batch[self.target_modality_one].float().to(device)
@@ -534,14 +853,6 @@ class DualCMAM(Module):
 
         labels = labels.to(device)
 
-        # Get the target embedding without computing gradients
-        with torch.no_grad():
-            trained_model.eval()
-            trained_encoder = trained_model.get_encoder(self.target_modality_one)
-            target_embd_one = trained_encoder(target_one)
-            trained_encoder = trained_model.get_encoder(self.target_modality_two)
-            target_embd_two = trained_encoder(target_two)
-
         # Ensure trained_model's parameters do not require gradients
         for param in trained_model.parameters():
             param.requires_grad = False
@@ -549,22 +860,31 @@ class DualCMAM(Module):
         # Zero the gradients
         optimizer.zero_grad()
 
-        # Forward pass through CMAM
-        rec_embd_one, rec_embd_two = self.forward(input_modalities)
+        with precision.autocast():
+            # Get the target embedding without computing gradients
+            with torch.no_grad():
+                trained_model.eval()
+                trained_encoder = trained_model.get_encoder(self.target_modality_one)
+                target_embd_one = trained_encoder(target_one)
+                trained_encoder = trained_model.get_encoder(self.target_modality_two)
+                target_embd_two = trained_encoder(target_two)
 
-        # prepare input for the pretrained model
-        encoder_data = {str(self.input_modality)[0]: batch[self.input_modality].to(device=device)}
+            # Forward pass through CMAM
+            rec_embd_one, rec_embd_two = self.forward(input_modalities)
 
-        m_kwargs = {
-            **encoder_data,
-            f"{str(self.target_modality_one)[0]}": rec_embd_one.to(device=device),
-            f"{str(self.target_modality_two)[0]}": rec_embd_two.to(device=device),
-            f"is_embd_{str(self.target_modality_one)[0]}": True,
-            f"is_embd_{str(self.target_modality_two)[0]}": True,
-        }
+            # prepare input for the pretrained model
+            encoder_data = {str(self.input_modality)[0]: batch[self.input_modality].to(device=device)}
 
-        # Compute logits without torch.no_grad()
-        logits = trained_model(**m_kwargs, device=device)
+            m_kwargs = {
+                **encoder_data,
+                f"{str(self.target_modality_one)[0]}": rec_embd_one.to(device=device),
+                f"{str(self.target_modality_two)[0]}": rec_embd_two.to(device=device),
+                f"is_embd_{str(self.target_modality_one)[0]}": True,
+                f"is_embd_{str(self.target_modality_two)[0]}": True,
+            }
+
+            # Compute logits without torch.no_grad()
+            logits = trained_model(**m_kwargs, device=device)
         predictions = logits.argmax(dim=1)
 
         if self.binarize:
@@ -597,46 +917,48 @@ class DualCMAM(Module):
         else:
             metrics = self.metric_recorder.calculate_metrics(predictions, labels)
 
-        rec_one_loss_dict = cmam_criterion(
-            predictions=rec_embd_one,
-            targets=target_embd_one,
-            originals=mi_input_modalities,
-            reconstructed=rec_embd_one,
-            forward_func=None,
-            cls_logits=logits,
-            cls_labels=labels,
-        )
+        with precision.autocast():
+            rec_one_loss_dict = cmam_criterion(
+                predictions=rec_embd_one,
+                targets=target_embd_one,
+                originals=mi_input_modalities,
+                reconstructed=rec_embd_one,
+                forward_func=None,
+                cls_logits=logits,
+                cls_labels=labels,
+            )
 
-        rec_two_loss_dict = cmam_criterion(
-            predictions=rec_embd_two,
-            targets=target_embd_two,
-            originals=mi_input_modalities,
-            reconstructed=rec_embd_two,
-            forward_func=None,
-            cls_logits=logits,
-            cls_labels=labels,
-        )
+            rec_two_loss_dict = cmam_criterion(
+                predictions=rec_embd_two,
+                targets=target_embd_two,
+                originals=mi_input_modalities,
+                reconstructed=rec_embd_two,
+                forward_func=None,
+                cls_logits=logits,
+                cls_labels=labels,
+            )
 
         total_loss = rec_one_loss_dict["total_loss"] + rec_two_loss_dict["total_loss"]
 
-        total_loss.backward()
+        precision.backward(total_loss)
 
         # Optional gradient clipping
         if self.grad_clip > 0:
+            precision.unscale_(optimizer)
             torch.nn.utils.clip_grad_norm_(self.parameters(), self.grad_clip)
 
-        optimizer.step()
+        precision.step(optimizer)
 
-        rec_one_other_losses = {k: v.item() for k, v in rec_one_loss_dict.items() if k != "total_loss"}
+        rec_one_other_losses = {k: v.detach() for k, v in rec_one_loss_dict.items() if k != "total_loss"}
 
-        rec_two_other_losses = {k: v.item() for k, v in rec_two_loss_dict.items() if k != "total_loss"}
+        rec_two_other_losses = {k: v.detach() for k, v in rec_two_loss_dict.items() if k != "total_loss"}
 
         other_losses = {f"rec_{k}_one": v for k, v in rec_one_other_losses.items()}
 
         other_losses.update({f"rec_{k}_two": v for k, v in rec_two_other_losses.items()})
 
         return {
-            "loss": total_loss.item(),
+            "loss": total_loss.detach(),
             **other_losses,
             **metrics,
         }
@@ -762,8 +1084,8 @@ class DualCMAM(Module):
 
             total_loss = rec_one_loss_dict["total_loss"] + rec_two_loss_dict["total_loss"]
 
-            rec_one_other_losses = {k: v.item() for k, v in rec_one_loss_dict.items() if k != "total_loss"}
-            rec_two_other_losses = {k: v.item() for k, v in rec_two_loss_dict.items() if k != "total_loss"}
+            rec_one_other_losses = {k: v.detach() for k, v in rec_one_loss_dict.items() if k != "total_loss"}
+            rec_two_other_losses = {k: v.detach() for k, v in rec_two_loss_dict.items() if k != "total_loss"}
 
             ## merge the two loss dicts and give them a prefix
             other_losses = {f"rec_{k}_one": v for k, v in rec_one_other_losses.items()}
@@ -771,7 +1093,7 @@ class DualCMAM(Module):
 
             if return_eval_data:
                 return {
-                    "loss": total_loss.item(),
+                    "loss": total_loss.detach(),
                     **other_losses,
                     "predictions": predictions,
                     "labels": labels,
@@ -783,7 +1105,7 @@ class DualCMAM(Module):
                 }
 
             return {
-                "loss": total_loss.item(),
+                "loss": total_loss.detach(),
                 **other_losses,
                 **metrics,
             }
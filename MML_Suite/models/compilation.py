@@ -0,0 +1,145 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import torch
+from experiment_utils import get_console, get_logger
+from torch.nn import Module
+
+logger = get_logger()
+console = get_console()
+
+COMPILE_METHODS = ("compile", "script")
+
+
+class GuardedForward:
+    """
+    Compiled (or scripted) forward of a module that falls back to the eager forward if compilation fails.
+
+    ``torch.compile`` compiles lazily, so failures only surface when the forward is called. An exception on the
+    first call, or a compiler error on a later one (e.g. when a new input shape triggers a recompilation), switches
+    the module back to its eager forward for the rest of the run; an error that is not caused by the compiler is
+    raised again by the eager forward. Other errors after the first call, such as running out of memory, are
+    raised as they are, since re-running the forward would repeat its side effects (e.g. batch norm statistics).
+
+    A scripted module keeps its own ``training`` flag, which follows the owning module's before every call.
+    """
+
+    def __init__(self, name: str, compiled: Callable, eager: Callable) -> None:
+        self.name = name
+        self.compiled = compiled
+        self.eager = eager
+        self.failed = False
+        self.called = False
+
+    def __call__(self, *args, **kwargs) -> Any:
+        if self.failed:
+            return self.eager(*args, **kwargs)
+        if isinstance(self.compiled, torch.jit.ScriptModule):
+            training = self.eager.__self__.training
+            if self.compiled.training != training:
+                self.compiled.train(training)
+        try:
+            output = self.compiled(*args, **kwargs)
+        except Exception as e:
+            if self.called and not isinstance(e, _compiler_errors()):
+                raise
+            self.failed = True
+            logger.warning(f"Compiled forward of '{self.name}' failed, falling back to eager: {e}")
+            console.print(f"[bold yellow]![/] Compiled forward of '{self.name}' failed, falling back to eager mode")
+            return self.eager(*args, **kwargs)
+        self.called = True
+        return output
+
+
+def _compiler_errors() -> Tuple[type, ...]:
+    errors = [torch.jit.Error]
+    try:
+        from torch._dynamo.exc import TorchDynamoException
+
+        errors.append(TorchDynamoException)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def _compile_forward(name: str, module: Module, method: str, options: Dict[str, Any]) -> bool:
+    eager = type(module).forward.__get__(module)
+    try:
+        if method == "script":
+            ## the scripted module shares its parameters with `module`, so the state dict is unchanged; it is not a
+            ## registered child, `GuardedForward` passes it the owner's training flag instead
+            compiled = torch.jit.script(module)
+        else:
+            compiled = torch.compile(eager, **options)
+    except Exception as e:
+        logger.warning(f"Could not {method} '{name}', keeping it eager: {e}")
+        console.print(f"[bold yellow]![/] Could not {method} '{name}', keeping it eager")
+        return False
+
+    module.forward = GuardedForward(name, compiled, eager)
+    return True
+
+
+def compile_model(model: Module, compile_config: bool | Dict[str, Any]) -> List[str]:
+    """
+    Compile the forward of a model, or of selected submodules, in place.
+
+    The compiled function replaces the module's ``forward`` attribute instead of wrapping the module, so the
+    models' ``train_step``/``validation_step`` (which call ``self.forward`` and their submodules directly) use it,
+    and parameter names and checkpoints are unaffected.
+
+    Args:
+        model (Module): Model to compile.
+        compile_config (bool | Dict[str, Any]): ``true`` or a mapping with the optional keys
+            ``method`` ("compile" or "script"), ``modules`` (dotted submodule names, defaults to the whole model),
+            ``options`` (keyword arguments of ``torch.compile``) and ``warmup``.
+
+    Returns:
+        List[str]: Names of the modules that were compiled.
+    """
+    compile_config = {} if compile_config is True else dict(compile_config)
+    method = compile_config.get("method", "compile")
+    if method not in COMPILE_METHODS:
+        raise ValueError(f"Invalid compile method '{method}', must be one of {COMPILE_METHODS}")
+    options = compile_config.get("options", {})
+    module_names = compile_config.get("modules") or [""]
+
+    compiled = []
+    for name in module_names:
+        module = model.get_submodule(name)
+        if _compile_forward(name or model.__class__.__name__, module, method, options):
+            compiled.append(name or model.__class__.__name__)
+    return compiled
+
+
+def restore_eager(model: Module) -> None:
+    """Undo `compile_model`, restoring the eager forward of every module."""
+    for module in model.modules():
+        if isinstance(module.__dict__.get("forward"), GuardedForward):
+            del module.forward
+
+
+def compile_failures(model: Module) -> Optional[List[str]]:
+    """Names of the compiled modules that fell back to eager mode, or None if nothing is compiled."""
+    guarded = [m.__dict__["forward"] for m in model.modules() if isinstance(m.__dict__.get("forward"), GuardedForward)]
+    if not guarded:
+        return None
+    return [forward.name for forward in guarded if forward.failed]
+
+
+@contextmanager
+def preserved_training_state(model: Module) -> Iterator[Module]:
+    """
+    Restore a model's parameters, persistent buffers (e.g. batch norm running statistics) and gradients on exit.
+
+    Used around warm-up steps, which run the compiled forward and backward in train mode on a real or synthetic
+    batch without leaving any trace of it in the model.
+    """
+    state = {name: value.detach().clone() for name, value in model.state_dict().items()}
+    grads = {name: param.grad for name, param in model.named_parameters()}
+    try:
+        yield model
+    finally:
+        model.load_state_dict(state)
+        for name, param in model.named_parameters():
+            param.grad = grads[name]
@@ -1,7 +1,11 @@
 # monitoring/model/base.py
-from typing import Any, Dict
+from itertools import chain
+from typing import Any, Dict, Optional
 
+import torch
 import torch.nn as nn
+from modalities import Modality
+from torch import Tensor
 
 
 class MonitoringMixin:
@@ -84,3 +88,143 @@ class MultiModalMonitoringMixin(MonitoringMixin):
 
         data["modalities"] = modality_data
         return data
+
+
+class MissingModalityMixin:
+    """
+    Mixin for fusion models that avoid running encoders on masked (all-zero) modality inputs.
+
+    A masked modality is an all-zero input, so its embedding is the encoder output for zeros. This mixin
+    computes that embedding from a single zero row and uses it for every row where the modality is absent:
+
+    - `encode_present` only runs the encoder on the rows whose modality is present in the batch.
+    - `pattern_logits` encodes each modality once and assembles the logits of every missing pattern.
+
+    Usage:
+        class MyModel(nn.Module, MissingModalityMixin):
+            def get_encoder(self, modality): ...
+            def classify_embeddings(self, embeddings): ...
+    """
+
+    def zero_input_embedding(self, modality: Modality, data: Tensor) -> Tensor:
+        """
+        Embedding of an all-zero input for a modality, shaped (1, D).
+
+        With gradients enabled the embedding is recomputed on every call (once per forward, i.e. once per
+        weight update). Without gradients it is cached until the encoder's parameters or buffers change.
+
+        The encoder is called without extra inputs, so a sequence encoder sees an all-zero sequence of the full
+        padded length of `data`, exactly as an absent modality is encoded without packing. Models that pack
+        sequences by length give their absent rows the padded length for the same result (see `UttFusionModel`).
+
+        Args:
+            modality (Modality): Modality of the encoder.
+            data (Tensor): A batch of inputs for the modality, used for shape, dtype and device.
+
+        Returns:
+            Tensor: Encoder output for a single all-zero sample.
+        """
+        encoder = self.get_encoder(modality)
+        if torch.is_grad_enabled():
+            return encoder(torch.zeros_like(data[:1]))
+
+        key = (
+            tuple(data.shape[1:]),
+            data.dtype,
+            data.device,
+            encoder.training,
+            tuple(t._version for t in chain(encoder.parameters(), encoder.buffers())),
+        )
+        cache = getattr(self, "_zero_embedding_cache", None)
+        if cache is None:
+            cache = self._zero_embedding_cache = {}
+        if modality not in cache or cache[modality][0] != key:
+            cache[modality] = (key, encoder(torch.zeros_like(data[:1])))
+        return cache[modality][1]
+
+    def encode_present(
+        self, modality: Modality, data: Tensor, presence: Optional[Tensor] = None, **encoder_kwargs: Tensor
+    ) -> Tensor:
+        """
+        Encode a modality, running the encoder only on the rows where it is present.
+
+        Encoders with batch normalisation are always run on the full batch while training, since their
+        batch statistics depend on every row.
+
+        Args:
+            modality (Modality): Modality of the encoder.
+            data (Tensor): Batch of (masked) inputs for the modality.
+            presence (Optional[Tensor]): Missing mask column of shape (B,), zero where the modality is absent.
+            **encoder_kwargs (Tensor): Per-row encoder inputs (e.g. sequence lengths), selected along with `data`.
+                Absent rows use the zero-input embedding, which is computed without them, i.e. at the full padded
+                length (see `zero_input_embedding`), except on the full-batch path where the caller's values apply.
+
+        Returns:
+            Tensor: Embedding of every row of the batch.
+        """
+        encoder = self.get_encoder(modality)
+        if presence is None or (encoder.training and _has_batch_norm(encoder)):
+            return encoder(data, **encoder_kwargs)
+
+        present = presence.to(device=data.device) != 0
+        if bool(present.all()):
+            return encoder(data, **encoder_kwargs)
+
+        zero_embedding = self.zero_input_embedding(modality, data)
+        embedding = zero_embedding.expand(data.size(0), *zero_embedding.shape[1:])
+        if not bool(present.any()):
+            return embedding
+        present_kwargs = {name: value[present.to(value.device)] for name, value in encoder_kwargs.items()}
+        present_embedding = encoder(data[present], **present_kwargs)
+        return embedding.index_put((present,), present_embedding.to(embedding.dtype))
+
+    def pattern_logits(
+        self,
+        inputs: Dict[Modality, Tensor],
+        patterns: Dict[str, Dict[str, float]],
+        encoder_kwargs: Optional[Dict[Modality, Dict[str, Tensor]]] = None,
+    ) -> Dict[str, Tensor]:
+        """
+        Compute the logits of every pattern from a single pass through each encoder.
+
+        Must be called in eval mode, where the encoders are deterministic and row-independent.
+
+        Args:
+            inputs (Dict[Modality, Tensor]): Unmasked inputs of every modality.
+            patterns (Dict[str, Dict[str, float]]): Pattern names mapped to their per-modality presence.
+            encoder_kwargs (Optional[Dict[Modality, Dict[str, Tensor]]]): Extra encoder inputs per modality,
+                e.g. sequence lengths. They only apply to present modalities, absent ones use the zero-input
+                embedding at the full padded length.
+
+        Returns:
+            Dict[str, Tensor]: Logits for each pattern.
+
+        Raises:
+            ValueError: If a pattern has a presence probability other than 0 or 1.
+        """
+        encoder_kwargs = encoder_kwargs or {}
+        embeddings = {
+            modality: self.get_encoder(modality)(data, **encoder_kwargs.get(modality, {}))
+            for modality, data in inputs.items()
+        }
+        zero_embeddings = {modality: self.zero_input_embedding(modality, data) for modality, data in inputs.items()}
+
+        logits = {}
+        for pattern_name, pattern in patterns.items():
+            pattern_embeddings = {}
+            for modality, embedding in embeddings.items():
+                presence = pattern.get(str(modality), 0.0)
+                if presence not in (0.0, 1.0):
+                    raise ValueError(
+                        f"Pattern-bucketed evaluation requires binary patterns, got {presence} for "
+                        f"{modality} in pattern '{pattern_name}'"
+                    )
+                pattern_embeddings[modality] = (
+                    embedding if presence == 1.0 else zero_embeddings[modality].expand_as(embedding)
+                )
+            logits[pattern_name] = self.classify_embeddings(pattern_embeddings)
+        return logits
+
+
+def _has_batch_norm(module: nn.Module) -> bool:
+    return any(isinstance(m, nn.modules.batchnorm._BatchNorm) for m in module.modules())
@@ -1,15 +1,17 @@
 from collections import defaultdict
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import numpy as np
 import torch
 from data.mmimdb import MMIMDb as MMIMDbDataset
 from experiment_utils.loss import LossFunctionGroup
 from experiment_utils.metric_recorder import MetricRecorder
+from experiment_utils.precision import FP32, PrecisionPolicy
 from experiment_utils.utils import safe_detach
 from modalities import Modality
 from models.gates import GatedBiModalNetwork
 from models.maxout import MaxOut
+from models.mixins import MissingModalityMixin
 from torch import Tensor
 from torch.nn import (
     BatchNorm1d,
@@ -66,7 +68,7 @@ class MMIMDbModalityEncoder(Module):
         return self.net(x)
 
 
-class GMUModel(Module):
+class GMUModel(Module, MissingModalityMixin):
     def __init__(
         self,
         image_encoder: MMIMDbModalityEncoder,
@@ -129,6 +131,10 @@ class GMUModel(Module):
         # Combine encoder and classifier parameters
         return {**encoder_params, **gmu_params, **classifier_params}
 
+    def classify_embeddings(self, embeddings: Dict[Modality, Tensor]) -> Tensor:
+        z = self.gmu(embeddings[Modality.IMAGE], embeddings[Modality.TEXT])
+        return self.mm_mlp(z)
+
     def forward(
         self,
         I: Tensor,
@@ -136,12 +142,15 @@ class GMUModel(Module):
         *,
         is_embd_I: bool = False,
         is_embd_T: bool = False,
+        missing_mask: Optional[Dict[Modality, Tensor]] = None,
     ) -> Tensor:
         assert not all((I is None, T is None)), "At least one modality must be provided"
         assert not all((is_embd_I, is_embd_T)), "Cannot both be embeddings"
 
-        image = self.image_model(I) if not is_embd_I else I
-        text = self.text_model(T) if not is_embd_T else T
+        ## rows with an absent modality use the cached zero-input embedding instead of running the encoder
+        missing_mask = missing_mask or {}
+        image = self.encode_present(Modality.IMAGE, I, missing_mask.get(Modality.IMAGE)) if not is_embd_I else I
+        text = self.encode_present(Modality.TEXT, T, missing_mask.get(Modality.TEXT)) if not is_embd_T else T
 
         z = self.gmu(image, text)
         logits = self.mm_mlp(z)
@@ -155,6 +164,7 @@ class GMUModel(Module):
         criterion: LossFunctionGroup,
         device: torch.device,
         metric_recorder: MetricRecorder,
+        precision: PrecisionPolicy = FP32,
     ) -> dict[str, Any]:
         I, T, labels, miss_type = (
             batch[Modality.IMAGE],
@@ -175,19 +185,16 @@ class GMUModel(Module):
         self.train()
         optimizer.zero_grad()
 
-        logits = self.forward(I=I, T=T)
-        loss = criterion(logits, labels)
-        loss.backward()
-        optimizer.step()
-
-        predictions = safe_detach(torch.nn.functional.sigmoid(logits))
-        predictions = (predictions > self.binary_threshold).astype(int)
-
-        labels = safe_detach(labels)
+        with precision.autocast():
+            logits = self.forward(I=I, T=T, missing_mask=batch.get("missing_mask"))
+            loss = criterion(logits, labels)
+        precision.backward(loss)
+        precision.step(optimizer)
 
-        miss_type = np.array(miss_type)
-        metric_recorder.update_all(predictions=predictions, targets=labels, m_types=miss_type)
-        return {"loss": loss.item()}
+        ## the recorder copies to the host unless it keeps its metric states on the device
+        predictions = (torch.sigmoid(logits.detach()) > self.binary_threshold).long()
+        metric_recorder.update_all(predictions=predictions, targets=labels, m_types=np.array(miss_type))
+        return {"loss": loss.detach()}
 
     def validation_step(
         self,
@@ -196,6 +203,7 @@ class GMUModel(Module):
         device: torch.device,
         metric_recorder: MetricRecorder,
         return_test_info: bool = False,
+        patterns: Optional[Dict[str, Dict[str, float]]] = None,
     ):
         self.eval()
 
@@ -221,15 +229,36 @@ class GMUModel(Module):
             I = I.float()
             T = T.float()
 
-            logits = self.forward(I=I, T=T)
+            if patterns is not None:
+                ## pattern-bucketed evaluation, every pattern from a single encoder pass
+                pattern_logits = self.pattern_logits({Modality.IMAGE: I, Modality.TEXT: T}, patterns)
+                losses = []
+                for pattern_name, logits in pattern_logits.items():
+                    losses.append(criterion(logits, labels))
+                    predictions = (torch.sigmoid(logits) > self.binary_threshold).long()
+                    metric_recorder.update(predictions=predictions, targets=labels, modality=pattern_name)
+                    if return_test_info:
+                        all_predictions.append(safe_detach(predictions))
+                        all_labels.append(safe_detach(labels))
+                        all_miss_types.append([pattern_name] * len(labels))
+                self.train()
+                loss = torch.stack(losses).mean()
+                if return_test_info:
+                    return {
+                        "loss": loss,
+                        "predictions": all_predictions,
+                        "labels": all_labels,
+                        "miss_types": all_miss_types,
+                    }
+                return {"loss": loss}
+
+            logits = self.forward(I=I, T=T, missing_mask=batch.get("missing_mask"))
             loss = criterion(logits, labels)
-            predictions = safe_detach(torch.nn.functional.sigmoid(logits))
-            predictions = (predictions > 0.5).astype(int)
+            predictions = (torch.sigmoid(logits) > 0.5).long()
 
-            labels = safe_detach(labels)
             if return_test_info:
-                all_predictions.append(predictions)
-                all_labels.append(labels)
+                all_predictions.append(safe_detach(predictions))
+                all_labels.append(safe_detach(labels))
                 all_miss_types.append(miss_type)
             miss_type = np.array(miss_type)
             metric_recorder.update_all(predictions=predictions, targets=labels, m_types=miss_type)
@@ -237,13 +266,13 @@ class GMUModel(Module):
 
         if return_test_info:
             return {
-                "loss": loss.item(),
+                "loss": loss.detach(),
                 "predictions": all_predictions,
                 "labels": all_labels,
                 "miss_types": all_miss_types,
             }
 
-        return {"loss": loss.item()}
+        return {"loss": loss.detach()}
 
     def get_embeddings(self, dataloader: DataLoader, device: torch.device) -> Dict[Modality, np.ndarray]:
         """
@@ -8,6 +8,7 @@ import torch.nn.functional as F
 from experiment_utils import safe_detach
 from experiment_utils.loss import LossFunctionGroup
 from experiment_utils.metric_recorder import MetricRecorder
+from experiment_utils.precision import FP32, PrecisionPolicy
 from modalities import Modality
 from models.msa import FcClassifier, LSTMEncoder, ResidualAE, TextCNN, UttFusionModel
 from torch import Tensor
@@ -16,6 +17,9 @@ from torch.optim import Optimizer
 
 
 class MMIN(Module):
+    ## the train/validation steps read the "{modality}_reverse" views of the batch
+    requires_reverse_views = True
+
     def __init__(
         self,
         netA: LSTMEncoder,
@@ -107,6 +111,7 @@ class MMIN(Module):
         loss_functions: LossFunctionGroup,
         device: torch.device,
         metric_recorder: MetricRecorder,
+        precision: PrecisionPolicy = FP32,
         **kwargs,
     ) -> Dict:
         A, V, T, A_reverse, V_reverse, T_reverse, labels, miss_types = (
@@ -134,24 +139,26 @@ class MMIN(Module):
         self.train()
         optimizer.zero_grad()
 
-        forward_results = self(A, V, T, A_reverse, V_reverse, T_reverse)
-        predictions = forward_results["logits"].argmax(dim=1)
+        with precision.autocast():
+            forward_results = self(A, V, T, A_reverse, V_reverse, T_reverse)
+            predictions = forward_results["logits"].argmax(dim=1)
 
-        loss_ce = loss_functions["ce"](forward_results["logits"], labels)
-        loss_mse = loss_functions["mse"](forward_results["fusion"], forward_results["recon_fusion"])
-        loss_cycle = loss_functions["cycle"](
-            safe_detach(forward_results["fusion"], to_np=False), forward_results["recon_cycle"]
-        )
+            loss_ce = loss_functions["ce"](forward_results["logits"], labels)
+            loss_mse = loss_functions["mse"](forward_results["fusion"], forward_results["recon_fusion"])
+            loss_cycle = loss_functions["cycle"](
+                safe_detach(forward_results["fusion"], to_np=False), forward_results["recon_cycle"]
+            )
 
-        loss = loss_ce + loss_mse + loss_cycle
-        loss.backward()
+            loss = loss_ce + loss_mse + loss_cycle
+        precision.backward(loss)
 
         ## Clip gradients excluding the pre-trained module
+        precision.unscale_(optimizer)
         for parameter in self.parameters():
             if torch.requires_grad_(parameter):
                 torch.nn.utils.clip_grad_norm_(parameter, self.clip)
 
-        optimizer.step()
+        precision.step(optimizer)
         labels = safe_detach(labels)
         predictions = safe_detach(predictions)
         for m_type in set(miss_types):
@@ -159,7 +166,7 @@ class MMIN(Module):
             mask_preds = predictions[mask]
             mask_labels = labels[mask]
             metric_recorder.update(predictions=mask_preds, targets=mask_labels, modality=m_type)
-        return {"loss": loss.item()}
+        return {"loss": loss.detach()}
 
     def validation_step(
         self,
@@ -212,4 +219,4 @@ class MMIN(Module):
                 mask_preds = predictions[mask]
                 mask_labels = labels[mask]
                 metric_recorder.update(predictions=mask_preds, targets=mask_labels, modality=m_type)
-            return {"loss": loss.item()}
+            return {"loss": loss.detach()}
@@ -1,10 +1,11 @@
 """Multimodal Transformer for cross-modal interaction and fusion."""
 
-from typing import Any, Dict, Literal, Tuple, Union
+from typing import Any, Dict, Literal, Optional, Tuple, Union
 
 import numpy as np
 import torch
 import torch.nn.functional as F
+from experiment_utils.precision import FP32, PrecisionPolicy
 from experiment_utils.utils import to_gpu_safe
 from modalities import Modality
 from torch import Tensor
@@ -12,7 +13,7 @@ from torch.nn import BCELoss, Linear, Module, ModuleDict
 from torch.optim import Optimizer
 from torch.utils.data import DataLoader
 
-from .networks import GatedTransformer, LanguageEmbeddingLayer, SeqEncoder
+from .networks import GatedTransformer, LanguageEmbeddingLayer, SeqEncoder, SinusoidalPositionalEmbedding
 
 
 class MultModalTransformer(Module):
@@ -42,6 +43,8 @@ class MultModalTransformer(Module):
         output_dim: Dimension of final output
         div_dropout: Dropout rate for domain-invariant encoder
         use_bert: Whether to use BERT for text embedding
+        attention_backend: Attention implementation of the gated transformers, "eager" or fused "sdpa"
+        feature_cache_dir: Directory of the on-disk feature cache of the frozen BERT text encoder (optional)
     """
 
     def __init__(
@@ -72,11 +75,14 @@ class MultModalTransformer(Module):
         lambda_d: float = 0.1,
         use_discriminator: bool = True,
         clip_grad_norm: float = 0.8,
+        attention_backend: Literal["eager", "sdpa"] = "eager",
+        feature_cache_dir: Optional[str] = None,
     ) -> None:
         super().__init__()
 
         # Configuration
         self.use_bert = use_bert
+        self.feature_cache_dir = feature_cache_dir
         self.orig_dim_a = orig_dim_a
         self.orig_dim_t = orig_dim_t
         self.orig_dim_v = orig_dim_v
@@ -103,6 +109,7 @@ class MultModalTransformer(Module):
 
         # Other parameters
         self.attention_mask = attention_mask
+        self.attention_backend = attention_backend
         self.a_ksize = a_ksize
         self.t_ksize = t_ksize
         self.v_ksize = v_ksize
@@ -127,6 +134,7 @@ class MultModalTransformer(Module):
             word2id=word2id if not self.use_bert else None,
             embedding_dim=self.orig_dim_t if not self.use_bert else None,
             bert_model_name="bert-base-uncased",
+            feature_cache_dir=self.feature_cache_dir,
         )
 
     def _init_encoders(self) -> None:
@@ -143,11 +151,12 @@ class MultModalTransformer(Module):
             v_ksize=self.v_ksize,
         )
 
-        # Initialize cross-modal interaction networks
+        # Initialize cross-modal interaction networks, sharing one positional embedding table
+        positions = SinusoidalPositionalEmbedding(self.embedding_dim)
         self.modality_interaction = ModuleDict(
             {
-                Modality.TEXT + Modality.VIDEO: self._get_network(layers=self.num_layers),
-                Modality.TEXT + Modality.AUDIO: self._get_network(layers=self.num_layers),
+                Modality.TEXT + Modality.VIDEO: self._get_network(layers=self.num_layers, embed_positions=positions),
+                Modality.TEXT + Modality.AUDIO: self._get_network(layers=self.num_layers, embed_positions=positions),
             }
         )
 
@@ -158,12 +167,18 @@ class MultModalTransformer(Module):
         self.projection_two = Linear(self.fused_dim, self.fused_dim)
         self.output_layer = Linear(self.fused_dim, self.output_dim)
 
-    def _get_network(self, _type: Modality = Modality.TEXT, layers: int = 2) -> GatedTransformer:
+    def _get_network(
+        self,
+        _type: Modality = Modality.TEXT,
+        layers: int = 2,
+        embed_positions: Optional[SinusoidalPositionalEmbedding] = None,
+    ) -> GatedTransformer:
         """Create a gated transformer network for cross-modal interaction.
 
         Args:
             _type: Modality type (unused, kept for compatibility)
             layers: Number of transformer layers
+            embed_positions: Positional embedding shared between the networks
 
         Returns:
             Configured GatedTransformer instance
@@ -178,6 +193,8 @@ class MultModalTransformer(Module):
             embed_dropout=self.embd_dropout,
             attention_mask=self.attention_mask,
             div_dropout=self.div_dropout,
+            attn_backend=self.attention_backend,
+            embed_positions=embed_positions,
         )
 
     def _apply_sequence_pooling(
@@ -326,7 +343,13 @@ class MultModalTransformer(Module):
         return {"predictions": output, "features": features}
 
     def train_step(
-        self, batch: Dict[str, Any], criterion: Module, optimizer: Optimizer, device: torch.device, **kwargs
+        self,
+        batch: Dict[str, Any],
+        criterion: Module,
+        optimizer: Optimizer,
+        device: torch.device,
+        precision: PrecisionPolicy = FP32,
+        **kwargs,
     ) -> Dict[str, Any]:
         A, V, T, lengths, labels = (
             batch[Modality.AUDIO],
@@ -343,25 +366,27 @@ class MultModalTransformer(Module):
         labels = labels.to(device)
 
         optimizer.zero_grad()
-        outputs = self(A, V, T, is_embedded_A=False, is_embedded_V=False, is_embedded_T=False)
-        predictions = outputs["predictions"]
-        features = outputs["features"]
+        with precision.autocast():
+            outputs = self(A, V, T, is_embedded_A=False, is_embedded_V=False, is_embedded_T=False)
+            predictions = outputs["predictions"]
+            features = outputs["features"]
 
-        loss = criterion(predictions, labels)
+            loss = criterion(predictions, labels)
 
-        if self.use_discriminator:
-            disc_predictions = features["discriminator_predictions"]
-            disc_labels = features["discriminator_labels"]
-            disc_loss = self.criterion_disc(disc_predictions, disc_labels)
-            loss += self.lambda_d * disc_loss
+            if self.use_discriminator:
+                disc_predictions = features["discriminator_predictions"]
+                disc_labels = features["discriminator_labels"]
+                disc_loss = self.criterion_disc(disc_predictions, disc_labels)
+                loss += self.lambda_d * disc_loss
 
-        loss.backward()
+        precision.backward(loss)
+        precision.unscale_(optimizer)
         torch.nn.utils.clip_grad_norm_(self.parameters(), self.clip_grad_norm)
-        optimizer.step()
+        precision.step(optimizer)
 
         ## Metrics
 
-        return {"loss": loss.item()}
+        return {"loss": loss.detach()}
 
     def validation_step(self, batch: Dict[str, Any], criterion: Module, device: torch.device) -> Dict[str, Any]:
         pass
@@ -0,0 +1,199 @@
+import atexit
+import hashlib
+import os
+import uuid
+from contextlib import contextmanager
+from os import PathLike
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+from experiment_utils import get_logger
+from experiment_utils.utils import model_fingerprint
+
+__all__ = ["BertFeatureCache", "eval_mode", "model_fingerprint"]
+
+logger = get_logger()
+
+INDEX_FILE = "index.tsv"
+SHARD_BYTES = 256 * 2**20
+
+
+@contextmanager
+def eval_mode(model: nn.Module) -> Iterator[nn.Module]:
+    """
+    Run a model in eval mode, restoring its previous mode afterwards.
+
+    Cached features are served in every mode, so they must be computed without dropout, whatever the mode of the
+    parent module when they are first requested.
+    """
+    training = model.training
+    model.eval()
+    try:
+        yield model
+    finally:
+        model.train(training)
+
+
+class BertFeatureCache:
+    """
+    Content-addressed, memory-mapped on-disk store of frozen BERT features.
+
+    Every sample is keyed by a hash of its ``(input_ids, input_mask, segment_ids)`` rows, and the store lives in
+    a directory named after the fingerprint of the BERT checkpoint, so features can never be served for other
+    weights or other inputs. Newly computed features are buffered in memory and written out as ``.npy`` shards
+    of about `shard_bytes` (on `flush`, at exit, or once the buffer is full) that are read back memory-mapped,
+    and `index.tsv` maps each key to its shard and row. The store can be filled offline with `prefill` and is
+    shared by every run that uses the same checkpoint.
+    """
+
+    def __init__(
+        self, cache_dir: PathLike, fingerprint: str, dtype: np.dtype = np.float32, shard_bytes: int = SHARD_BYTES
+    ) -> None:
+        """
+        Open (or create) the store of a BERT checkpoint.
+
+        Args:
+            cache_dir (PathLike): Root directory of the feature cache.
+            fingerprint (str): Fingerprint of the BERT weights, see `model_fingerprint`.
+            dtype (np.dtype): Storage dtype of the features.
+            shard_bytes (int): Size of the buffered features that triggers writing a shard.
+        """
+        self.store_dir = Path(cache_dir) / fingerprint
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype)
+        self.shard_bytes = shard_bytes
+        self.index: Dict[str, Tuple[str, int]] = {}
+        self._shards: Dict[str, np.ndarray] = {}
+        self._pending: Dict[str, np.ndarray] = {}
+        self._pending_bytes = 0
+        self._load_index()
+        atexit.register(self.flush)
+
+    def _load_index(self) -> None:
+        index_fp = self.store_dir / INDEX_FILE
+        if not index_fp.exists():
+            return
+        with open(index_fp) as f:
+            for line in f:
+                parts = line.split()
+                ## a line is only complete once its shard has been written, skip torn writes
+                if len(parts) != 3:
+                    continue
+                key, shard, row = parts
+                self.index[key] = (shard, int(row))
+        logger.info(f"Loaded BERT feature cache with {len(self.index)} entries from {self.store_dir}")
+
+    def __len__(self) -> int:
+        return len(self.index) + len(self._pending)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index or key in self._pending
+
+    @staticmethod
+    def keys(input_ids: torch.Tensor, input_mask: torch.Tensor, segment_ids: torch.Tensor) -> List[str]:
+        """Content hash of every sample of a batch."""
+        rows = torch.stack((input_ids.long(), input_mask.long(), segment_ids.long()), dim=1).cpu().numpy()
+        return [hashlib.sha1(row.tobytes()).hexdigest() for row in rows]
+
+    def _shard(self, shard: str) -> np.ndarray:
+        if shard not in self._shards:
+            self._shards[shard] = np.load(self.store_dir / f"shard_{shard}.npy", mmap_mode="r")
+        return self._shards[shard]
+
+    def _row(self, key: str) -> np.ndarray:
+        if key in self._pending:
+            return self._pending[key]
+        shard, row = self.index[key]
+        return self._shard(shard)[row]
+
+    def _append(self, keys: List[str], features: torch.Tensor) -> None:
+        """Buffer newly computed features, writing them out once the buffer reaches `shard_bytes`."""
+        ## upcast first, numpy has no bfloat16, and copy so the buffered rows never alias the returned features
+        rows = np.array(features.detach().float().cpu().numpy(), dtype=self.dtype)
+        for key, row in zip(keys, rows):
+            self._pending[key] = row
+            self._pending_bytes += row.nbytes
+        if self._pending_bytes >= self.shard_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered features as a single shard and index them."""
+        if not self._pending:
+            return
+        keys = list(self._pending)
+        ## unique shard names let concurrent runs append to the same store
+        shard = uuid.uuid4().hex
+
+        ## write the shard atomically before indexing it, so a crash never leaves dangling index entries
+        shard_fp = self.store_dir / f"shard_{shard}.npy"
+        tmp_fp = self.store_dir / f".shard_{shard}.npy.tmp"
+        with open(tmp_fp, "wb") as f:
+            np.save(f, np.stack([self._pending[key] for key in keys]))
+        os.replace(tmp_fp, shard_fp)
+
+        with open(self.store_dir / INDEX_FILE, "a") as f:
+            f.writelines(f"{key} {shard} {row}\n" for row, key in enumerate(keys))
+        for row, key in enumerate(keys):
+            self.index[key] = (shard, row)
+        self._pending.clear()
+        self._pending_bytes = 0
+        logger.debug(f"Wrote BERT feature shard {shard} with {len(keys)} entries")
+
+    def get_or_compute(
+        self,
+        input_ids: torch.Tensor,
+        input_mask: torch.Tensor,
+        segment_ids: torch.Tensor,
+        compute_fn: Callable[[torch.Tensor, torch.Tensor, torch.Tensor], torch.Tensor],
+    ) -> torch.Tensor:
+        """
+        Serve the features of a batch from the store, running BERT only on the samples not stored yet.
+
+        Args:
+            input_ids (torch.Tensor): Token ids, shape (B, L).
+            input_mask (torch.Tensor): Attention mask, shape (B, L).
+            segment_ids (torch.Tensor): Token type ids, shape (B, L).
+            compute_fn (Callable): Runs BERT on a subset of the batch and returns (b, L, H) features.
+
+        Returns:
+            torch.Tensor: float32 features of shape (B, L, H) on the device of `input_ids`, whether they were
+                computed (possibly under autocast) or read from the store.
+        """
+        keys = self.keys(input_ids, input_mask, segment_ids)
+        missing = [i for i, key in enumerate(keys) if key not in self]
+
+        if missing:
+            missing_idx = torch.tensor(missing, device=input_ids.device)
+            computed = compute_fn(input_ids[missing_idx], input_mask[missing_idx], segment_ids[missing_idx])
+            ## the same sentence can appear several times in a batch, store it once
+            unique = {keys[i]: row for row, i in enumerate(missing)}
+            self._append(list(unique), computed[list(unique.values())])
+            if len(missing) == len(keys):
+                return computed.float()
+
+        features = np.stack([self._row(key) for key in keys])
+        return torch.from_numpy(features).to(device=input_ids.device, dtype=torch.float32)
+
+    @torch.no_grad()
+    def prefill(
+        self,
+        batches,
+        compute_fn: Callable[[torch.Tensor, torch.Tensor, torch.Tensor], torch.Tensor],
+    ) -> int:
+        """
+        Fill the store offline from an iterable of ``(batch_size, 3, seq_len)`` BERT inputs.
+
+        Args:
+            batches: Iterable of stacked ``input_ids, input_mask, segment_ids`` tensors.
+            compute_fn (Callable): Runs BERT on a batch and returns its features.
+
+        Returns:
+            int: Number of entries in the store afterwards.
+        """
+        for text in batches:
+            self.get_or_compute(text[:, 0, :].long(), text[:, 1, :].float(), text[:, 2, :].long(), compute_fn)
+        self.flush()
+        return len(self)
@@ -1,12 +1,14 @@
 ## This file was taken and modified from https://github.com/declare-lab/MSA-Robustness/blob/main/Self-MM/models/subNets/BertTextEncoder.py
 from os import PathLike
-from typing import Literal
+from typing import Literal, Optional
 
 import torch
 import torch.nn as nn
 from experiment_utils import format_path_with_env
 from transformers import BertModel, BertTokenizer
 
+from .bert_feature_cache import BertFeatureCache, eval_mode, model_fingerprint
+
 __all__ = ["BertTextEncoder"]
 
 
@@ -16,9 +18,11 @@ class BertTextEncoder(nn.Module):
         language: Literal["en", "ch"] = "en",
         use_finetune: bool = False,
         pretrained_path: PathLike = "pretrained_model/bert_en",
+        feature_cache_dir: Optional[PathLike] = None,
     ):
         """
         language: en / cn
+        feature_cache_dir: directory of the on-disk BERT feature cache, only used when use_finetune is False
         """
         super(BertTextEncoder, self).__init__()
         pretrained_path = format_path_with_env(pretrained_path)
@@ -33,6 +37,19 @@ class BertTextEncoder(nn.Module):
         self.model = model_class.from_pretrained(pretrained_path)
 
         self.use_finetune = use_finetune
+        self.feature_cache_dir = feature_cache_dir if not use_finetune else None
+        self._feature_cache = None
+
+    @property
+    def feature_cache(self):
+        """
+        Feature cache of the frozen BERT model, opened on first use since a checkpoint may still replace the weights
+        """
+        if self._feature_cache is None and self.feature_cache_dir is not None:
+            self._feature_cache = BertFeatureCache(
+                format_path_with_env(str(self.feature_cache_dir)), model_fingerprint(self.model)
+            )
+        return self._feature_cache
 
     def get_tokenizer(self):
         return self.tokenizer
@@ -65,15 +82,36 @@ class BertTextEncoder(nn.Module):
                 attention_mask=input_mask,
                 token_type_ids=segment_ids,
             )[0]  # Models outputs are now tuples
+        elif self.feature_cache_dir is not None:
+            # frozen BERT: every sentence is encoded once and then served from the cache
+            last_hidden_states = self.feature_cache.get_or_compute(
+                input_ids, input_mask, segment_ids, self._cached_features
+            )
         else:
-            with torch.no_grad():
-                last_hidden_states = self.model(
-                    input_ids=input_ids,
-                    attention_mask=input_mask,
-                    token_type_ids=segment_ids,
-                )[0]  # Models outputs are now tuples
+            last_hidden_states = self._frozen(input_ids, input_mask, segment_ids)
         return last_hidden_states
 
+    @torch.no_grad()
+    def _frozen(self, input_ids, input_mask, segment_ids):
+        return self.model(
+            input_ids=input_ids,
+            attention_mask=input_mask,
+            token_type_ids=segment_ids,
+        )[0]  # Models outputs are now tuples
+
+    def _cached_features(self, input_ids, input_mask, segment_ids):
+        # the stored features are served in every mode, so they are computed without dropout
+        with eval_mode(self.model):
+            return self._frozen(input_ids, input_mask, segment_ids)
+
+    def prefill_cache(self, batches):
+        """
+        Fill the feature cache offline.
+        batches: iterable of (batch_size, 3, seq_len) tensors on the device of the model
+        """
+        assert self.feature_cache_dir is not None, "No feature cache configured (feature_cache_dir, use_finetune=False)"
+        return self.feature_cache.prefill(batches, self._cached_features)
+
 
 if __name__ == "__main__":
     bert_normal = BertTextEncoder()
@@ -25,13 +25,35 @@ def create_future_mask(tensor_one: Tensor, tensor_two: Optional[Tensor] = None)
     if tensor_two is not None:
         dim_two = tensor_two.size(0)
 
-    future_mask = torch.triu(_fill_negative_infinity(torch.ones(dim_one, dim_two)), 1 + abs(dim_two - dim_one))
-
-    if tensor_one.is_cuda:
-        future_mask = future_mask.cuda()
+    future_mask = torch.triu(
+        _fill_negative_infinity(torch.ones(dim_one, dim_two, device=tensor_one.device)), 1 + abs(dim_two - dim_one)
+    )
     return future_mask[:dim_one, :dim_two]
 
 
+def create_padding_masks(
+    lengths: Tensor, seq_len: int, device: Optional[torch.device] = None
+) -> Tuple[Tensor, Tensor]:
+    """Creates the attention masks of right-padded sequences with one broadcasted comparison.
+
+    Args:
+        lengths: Tensor of actual sequence lengths, shape (batch_size,)
+        seq_len: Padded sequence length
+        device: Device of the masks, defaults to the device of `lengths`
+
+    Returns:
+        Tuple of
+            - additive mask of shape (batch_size, 1, seq_len), -inf at the padded keys
+            - multiplicative mask of shape (batch_size, seq_len, seq_len), 0 where the query or the key is padding
+    """
+    device = device if device is not None else lengths.device
+    valid = torch.arange(seq_len, device=device) < lengths.to(device).unsqueeze(-1)
+
+    add_mask = torch.zeros(valid.shape, device=device).masked_fill_(~valid, float("-inf")).unsqueeze(1)
+    mul_mask = (valid.unsqueeze(2) & valid.unsqueeze(1)).float()
+    return add_mask, mul_mask
+
+
 def _fill_negative_infinity(tensor: Tensor) -> Tensor:
     """Fills a tensor with negative infinity in a FP16-compatible way.
 
@@ -88,6 +110,7 @@ class TransformerEncoderLayer(Module):
         relu_dropout: Dropout rate for ReLU activations
         res_dropout: Dropout rate for residual connections
         attn_mask: Whether to use attention masking
+        attn_backend: Attention implementation, "eager" or fused "sdpa"
     """
 
     def __init__(
@@ -98,6 +121,7 @@ class TransformerEncoderLayer(Module):
         relu_dropout: float = 0.1,
         res_dropout: float = 0.1,
         attn_mask: bool = False,
+        attn_backend: str = "eager",
     ) -> None:
         super().__init__()
         self.embed_dim = embed_dim
@@ -105,7 +129,7 @@ class TransformerEncoderLayer(Module):
 
         # Multi-head attention
         self.self_attn = MultiheadAttention(
-            embed_dim=self.embed_dim, num_heads=self.num_heads, attn_dropout=attn_dropout
+            embed_dim=self.embed_dim, num_heads=self.num_heads, attn_dropout=attn_dropout, backend=attn_backend
         )
         self.attn_mask = attn_mask
 
@@ -125,42 +149,6 @@ class TransformerEncoderLayer(Module):
         # Layer normalization
         self.layer_norms = ModuleList([create_layer_norm(self.embed_dim) for _ in range(2)])
 
-    def _create_attention_mask(
-        self, batch_size: int, length_one: int, length_two: int, lengths: Tensor, is_language_projection: bool = False
-    ) -> Tuple[Tensor, Tensor]:
-        """Creates attention masks for the transformer.
-
-        Args:
-            batch_size: Size of batch
-            length_one: Length of first sequence
-            length_two: Length of second sequence
-            lengths: Tensor of actual sequence lengths
-            is_language_projection: Whether projecting to language modality
-
-        Returns:
-            Tuple of (additive mask, multiplicative mask)
-        """
-        assert length_one == length_two
-
-        bool_mask_one = torch.cuda.BoolTensor(batch_size, length_one, length_two)
-        bool_mask_two = torch.cuda.BoolTensor(batch_size, length_one, length_two)
-
-        for idx, length in enumerate(lengths):
-            bool_mask_two[idx, :, :] = False
-            if length < length_one:
-                bool_mask_one[idx, length:, :] = True
-                bool_mask_one[idx, :, length:] = True
-                bool_mask_two[idx, :, length:] = True
-            bool_mask_one[idx, :length, :length] = False
-
-        add_mask = torch.masked_fill(torch.zeros(bool_mask_two.size()).cuda(), bool_mask_two, float("-inf"))
-        mul_mask = torch.masked_fill(torch.ones(bool_mask_one.size()).cuda(), bool_mask_one, 0.0)
-
-        add_mask.detach_()
-        mul_mask.detach_()
-
-        return add_mask, mul_mask
-
     def _apply_layer_norm(self, index: int, tensor: Tensor, before: bool = False, after: bool = False) -> Tensor:
         """Applies layer normalization conditionally.
 
@@ -186,6 +174,7 @@ class TransformerEncoderLayer(Module):
         control_vector: Optional[Tensor] = None,
         lengths: Optional[Tensor] = None,
         mode: str = "l2o",
+        masks: Optional[Tuple[Tensor, Tensor]] = None,
     ) -> Tensor:
         """Forward pass for transformer encoder layer.
 
@@ -195,31 +184,30 @@ class TransformerEncoderLayer(Module):
             value: Optional value tensor for attention
             control_vector: Optional control vector from DIV encoder
             lengths: Sequence lengths
-            mode: Projection mode ("l2o" or "o2l")
+            mode: Projection mode ("l2o" or "o2l"), both directions share the same padding masks
+            masks: Precomputed (additive, multiplicative) masks, see `create_padding_masks`
 
         Returns:
             Encoded output tensor
         """
+        assert value is None or value.size(0) == x.size(0)
         residual = x
         x = self._apply_layer_norm(0, x, before=True)
 
-        # Create attention masks
-        if mode == "l2o":
-            add_mask, mul_mask = self._create_attention_mask(
-                x.size(1), x.size(0), value.size(0), lengths=lengths, is_language_projection=False
-            )
-        elif mode == "o2l":
-            add_mask, mul_mask = self._create_attention_mask(
-                x.size(1), value.size(0), x.size(0), lengths=lengths, is_language_projection=True
-            )
+        # Create attention masks, unless the caller already built them for this batch
+        if masks is None and lengths is not None:
+            masks = create_padding_masks(lengths, x.size(0), device=x.device)
+        add_mask, mul_mask = masks if masks is not None else (None, None)
 
         # Apply attention
         if key is None and value is None:
-            x, _ = self.self_attn(query=x, key=x, value=x, add_mask=add_mask, mul_mask=mul_mask)
+            x, _ = self.self_attn(query=x, key=x, value=x, add_mask=add_mask, mul_mask=mul_mask, need_weights=False)
         else:
             key = self._apply_layer_norm(0, key, before=True)
             value = self._apply_layer_norm(0, value, before=True)
-            x, _ = self.self_attn(query=x, key=key, value=value, add_mask=add_mask, mul_mask=mul_mask)
+            x, _ = self.self_attn(
+                query=x, key=key, value=value, add_mask=add_mask, mul_mask=mul_mask, need_weights=False
+            )
 
         x = F.dropout(x, p=self.res_dropout, training=self.training)
 
@@ -264,6 +252,8 @@ class GatedTransformer(Module):
         div_dropout: Dropout rate for DIV encoder
         attn_mask: Whether to use attention masking
         use_disc: Whether to use discriminator in DIV encoder
+        attn_backend: Attention implementation, "eager" or fused "sdpa"
+        embed_positions: Positional embedding shared with other transformers of the model, created if None
     """
 
     def __init__(
@@ -278,6 +268,8 @@ class GatedTransformer(Module):
         div_dropout: float = 0.0,
         attn_mask: bool = False,
         use_disc: bool = True,
+        attn_backend: str = "eager",
+        embed_positions: Optional[SinusoidalPositionalEmbedding] = None,
     ) -> None:
         super().__init__()
 
@@ -286,7 +278,9 @@ class GatedTransformer(Module):
         self.attn_dropout = attn_dropout
         self.embed_dim = embed_dim
         self.embed_scale = math.sqrt(embed_dim)
-        self.embed_positions = SinusoidalPositionalEmbedding(embed_dim)
+        if embed_positions is None:
+            embed_positions = SinusoidalPositionalEmbedding(embed_dim)
+        self.embed_positions = embed_positions
         self.attn_mask = attn_mask
 
         # Initialize transformer layers
@@ -303,6 +297,7 @@ class GatedTransformer(Module):
                 relu_dropout=relu_dropout,
                 res_dropout=res_dropout,
                 attn_mask=attn_mask,
+                attn_backend=attn_backend,
             )
             other_to_text = TransformerEncoderLayer(
                 embed_dim,
@@ -311,6 +306,7 @@ class GatedTransformer(Module):
                 relu_dropout=relu_dropout,
                 res_dropout=res_dropout,
                 attn_mask=attn_mask,
+                attn_backend=attn_backend,
             )
 
             # Create DIV encoder with different configuration for first layer
@@ -371,11 +367,14 @@ class GatedTransformer(Module):
         # Create mask if not provided
         if mask is None:
             batch_size = lengths.size(0)
-            mask = torch.arange(lengths.max()).repeat(batch_size, 1).cuda() < lengths.unsqueeze(-1)
-            mask = mask.unsqueeze(-1).to(torch.float)
+            mask = torch.arange(lengths.max(), device=lengths.device).repeat(batch_size, 1) < lengths.unsqueeze(-1)
+            mask = mask.unsqueeze(-1).to(device=seq_t.device, dtype=torch.float)
         elif lengths is None:
             lengths = mask.squeeze().sum(1)
 
+        # Attention masks are shared by every layer and both projection directions
+        masks = create_padding_masks(lengths, seq_t.size(0), device=seq_t.device)
+
         # Initialize inputs
         input_t, input_other = seq_t, seq_other
         disc_outputs = []
@@ -397,11 +396,23 @@ class GatedTransformer(Module):
 
             # Cross-modal projections
             lang_to_other = trans_other2l(
-                input_other, key=input_t, value=input_t, control_vector=control_vector, lengths=lengths, mode="l2o"
+                input_other,
+                key=input_t,
+                value=input_t,
+                control_vector=control_vector,
+                lengths=lengths,
+                mode="l2o",
+                masks=masks,
             )
 
             other_to_lang = trans_l2other(
-                input_t, key=input_other, value=input_other, control_vector=control_vector, lengths=lengths, mode="o2l"
+                input_t,
+                key=input_other,
+                value=input_other,
+                control_vector=control_vector,
+                lengths=lengths,
+                mode="o2l",
+                masks=masks,
             )
 
             # Update inputs for next layer
@@ -1,9 +1,14 @@
+from os import PathLike
 from typing import Dict, Optional
 
+import torch
+from experiment_utils import format_path_with_env
 from torch import Tensor
 from torch.nn import Embedding, Module
 from transformers import BertConfig, BertModel
 
+from .bert_feature_cache import BertFeatureCache, eval_mode, model_fingerprint
+
 
 class LanguageEmbeddingLayer(Module):
     """Language embedding layer supporting both BERT and GloVe embeddings.
@@ -20,6 +25,8 @@ class LanguageEmbeddingLayer(Module):
         word2id: Dictionary mapping words to indices (required if use_bert=False)
         embedding_dim: Dimension of embeddings (required if use_bert=False)
         bert_model_name: Name of the BERT model to use (optional, default='bert-base-uncased')
+        feature_cache_dir: Directory of the on-disk BERT feature cache (optional). The cache is only used
+            while every BERT parameter is frozen (requires_grad=False)
     """
 
     def __init__(
@@ -28,6 +35,7 @@ class LanguageEmbeddingLayer(Module):
         word2id: Optional[Dict[str, int]] = None,
         embedding_dim: Optional[int] = None,
         bert_model_name: str = "bert-base-uncased",
+        feature_cache_dir: Optional[PathLike] = None,
     ) -> None:
         """Initialize the language embedding layer.
 
@@ -36,6 +44,8 @@ class LanguageEmbeddingLayer(Module):
         """
         super().__init__()
         self.use_bert = use_bert
+        self.feature_cache_dir = feature_cache_dir
+        self._feature_cache: Optional[BertFeatureCache] = None
 
         if use_bert:
             self._init_bert_model(bert_model_name)
@@ -117,12 +127,35 @@ class LanguageEmbeddingLayer(Module):
         if any(x is None for x in [bert_sent, bert_sent_type, bert_sent_mask]):
             raise ValueError("All BERT inputs must be provided when use_bert=True")
 
+        if self.feature_cache_dir is not None and self._bert_frozen():
+            return self.feature_cache.get_or_compute(bert_sent, bert_sent_mask, bert_sent_type, self._frozen_bert)
+
         bert_output = self.bert_model(input_ids=bert_sent, attention_mask=bert_sent_mask, token_type_ids=bert_sent_type)
 
         # Extract the last hidden state
         # Shape: (batch_size, sequence_length, hidden_size)
         return bert_output[0]
 
+    def _bert_frozen(self) -> bool:
+        return not any(p.requires_grad for p in self.bert_model.parameters())
+
+    @property
+    def feature_cache(self) -> BertFeatureCache:
+        """Feature cache of the frozen BERT model, opened on first use since the weights may be loaded later."""
+        if self._feature_cache is None:
+            self._feature_cache = BertFeatureCache(
+                format_path_with_env(str(self.feature_cache_dir)), model_fingerprint(self.bert_model)
+            )
+        return self._feature_cache
+
+    @torch.no_grad()
+    def _frozen_bert(self, bert_sent: Tensor, bert_sent_mask: Tensor, bert_sent_type: Tensor) -> Tensor:
+        ## the stored features are served in every mode, so they are computed without dropout
+        with eval_mode(self.bert_model):
+            return self.bert_model(
+                input_ids=bert_sent, attention_mask=bert_sent_mask, token_type_ids=bert_sent_type
+            )[0]
+
     def _forward_glove(self, sentences: Optional[Tensor]) -> Tensor:
         """Process inputs through GloVe embedding layer.
 
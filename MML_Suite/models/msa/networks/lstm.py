@@ -1,18 +1,30 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
+
+
+def lengths_to_mask(lengths, max_len):
+    """[batch_size] lengths -> [batch_size, max_len] bool mask, True on valid timesteps"""
+    return torch.arange(max_len, device=lengths.device).unsqueeze(0) < lengths.unsqueeze(1)
 
 
 class LSTMEncoder(nn.Module):
-    """one directional LSTM encoder"""
+    """one directional LSTM encoder, skips padded timesteps when lengths are given"""
 
-    def __init__(self, input_size, hidden_size, embd_method="last"):
+    def __init__(self, input_size, hidden_size, embd_method="last", normalize_attention=False):
+        """
+        normalize_attention: softmax the attention weights over the timesteps. By default the softmax runs over
+        the singleton last axis of the [batch_size, seq_len, 1] weights, so every weight is 1 and the attention
+        sums the outputs; this is kept so existing checkpoints produce the same embeddings.
+        """
         super(LSTMEncoder, self).__init__()
         self.input_size = input_size
         self.hidden_size = hidden_size
         self.rnn = nn.LSTM(self.input_size, self.hidden_size, batch_first=True)
         assert embd_method in ["maxpool", "attention", "last"]
         self.embd_method = embd_method
+        self.normalize_attention = normalize_attention
 
         if self.embd_method == "attention":
             self.attention_vector_weight = nn.Parameter(torch.Tensor(hidden_size, 1))
@@ -20,9 +32,10 @@ class LSTMEncoder(nn.Module):
                 nn.Linear(self.hidden_size, self.hidden_size),
                 nn.Tanh(),
             )
-            self.softmax = nn.Softmax(dim=-1)
+            # the weights are [batch_size, seq_len, 1], dim=1 normalises them over the timesteps
+            self.softmax = nn.Softmax(dim=1 if normalize_attention else -1)
 
-    def embd_attention(self, r_out, h_n):
+    def embd_attention(self, r_out, h_n, mask=None):
         """'
         参考这篇博客的实现:
         https://blog.csdn.net/dendi_hust/article/details/94435919
@@ -34,29 +47,50 @@ class LSTMEncoder(nn.Module):
         """
         hidden_reps = self.attention_layer(r_out)  # [batch_size, seq_len, hidden_size]
         atten_weight = hidden_reps @ self.attention_vector_weight  # [batch_size, seq_len, 1]
+        if mask is not None and self.normalize_attention:
+            # padded timesteps get no weight and the valid ones still sum to 1
+            atten_weight = atten_weight.masked_fill(~mask.unsqueeze(-1), float("-inf"))
         atten_weight = self.softmax(atten_weight)  # [batch_size, seq_len, 1]
+        if mask is not None and not self.normalize_attention:
+            atten_weight = atten_weight * mask.unsqueeze(-1)  # no weight on padded timesteps
         # [batch_size, seq_len, hidden_size] * [batch_size, seq_len, 1]  =  [batch_size, seq_len, hidden_size]
         sentence_vector = torch.sum(r_out * atten_weight, dim=1)  # [batch_size, hidden_size]
         return sentence_vector
 
-    def embd_maxpool(self, r_out, h_n):
+    def embd_maxpool(self, r_out, h_n, mask=None):
         # embd = self.maxpool(r_out.transpose(1,2))   # r_out.size()=>[batch_size, seq_len, hidden_size]
         # r_out.transpose(1, 2) => [batch_size, hidden_size, seq_len]
+        if mask is not None:
+            # padded outputs are zero after unpacking, they must not win the max
+            r_out = r_out.masked_fill(~mask.unsqueeze(-1), float("-inf"))
         in_feat = r_out.transpose(1, 2)
         embd = F.max_pool1d(in_feat, in_feat.size(2), in_feat.size(2))
         return embd.squeeze(-1)
 
-    def embd_last(self, r_out, h_n):
+    def embd_last(self, r_out, h_n, mask=None):
         # Just for  one layer and single direction
+        # with packed input h_n already holds the state of the last valid timestep
         return h_n.squeeze(0)
 
-    def forward(self, x):
+    def forward(self, x, lengths=None):
         """
+        x shape: batch, seq_len, input_size
+        lengths shape: batch, number of valid (non-padded) timesteps of every sequence
         r_out shape: seq_len, batch, num_directions * hidden_size
         hn and hc shape: num_layers * num_directions, batch, hidden_size
         """
-        r_out, (h_n, h_c) = self.rnn(x)
-        embd = getattr(self, "embd_" + self.embd_method)(r_out, h_n)
+        if lengths is None:
+            r_out, (h_n, h_c) = self.rnn(x)
+            return getattr(self, "embd_" + self.embd_method)(r_out, h_n)
+
+        max_len = x.size(1)
+        # pack_padded_sequence needs lengths on the cpu and rejects empty sequences
+        lengths = lengths.long().clamp(1, max_len)
+        packed = pack_padded_sequence(x, lengths.cpu(), batch_first=True, enforce_sorted=False)
+        r_out, (h_n, h_c) = self.rnn(packed)
+        r_out, _ = pad_packed_sequence(r_out, batch_first=True, total_length=max_len)
+        mask = lengths_to_mask(lengths.to(r_out.device), max_len)
+        embd = getattr(self, "embd_" + self.embd_method)(r_out, h_n, mask)
         return embd
 
 
@@ -5,13 +5,32 @@ from torch.nn import Linear, Module, Parameter, init
 # Code adapted from the fairseq repo.
 
 
+ATTENTION_BACKENDS = ("eager", "sdpa")
+
+
 class MultiheadAttention(Module):
     """Multi-headed attention.
     See "Attention Is All You Need" for more details.
+
+    The "eager" backend materialises the (bsz * num_heads, tgt_len, src_len) attention weights. The "sdpa" backend
+    runs `F.scaled_dot_product_attention` (fused flash / memory-efficient kernels) with the masks broadcast over
+    the heads, and is used whenever the caller does not need the attention weights back.
     """
 
-    def __init__(self, embed_dim, num_heads, attn_dropout=0.0, bias=True, add_bias_kv=False, add_zero_attn=False):
+    def __init__(
+        self,
+        embed_dim,
+        num_heads,
+        attn_dropout=0.0,
+        bias=True,
+        add_bias_kv=False,
+        add_zero_attn=False,
+        backend="eager",
+    ):
         super().__init__()
+        if backend not in ATTENTION_BACKENDS:
+            raise ValueError(f"Invalid attention backend '{backend}', must be one of {ATTENTION_BACKENDS}")
+        self.backend = backend
         self.embed_dim = embed_dim
         self.num_heads = num_heads
         self.attn_dropout = attn_dropout
@@ -46,13 +65,18 @@ class MultiheadAttention(Module):
         if self.bias_v is not None:
             init.xavier_normal_(self.bias_v)
 
-    def forward(self, query, key, value, add_mask=None, mul_mask=None, attn_mask=None):
+    def forward(self, query, key, value, add_mask=None, mul_mask=None, attn_mask=None, need_weights=True):
         """Input shape: Time x Batch x Channel
         Self-attention can be implemented by passing in the same arguments for
         query, key and value. Timesteps can be masked by supplying a T x T mask in the
         `attn_mask` argument. Padding elements can be excluded from
         the key by passing a binary ByteTensor (`key_padding_mask`) with shape:
         batch x src_len, where padding elements are indicated by 1s.
+
+        `add_mask` (broadcastable to batch x tgt_len x src_len) is added to the attention scores, or is a boolean
+        mask where True marks the pairs that take part in attention. `mul_mask` (broadcastable to the same shape)
+        multiplies the attention weights. Both are broadcast over the heads. With `need_weights=False` no weights are returned (None), which
+        lets the "sdpa" backend skip materialising them.
         """
         qkv_same = query.data_ptr() == key.data_ptr() == value.data_ptr()
         kv_same = key.data_ptr() == value.data_ptr()
@@ -78,7 +102,6 @@ class MultiheadAttention(Module):
             q = self.in_proj_q(query)
             k = self.in_proj_k(key)
             v = self.in_proj_v(value)
-        q *= self.scaling
 
         if self.bias_k is not None:
             assert self.bias_v is not None
@@ -100,7 +123,6 @@ class MultiheadAttention(Module):
             )  # (bsz * num_heads, tgt_len, head_dim)
 
         src_len = k.size(1)  # tgt_len
-        orig_len = src_len
 
         if self.add_zero_attn:
             src_len += 1
@@ -109,51 +131,83 @@ class MultiheadAttention(Module):
             if attn_mask is not None:
                 attn_mask = torch.cat([attn_mask, attn_mask.new_zeros(attn_mask.size(0), 1)], dim=1)
 
-        # project (batch_size, seq_len, seq_len)
-        add_mask = (
-            add_mask.unsqueeze(1)
-            .expand(add_mask.size(0), self.num_heads, orig_len, src_len)
-            .contiguous()
-            .view(-1, src_len, src_len)
-        )  # (bsz * num_heads, src_len, src_len)
-        mul_mask = (
-            mul_mask.unsqueeze(1)
-            .expand(mul_mask.size(0), self.num_heads, orig_len, src_len)
-            .contiguous()
-            .view(-1, src_len, src_len)
-        )  # (bsz * num_heads, src_len, src_len)
+        if self.backend == "sdpa" and not need_weights:
+            attn = self._sdpa_attention(q, k, v, bsz, tgt_len, src_len, add_mask, mul_mask)
+            return self.out_proj(attn), None
 
+        q = q * self.scaling
         attn_weights = torch.bmm(q, k.transpose(1, 2))
         assert list(attn_weights.size()) == [bsz * self.num_heads, tgt_len, src_len]
 
+        ## the masks are (bsz, 1, tgt_len, src_len) views broadcast over the heads, never per-head copies
+        attn_weights = attn_weights.view(bsz, self.num_heads, tgt_len, src_len)
+
+        ## the additive -inf mask and the softmax run in fp32, whatever the autocast dtype of the scores
+        attn_dtype = attn_weights.dtype
+        attn_weights = attn_weights.float()
         if add_mask is not None:
-            try:
-                attn_weights = attn_weights + add_mask
-            except Exception as e:
-                print(attn_weights.shape)
-                print(add_mask.shape)
-                raise e
+            attn_weights = attn_weights + self._additive_mask(add_mask, torch.float32).unsqueeze(1)
 
         # if attention from language to other modal, then maybe align to a void space (after the end of a sentence)
-        attn_weights = F.softmax(attn_weights.float(), dim=-1).type_as(attn_weights)
+        attn_weights = F.softmax(attn_weights, dim=-1).to(attn_dtype)
 
         # attn_weights_mask = attn_weights.isnan()
         # attn_weights = torch.masked_fill(attn_weights, attn_weights_mask, 0.0)
 
         attn_weights = F.dropout(attn_weights, p=self.attn_dropout, training=self.training)
-        attn_weights = attn_weights * mul_mask
+        if mul_mask is not None:
+            attn_weights = attn_weights * mul_mask.unsqueeze(1)
 
-        attn = torch.bmm(attn_weights, v)
+        attn = torch.bmm(attn_weights.view(bsz * self.num_heads, tgt_len, src_len), v)
         assert list(attn.size()) == [bsz * self.num_heads, tgt_len, self.head_dim]
 
         attn = attn.transpose(0, 1).contiguous().view(tgt_len, bsz, embed_dim)
         attn = self.out_proj(attn)
 
+        if not need_weights:
+            return attn, None
+
         # average attention weights over heads
-        attn_weights = attn_weights.view(bsz, self.num_heads, tgt_len, src_len)
         attn_weights = attn_weights.sum(dim=1) / self.num_heads
         return attn, attn_weights
 
+    @staticmethod
+    def _additive_mask(mask, dtype):
+        """Additive form of a mask, boolean masks are True where attention is allowed."""
+        if mask.dtype == torch.bool:
+            return torch.zeros(mask.shape, dtype=dtype, device=mask.device).masked_fill_(~mask, float("-inf"))
+        return mask.to(dtype)
+
+    def _sdpa_attention(self, q, k, v, bsz, tgt_len, src_len, add_mask=None, mul_mask=None):
+        """
+        Fused attention through `F.scaled_dot_product_attention`, returns the (tgt_len, bsz, embed_dim) output.
+
+        `mul_mask` is folded into the additive mask: the pairs it zeroes are excluded before the softmax instead of
+        after it. This matches the eager backend whenever those pairs are already masked by `add_mask` or cover
+        whole query rows, as with the padding masks of `GatedTransformer`. Query rows that attend to nothing
+        produce zeros rather than NaNs.
+        """
+        q = q.view(bsz, self.num_heads, tgt_len, self.head_dim)
+        k = k.view(bsz, self.num_heads, src_len, self.head_dim)
+        v = v.view(bsz, self.num_heads, src_len, self.head_dim)
+
+        mask = valid = None
+        if add_mask is not None:
+            mask = self._additive_mask(add_mask, q.dtype)
+        if mul_mask is not None:
+            mask = mask if mask is not None else q.new_zeros(mul_mask.shape)
+            mask = mask.masked_fill(mul_mask == 0, float("-inf"))
+        if mask is not None:
+            valid = (mask > float("-inf")).any(dim=-1, keepdim=True)
+            mask = mask.masked_fill(~valid, 0.0).unsqueeze(1)
+
+        attn = F.scaled_dot_product_attention(
+            q, k, v, attn_mask=mask, dropout_p=self.attn_dropout if self.training else 0.0
+        )  # (bsz, num_heads, tgt_len, head_dim), scaled by head_dim ** -0.5 like the eager backend
+        if valid is not None:
+            attn = attn * valid.unsqueeze(1)
+        return attn.permute(2, 0, 1, 3).reshape(tgt_len, bsz, self.embed_dim)
+
     def in_proj_qkv(self, query):
         return self._in_proj(query).chunk(3, dim=-1)
 
@@ -1,58 +1,12 @@
 import math
-from typing import Dict, Optional
+from typing import Optional
 
 import torch
+import torch.nn.functional as F
 from torch import Tensor
 from torch.nn import Module
 
 
-def create_position_indices(tensor: Tensor, padding_idx: int, left_pad: bool) -> Tensor:
-    """Create position indices for input tensor, handling padding appropriately.
-
-    Replaces non-padding symbols with their position numbers, starting from
-    padding_idx + 1. Handles both left and right padding cases.
-
-    Args:
-        tensor: Input tensor of shape (batch_size, sequence_length)
-        padding_idx: Index used for padding
-        left_pad: Whether padding is on the left side
-
-    Returns:
-        Tensor of same shape as input with positions instead of symbol indices
-    """
-    # Calculate maximum position needed
-    max_pos = padding_idx + 1 + tensor.size(1)
-    device = tensor.get_device()
-
-    # Create or retrieve position buffer for this device
-    buffer_name = f"range_buffer_{device}"
-    if not hasattr(create_position_indices, buffer_name):
-        setattr(create_position_indices, buffer_name, tensor.new())
-
-    # Ensure buffer has correct type
-    position_buffer = getattr(create_position_indices, buffer_name)
-    position_buffer = position_buffer.type_as(tensor)
-    setattr(create_position_indices, buffer_name, position_buffer)
-
-    # Expand buffer if needed
-    if position_buffer.numel() < max_pos:
-        torch.arange(padding_idx + 1, max_pos, out=position_buffer)
-
-    # Create mask for non-padding positions
-    mask = tensor.ne(padding_idx)
-
-    # Get positions and expand to tensor size
-    positions = position_buffer[: tensor.size(1)].expand_as(tensor)
-
-    # Adjust positions for left padding
-    if left_pad:
-        positions = positions - mask.size(1) + mask.long().sum(dim=1).unsqueeze(1)
-
-    # Create output tensor with positions
-    result = tensor.clone()
-    return result.masked_scatter_(mask, positions[mask]).long()
-
-
 class SinusoidalPositionalEmbedding(Module):
     """Sinusoidal positional embeddings module.
 
@@ -60,8 +14,11 @@ class SinusoidalPositionalEmbedding(Module):
     in "Attention Is All You Need". It handles padding and supports both left and
     right padding configurations.
 
-    The implementation uses cached weights for efficiency and supports dynamic
-    expansion when longer sequences are encountered.
+    The table lives in a non-persistent buffer, so it follows the module across devices
+    and dtypes, and grows geometrically when longer sequences are encountered. With
+    right padding the embeddings are a slice of the table masked at the padding
+    positions, without any index computation. A single instance can be shared by
+    several transformers of a model.
 
     Args:
         embedding_dim: Dimension of the positional embeddings
@@ -73,7 +30,7 @@ class SinusoidalPositionalEmbedding(Module):
         embedding_dim: Dimension of the positional embeddings
         padding_idx: Index used for padding
         left_pad: Whether padding is on the left side
-        weights: Dictionary mapping devices to embedding weights
+        weights: Embedding table of shape (num_positions, embedding_dim)
     """
 
     def __init__(self, embedding_dim: int, padding_idx: int = 0, left_pad: bool = False, init_size: int = 128) -> None:
@@ -81,7 +38,8 @@ class SinusoidalPositionalEmbedding(Module):
         self.embedding_dim = embedding_dim
         self.padding_idx = padding_idx
         self.left_pad = left_pad
-        self.weights: Dict[int, Tensor] = {}
+        self.register_buffer("weights", self.get_embedding(init_size, embedding_dim, padding_idx), persistent=False)
+        ## unused, kept so that existing checkpoints still load strictly
         self.register_buffer("_float_tensor", torch.FloatTensor(1))
 
     @staticmethod
@@ -139,22 +97,24 @@ class SinusoidalPositionalEmbedding(Module):
             Tensor of shape (batch_size, sequence_length, embedding_dim) containing
             positional embeddings
         """
-        batch_size, seq_len = input_tensor.size()
+        seq_len = input_tensor.size(1)
         max_pos = self.padding_idx + 1 + seq_len
-        device = input_tensor.get_device()
-
-        # Recompute/expand embeddings if needed
-        if device not in self.weights or max_pos > self.weights[device].size(0):
-            self.weights[device] = self.get_embedding(max_pos, self.embedding_dim, self.padding_idx)
-
-        # Ensure correct tensor type
-        self.weights[device] = self.weights[device].type_as(self._float_tensor)
-
-        # Get position indices
-        positions = create_position_indices(input_tensor, self.padding_idx, self.left_pad)
 
-        # Select and reshape embeddings
-        return self.weights[device].index_select(0, positions.view(-1)).view(batch_size, seq_len, -1).detach()
+        # Grow the table geometrically if needed
+        if max_pos > self.weights.size(0):
+            num_embeddings = max(max_pos, 2 * self.weights.size(0))
+            self.weights = self.get_embedding(num_embeddings, self.embedding_dim, self.padding_idx).to(self.weights)
+
+        mask = input_tensor.ne(self.padding_idx)
+        if not self.left_pad:
+            # Positions padding_idx + 1, ..., padding_idx + seq_len; padding tokens get the zero embedding
+            return self.weights[self.padding_idx + 1 : max_pos] * mask.unsqueeze(-1).to(self.weights.dtype)
+
+        # With left padding, every row's positions start after its padding
+        num_padding = seq_len - mask.sum(dim=1, keepdim=True)
+        positions = torch.arange(self.padding_idx + 1, max_pos, device=input_tensor.device) - num_padding
+        positions = positions.masked_fill(~mask, self.padding_idx)
+        return F.embedding(positions, self.weights)
 
     def max_positions(self) -> int:
         """Get maximum number of supported positions.
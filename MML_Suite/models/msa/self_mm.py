@@ -9,6 +9,7 @@ import torch.nn.functional as F
 from data import MOSI
 from experiment_utils import CenterManager, FeatureManager, LabelManager, get_console, get_logger, safe_detach
 from experiment_utils.logging import LoggerSingleton
+from experiment_utils.precision import FP32, PrecisionPolicy
 from experiment_utils.printing import EnhancedConsole
 from modalities import Modality
 from models.mixins import MultiModalMonitoringMixin
@@ -19,6 +20,8 @@ from torch.optim import Optimizer
 from torch.utils.data import DataLoader
 
 DEFAULT_TEXT_LENGTH: int = 50
+UNIMODAL_MODALITIES = (Modality.AUDIO, Modality.VIDEO, Modality.TEXT)
+CENTER_MODALITIES = (Modality.MULTIMODAL, *UNIMODAL_MODALITIES)
 console: EnhancedConsole = get_console()
 logger: LoggerSingleton = get_logger()
 
@@ -87,6 +90,7 @@ class Self_MM(Module, MultiModalMonitoringMixin):
         self.update_every = update_every
         self.saved_labels = {}
         self.H = H
+        self._centers_epoch = None
 
     def post_init_with_dataloaders(self, dataloaders: DataLoader | Dict[str, DataLoader]):
         dataloader = dataloaders if isinstance(dataloaders, DataLoader) else dataloaders["train"]
@@ -214,6 +218,7 @@ class Self_MM(Module, MultiModalMonitoringMixin):
         criterion: Module,  # Necessary for the main driver code, but not necessary within this function
         device: torch.device,
         epoch: int,  # TODO: Add this to the main driver code, kwargs when not necessary
+        precision: PrecisionPolicy = FP32,
     ) -> Dict[str | Modality, Any]:
         if epoch % self.update_every == 0:
             optimizer.zero_grad()
@@ -240,47 +245,48 @@ class Self_MM(Module, MultiModalMonitoringMixin):
         else:
             A_lengths, V_lengths = 0, 0
 
-        outputs = self.forward(
-            (A, A_lengths),
-            (V, V_lengths),
-            T,
-        )
+        with precision.autocast():
+            outputs = self.forward(
+                (A, A_lengths),
+                (V, V_lengths),
+                T,
+            )
 
-        loss = 0.0
-        for modality in [Modality.MULTIMODAL, Modality.AUDIO, Modality.VIDEO, Modality.TEXT]:
-            if modality in outputs["predictions"]:
-                loss += self.weighted_loss(
-                    outputs["predictions"][modality],
-                    self.labels_manager.get_labels(modality=modality, indexes=indexes),
-                    indexes=indexes,
-                    modality=modality,
-                )
-        loss.backward()
+            loss = 0.0
+            for modality in [Modality.MULTIMODAL, Modality.AUDIO, Modality.VIDEO, Modality.TEXT]:
+                if modality in outputs["predictions"]:
+                    loss += self.weighted_loss(
+                        outputs["predictions"][modality],
+                        self.labels_manager.get_labels(modality=modality, indexes=indexes),
+                        indexes=indexes,
+                        modality=modality,
+                    )
+        precision.backward(loss)
 
         predictions = outputs["predictions"][Modality.MULTIMODAL]
         features = outputs["features"]
 
-        features = {k: safe_detach(v, to_np=False) for k, v in features.items()}
+        ## the feature/label managers store fp32, whatever the autocast dtype of the features
+        features = {k: safe_detach(v, to_np=False).float() for k, v in features.items()}
+
+        ## the rows changed by this step, read before and after the update to adjust the centers incrementally
+        rows = torch.unique(indexes)
+        previous = self._center_rows(rows)
 
         if epoch > 1:
             self._update_labels(features=features, current_epoch=epoch, indexes=indexes)
 
         # self.feature_manager.update(features=features, indexes=indexes)
         self._update_features(features=features, indexes=indexes)
-        self._update_centers()
+        self._update_centers(rows=rows, previous=previous, epoch=epoch)
 
         if epoch % self.update_every == 0:
-            optimizer.step()
+            precision.step(optimizer)
 
         # calculate metrics and return loss and metrics
-        miss_types = np.array(miss_types)
-        for m_type in miss_types:
-            mask = miss_types == m_type
-            mask_preds = predictions[mask].view(-1)
-            mask_labels = labels[mask]
-            self.metric_recorder.update(predictions=mask_preds, targets=mask_labels, modality=m_type)
+        self.metric_recorder.update_all(predictions=predictions.view(-1).float(), targets=labels, m_types=miss_types)
 
-        return {"loss": loss.item()}
+        return {"loss": loss.detach()}
 
     def validation_step(self, batch, criterion, device, return_test_info: bool = False):
         self.eval()
@@ -319,26 +325,22 @@ class Self_MM(Module, MultiModalMonitoringMixin):
         loss = self.weighted_loss(predictions, labels)
 
         if return_test_info:
-            all_predictions.append(safe_detach(predictions, to_np=True))
+            all_predictions.append(safe_detach(predictions.float(), to_np=True))
             all_labels.append(labels)
             all_miss_types.append(miss_types)
 
-        for m_type in miss_types:
-            mask = miss_types == m_type
-            mask_preds = predictions[mask].view(-1)
-            mask_labels = labels[mask]
-            self.metric_recorder.update(predictions=mask_preds, targets=mask_labels, modality=m_type)
+        self.metric_recorder.update_all(predictions=predictions.view(-1).float(), targets=labels, m_types=miss_types)
 
         self.train()
         if return_test_info:
             return {
-                "loss": loss.item(),
+                "loss": loss.detach(),
                 "predictions": all_predictions,
                 "labels": all_labels,
                 "miss_types": all_miss_types,
             }
 
-        return {"loss": loss.item()}
+        return {"loss": loss.detach()}
 
     def get_embeddings(self, dataloader: DataLoader, device: torch.device):
         console = get_console()
@@ -412,44 +414,46 @@ class Self_MM(Module, MultiModalMonitoringMixin):
     def _update_features(self, features, indexes):
         self.feature_manager.update(features=features, indexes=indexes)
 
-    def _update_centers(self):
-        for modality in [Modality.MULTIMODAL, Modality.AUDIO, Modality.VIDEO, Modality.TEXT]:
-            labels = self.labels_manager[modality]
-            self.center_manager.update(features=self.feature_manager.feature_maps, labels=labels)
+    def _center_rows(self, rows):
+        """Features and labels of the given rows, for each modality with a center."""
+        return (
+            {modality: self.feature_manager.get_features(modality, rows) for modality in CENTER_MODALITIES},
+            {modality: self.labels_manager.get_labels(modality, rows) for modality in CENTER_MODALITIES},
+        )
+
+    def _update_centers(self, rows, previous, epoch):
+        ## an exact recomputation once per epoch keeps the running sums from drifting
+        if self._centers_epoch != epoch:
+            self._centers_epoch = epoch
+            features = {modality: self.feature_manager[modality] for modality in CENTER_MODALITIES}
+            self.center_manager.reset(features=features, labels=self.labels_manager.label_maps)
+            return
+        self.center_manager.update_rows(*previous, *self._center_rows(rows))
 
     def _update_labels(self, features, current_epoch, indexes):
-        def update_single_label(f, modality, delta_f, indexes):
-            d_sp = torch.norm(f - self.center_manager.get_center(modality=modality, polarity="pos"), dim=-1)
-            d_sn = torch.norm(f - self.center_manager.get_center(modality=modality, polarity="neg"), dim=-1)
-            delta_s = (d_sn - d_sp) / (d_sp) + 1e-8
-            alpha = delta_s / (delta_f + 1e-8)
-            new_labels = 0.5 * alpha * self.labels_manager.get_labels(Modality.MULTIMODAL, indexes=indexes) + 0.5 * (
-                self.labels_manager.get_labels(Modality.MULTIMODAL, indexes=indexes) + delta_s - delta_f
-            )
-            new_labels = torch.clamp(new_labels, min=-self.H, max=self.H)
-            new_labels = (current_epoch - 1) / (current_epoch + 1) * self.labels_manager.get_labels(
-                modality=modality, indexes=indexes
-            ) + 2 / (current_epoch + 1) * new_labels
-            self.labels_manager.update_labels(modality=modality, indexes=indexes, new_labels=new_labels)
-
-        d_fp = torch.norm(
-            features[Modality.MULTIMODAL]
-            - self.center_manager.get_center(modality=Modality.MULTIMODAL, polarity="pos"),
-            dim=-1,
-        )
-        d_fn = torch.norm(
-            features[Modality.MULTIMODAL]
-            - self.center_manager.get_center(modality=Modality.MULTIMODAL, polarity="neg"),
-            dim=-1,
-        )
+        def center_distances(modality):
+            centers = [self.center_manager.get_center(modality=modality, polarity=p) for p in ("pos", "neg")]
+            return tuple(torch.norm(features[modality] - center, dim=-1) for center in centers)
+
+        d_fp, d_fn = center_distances(Modality.MULTIMODAL)
         delta_f = (d_fn - d_fp) / (d_fp + 1e-8)
 
-        update_single_label(f=features[Modality.AUDIO], modality=Modality.AUDIO, delta_f=delta_f, indexes=indexes)
-        logger.info("Updated audio labels")
-        update_single_label(f=features[Modality.VIDEO], modality=Modality.VIDEO, delta_f=delta_f, indexes=indexes)
-        logger.info("Updated video labels")
-        update_single_label(f=features[Modality.TEXT], modality=Modality.TEXT, delta_f=delta_f, indexes=indexes)
-        logger.info("Updated text labels")
+        ## the unimodal features differ in size, so only the distances are per modality, the label update of all
+        ## three modalities is a single (3, batch_size) tensor op
+        d_sp, d_sn = (torch.stack(d) for d in zip(*(center_distances(modality) for modality in UNIMODAL_MODALITIES)))
+        delta_s = (d_sn - d_sp) / (d_sp) + 1e-8
+        alpha = delta_s / (delta_f + 1e-8)
+        fusion_labels = self.labels_manager.get_labels(Modality.MULTIMODAL, indexes=indexes)
+        new_labels = 0.5 * alpha * fusion_labels + 0.5 * (fusion_labels + delta_s - delta_f)
+        new_labels = torch.clamp(new_labels, min=-self.H, max=self.H)
+        old_labels = torch.stack(
+            [self.labels_manager.get_labels(modality=modality, indexes=indexes) for modality in UNIMODAL_MODALITIES]
+        )
+        new_labels = (current_epoch - 1) / (current_epoch + 1) * old_labels + 2 / (current_epoch + 1) * new_labels
+
+        for modality, labels in zip(UNIMODAL_MODALITIES, new_labels):
+            self.labels_manager.update_labels(modality=modality, indexes=indexes, new_labels=labels)
+        logger.info("Updated audio, video and text labels")
 
 
 class AuViSubNet(Module):
@@ -5,9 +5,11 @@ import numpy as np
 import torch
 from experiment_utils.loss import LossFunctionGroup
 from experiment_utils.metric_recorder import MetricRecorder
+from experiment_utils.precision import FP32, PrecisionPolicy
 from experiment_utils.printing import get_console
 from experiment_utils.utils import safe_detach
 from modalities import Modality
+from models.mixins import MissingModalityMixin
 from models.msa.networks.classifier import FcClassifier
 from models.msa.networks.lstm import LSTMEncoder
 from models.msa.networks.textcnn import TextCNN
@@ -18,7 +20,7 @@ from torch.utils.data import DataLoader
 console = get_console()
 
 
-class UttFusionModel(Module):
+class UttFusionModel(Module, MissingModalityMixin):
     """
     Fusion model for multimodal sentiment analysis using LSTM and TextCNN encoders
     with a fully connected classifier for prediction.
@@ -36,6 +38,7 @@ class UttFusionModel(Module):
         *,
         clip: Optional[float] = None,
         pretrained_path: Optional[str] = None,
+        pack_sequences: bool = False,
     ) -> None:
         """
         Initialize the UttFusionModel.
@@ -47,6 +50,8 @@ class UttFusionModel(Module):
             netC (FcClassifier): Fully connected classifier for fused features.
             clip (Optional[float]): Gradient clipping value (if specified).
             pretrained_path (Optional[str]): Path to pretrained weights (if any).
+            pack_sequences (bool): Skip the padded timesteps of unaligned audio and video using the batch's
+                sequence lengths, instead of encoding the full padded sequences.
         """
         super().__init__()
         self.netA = netA
@@ -54,6 +59,7 @@ class UttFusionModel(Module):
         self.netT = netT
         self.netC = netC
         self.clip = clip
+        self.pack_sequences = pack_sequences
 
         if pretrained_path:
             self.load_state_dict(torch.load(pretrained_path, weights_only=True))
@@ -92,6 +98,8 @@ class UttFusionModel(Module):
         is_embd_A: bool = False,
         is_embd_V: bool = False,
         is_embd_T: bool = False,
+        missing_mask: Optional[Dict[Modality, torch.Tensor]] = None,
+        lengths: Optional[Dict[Modality, torch.Tensor]] = None,
     ) -> torch.Tensor:
         """
         Perform a forward pass of the fusion model.
@@ -103,6 +111,10 @@ class UttFusionModel(Module):
             is_embd_A (bool): Whether the audio input is pre-embedded.
             is_embd_V (bool): Whether the video input is pre-embedded.
             is_embd_T (bool): Whether the text input is pre-embedded.
+            missing_mask (Optional[Dict[Modality, torch.Tensor]]): Per-modality presence of every row. Rows where a
+                modality is absent use the cached zero-input embedding instead of running the encoder.
+            lengths (Optional[Dict[Modality, torch.Tensor]]): Unpadded sequence length of every row for the audio
+                and video encoders, which then skip the padded timesteps. Used for unaligned data.
 
         Returns:
             torch.Tensor: Prediction logits.
@@ -113,14 +125,81 @@ class UttFusionModel(Module):
         assert not all((A is None, V is None, T is None)), "At least one of A, V, T must be provided"
         assert not all([is_embd_A, is_embd_V, is_embd_T]), "Cannot have all embeddings as True"
 
-        a_embd = self.netA(A) if not is_embd_A and A is not None else A
-        v_embd = self.netV(V) if not is_embd_V and V is not None else V
-        t_embd = self.netT(T) if not is_embd_T and T is not None else T
+        missing_mask = missing_mask or {}
+        encoder_kwargs = self._encoder_kwargs(lengths, missing_mask, {Modality.AUDIO: A, Modality.VIDEO: V})
+        a_embd = (
+            self.encode_present(Modality.AUDIO, A, missing_mask.get(Modality.AUDIO), **encoder_kwargs[Modality.AUDIO])
+            if not is_embd_A and A is not None
+            else A
+        )
+        v_embd = (
+            self.encode_present(Modality.VIDEO, V, missing_mask.get(Modality.VIDEO), **encoder_kwargs[Modality.VIDEO])
+            if not is_embd_V and V is not None
+            else V
+        )
+        t_embd = (
+            self.encode_present(Modality.TEXT, T, missing_mask.get(Modality.TEXT))
+            if not is_embd_T and T is not None
+            else T
+        )
 
         fused = torch.cat([embd for embd in [a_embd, v_embd, t_embd] if embd is not None], dim=-1)
         logits = self.netC(fused)
         return logits
 
+    @staticmethod
+    def _encoder_kwargs(
+        lengths: Optional[Dict[Modality, torch.Tensor]],
+        missing_mask: Optional[Dict[Modality, torch.Tensor]] = None,
+        inputs: Optional[Dict[Modality, Optional[torch.Tensor]]] = None,
+    ) -> Dict[Modality, Dict[str, torch.Tensor]]:
+        """
+        Per-modality keyword arguments of the sequence encoders.
+
+        Rows where a modality is absent get the full padded length, so they are encoded like the cached
+        zero-input row (see `MissingModalityMixin.zero_input_embedding`) whichever path `encode_present` takes.
+        """
+        lengths, missing_mask, inputs = lengths or {}, missing_mask or {}, inputs or {}
+        kwargs = {}
+        for mod in (Modality.AUDIO, Modality.VIDEO):
+            if mod not in lengths:
+                kwargs[mod] = {}
+                continue
+            mod_lengths, presence, data = lengths[mod], missing_mask.get(mod), inputs.get(mod)
+            if presence is not None and data is not None:
+                mod_lengths = torch.where(presence.to(mod_lengths.device) != 0, mod_lengths, data.size(1))
+            kwargs[mod] = {"lengths": mod_lengths}
+        return kwargs
+
+    def get_lengths(self, batch: Dict[str, Any]) -> Optional[Dict[Modality, torch.Tensor]]:
+        """
+        Get the unpadded audio and video sequence lengths of a batch.
+
+        Args:
+            batch (Dict[str, Any]): Batch of input data.
+
+        Returns:
+            Optional[Dict[Modality, torch.Tensor]]: Lengths per modality, or None for aligned data or when
+                `pack_sequences` is off.
+        """
+        if not self.pack_sequences or "audio_length" not in batch:
+            return None
+        return {Modality.AUDIO: batch["audio_length"], Modality.VIDEO: batch["video_length"]}
+
+    def classify_embeddings(self, embeddings: Dict[Modality, torch.Tensor]) -> torch.Tensor:
+        """
+        Fuse per-modality embeddings and classify them.
+
+        Args:
+            embeddings (Dict[Modality, torch.Tensor]): Embedding of each available modality.
+
+        Returns:
+            torch.Tensor: Prediction logits.
+        """
+        order = [Modality.AUDIO, Modality.VIDEO, Modality.TEXT]
+        fused = torch.cat([embeddings[mod] for mod in order if mod in embeddings], dim=-1)
+        return self.netC(fused)
+
     def flatten_parameters(self) -> None:
         """
         Flatten parameters for RNN layers to optimize training performance.
@@ -135,6 +214,7 @@ class UttFusionModel(Module):
         criterion: LossFunctionGroup,
         device: torch.device,
         metric_recorder: MetricRecorder,
+        precision: PrecisionPolicy = FP32,
     ) -> Dict[str, Any]:
         """
         Perform a single training step.
@@ -145,6 +225,7 @@ class UttFusionModel(Module):
             criterion (LossFunctionGroup): Loss function group.
             device (torch.device): Computation device.
             metric_recorder (MetricRecorder): Metric recorder for evaluation.
+            precision (PrecisionPolicy): Mixed-precision policy of the forward pass, backward pass and optimizer step.
 
         Returns:
             Dict[str, Any]: Training results including loss.
@@ -158,21 +239,22 @@ class UttFusionModel(Module):
         )
 
         self.train()
-        logits = self.forward(A, V, T)
+        with precision.autocast():
+            logits = self.forward(A, V, T, missing_mask=batch.get("missing_mask"), lengths=self.get_lengths(batch))
+            loss = criterion(logits.squeeze(), labels.squeeze())
 
         optimizer.zero_grad()
-        loss = criterion(logits.squeeze(), labels.squeeze())
-        loss.backward()
+        precision.backward(loss)
 
         if self.clip is not None:
+            precision.unscale_(optimizer)
             torch.nn.utils.clip_grad_norm_(self.parameters(), self.clip)
-        optimizer.step()
+        precision.step(optimizer)
 
-        predictions = safe_detach(logits.argmax(dim=-1).squeeze())
-        labels = safe_detach(labels.squeeze())
-
-        metric_recorder.update_all(predictions=predictions, targets=labels, m_types=np.array(_miss_type))
-        return {"loss": loss.item()}
+        ## the recorder copies to the host unless it keeps its metric states on the device
+        predictions = logits.detach().argmax(dim=-1).squeeze()
+        metric_recorder.update_all(predictions=predictions, targets=labels.squeeze(), m_types=np.array(_miss_type))
+        return {"loss": loss.detach()}
 
     def validation_step(
         self,
@@ -181,6 +263,7 @@ class UttFusionModel(Module):
         device: torch.device,
         metric_recorder: MetricRecorder,
         return_test_info: bool = False,
+        patterns: Optional[Dict[str, Dict[str, float]]] = None,
     ) -> Dict[str, Any]:
         """
         Perform a single validation step.
@@ -190,7 +273,10 @@ class UttFusionModel(Module):
             criterion (LossFunctionGroup): Loss function group.
             device (torch.device): Computation device.
             metric_recorder (MetricRecorder): Metric recorder for evaluation.
-            return_test_info (bool): Whether to return detailed test information.
+            return_test_info (bool): Whether to return detailed test information. In pattern-bucketed evaluation
+                there is one entry per pattern, holding the predictions of every sample under that pattern.
+            patterns (Optional[Dict[str, Dict[str, float]]]): Pattern-bucketed evaluation. The batch holds unmasked
+                samples and every pattern is evaluated from a single encoder pass.
 
         Returns:
             Dict[str, Any]: Validation results including loss and optional test info.
@@ -208,7 +294,37 @@ class UttFusionModel(Module):
                 batch["pattern_name"],
             )
 
-            logits = self.forward(A, V, T)
+            if patterns is not None:
+                pattern_logits = self.pattern_logits(
+                    {Modality.AUDIO: A, Modality.VIDEO: V, Modality.TEXT: T},
+                    patterns,
+                    encoder_kwargs=self._encoder_kwargs(self.get_lengths(batch)),
+                )
+                losses = []
+                for pattern_name, logits in pattern_logits.items():
+                    losses.append(criterion(logits.squeeze(), labels.squeeze()))
+                    predictions = logits.argmax(dim=-1)
+                    metric_recorder.update(
+                        predictions=predictions.squeeze(),
+                        targets=labels.squeeze(),
+                        modality=pattern_name,
+                    )
+                    if return_test_info:
+                        all_predictions.append(predictions.cpu().numpy())
+                        all_labels.append(labels.cpu().numpy())
+                        all_miss_types.append([pattern_name] * len(labels))
+                self.train()
+                loss = torch.stack(losses).mean()
+                if return_test_info:
+                    return {
+                        "loss": loss,
+                        "predictions": all_predictions,
+                        "labels": all_labels,
+                        "miss_types": all_miss_types,
+                    }
+                return {"loss": loss}
+
+            logits = self.forward(A, V, T, missing_mask=batch.get("missing_mask"), lengths=self.get_lengths(batch))
             predictions = logits.argmax(dim=-1)
 
             if return_test_info:
@@ -216,8 +332,8 @@ class UttFusionModel(Module):
                 all_labels.append(labels.cpu().numpy())
                 all_miss_types.append(miss_type)
 
-            labels = safe_detach(labels.squeeze())
-            predictions = safe_detach(predictions.squeeze())
+            labels = labels.squeeze()
+            predictions = predictions.squeeze()
             miss_types = np.array(miss_type)
 
             loss = criterion(logits.squeeze(), labels)
@@ -227,12 +343,12 @@ class UttFusionModel(Module):
 
         if return_test_info:
             return {
-                "loss": loss.item(),
+                "loss": loss.detach(),
                 "predictions": all_predictions,
                 "labels": all_labels,
                 "miss_types": all_miss_types,
             }
-        return {"loss": loss.item()}
+        return {"loss": loss.detach()}
 
     def get_embeddings(self, dataloader: DataLoader, device: torch.device) -> Dict[Modality, np.ndarray]:
         """
@@ -254,8 +370,9 @@ class UttFusionModel(Module):
                     batch[Modality.VIDEO].to(device).float(),
                     batch[Modality.TEXT].to(device).float(),
                 )
-                a_embd = self.netA(A)
-                v_embd = self.netV(V)
+                encoder_kwargs = self._encoder_kwargs(self.get_lengths(batch))
+                a_embd = self.netA(A, **encoder_kwargs[Modality.AUDIO])
+                v_embd = self.netV(V, **encoder_kwargs[Modality.VIDEO])
                 t_embd = self.netT(T)
 
                 for mod, embd in zip([Modality.AUDIO, Modality.VIDEO, Modality.TEXT], [a_embd, v_embd, t_embd]):
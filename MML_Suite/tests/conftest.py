@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+## the suite imports its packages from the MML_Suite directory, as the training scripts do
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,33 @@
+import pytest
+import torch
+from models.msa.networks.gated_transformer import create_padding_masks
+from models.msa.networks.multihead_attention import MultiheadAttention
+
+EMBED_DIM = 8
+NUM_HEADS = 2
+SEQ_LEN = 6
+
+
+def _attention(backend: str, training: bool) -> MultiheadAttention:
+    torch.manual_seed(0)
+    attention = MultiheadAttention(EMBED_DIM, NUM_HEADS, attn_dropout=0.0, backend=backend)
+    ## non-zero biases, so the output of a fully padded query row is not trivially zero
+    torch.nn.init.normal_(attention.in_proj_bias)
+    torch.nn.init.normal_(attention.out_proj.bias)
+    return attention.train(training)
+
+
+@pytest.mark.parametrize("training", [False, True])
+def test_sdpa_matches_eager(training):
+    eager, sdpa = _attention("eager", training), _attention("sdpa", training)
+    ## every sequence but the full one ends in padded query rows, which attend to nothing
+    lengths = torch.tensor([SEQ_LEN, 3, 1])
+    add_mask, mul_mask = create_padding_masks(lengths, SEQ_LEN)
+    x = torch.randn(SEQ_LEN, len(lengths), EMBED_DIM)
+
+    expected, _ = eager(x, x, x, add_mask=add_mask, mul_mask=mul_mask, need_weights=False)
+    actual, weights = sdpa(x, x, x, add_mask=add_mask, mul_mask=mul_mask, need_weights=False)
+
+    assert weights is None
+    assert not expected.isnan().any()
+    torch.testing.assert_close(actual, expected)
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+import torch
+from experiment_utils import checkpoints
+from experiment_utils.checkpoints import CheckpointManager
+
+
+def _model_and_optimizer():
+    model = torch.nn.Linear(4, 2)
+    return model, torch.optim.SGD(model.parameters(), lr=0.1)
+
+
+def _failing_save(state, path):
+    ## write part of the file before failing, as a full disk would
+    with open(path, "wb") as f:
+        f.write(b"partial")
+    raise OSError("No space left on device")
+
+
+def test_best_checkpoint_links_epoch_file(tmp_path):
+    model, optimizer = _model_and_optimizer()
+    manager = CheckpointManager(tmp_path, device="cpu")
+
+    manager.save_checkpoint(model, optimizer, None, epoch=1, metrics={"loss": 1.0}, is_best=True)
+    ## the saved state is a snapshot, later updates must not reach the written file
+    expected = {k: v.clone() for k, v in model.state_dict().items()}
+    with torch.no_grad():
+        model.weight.add_(1.0)
+    manager.flush()
+
+    best_path, epoch_path = tmp_path / "best.pth", tmp_path / "epoch_1.pth"
+    assert os.path.samefile(best_path, epoch_path)
+    checkpoint = torch.load(best_path, weights_only=True)
+    for name, value in expected.items():
+        torch.testing.assert_close(checkpoint["model_state_dict"][name], value)
+    manager.close()
+
+
+@pytest.mark.parametrize("async_save", [True, False])
+def test_failed_write_leaves_no_partial_file(tmp_path, monkeypatch, async_save):
+    model, optimizer = _model_and_optimizer()
+    manager = CheckpointManager(tmp_path, device="cpu", async_save=async_save)
+    monkeypatch.setattr(checkpoints.torch, "save", _failing_save)
+
+    if async_save:
+        manager.save_checkpoint(model, optimizer, None, epoch=1, metrics={"loss": 1.0}, is_best=True)
+        with pytest.raises(OSError, match="No space left"):
+            manager.flush()
+        ## the error is reported once, the next flush has nothing pending
+        manager.flush()
+    else:
+        with pytest.raises(OSError, match="No space left"):
+            manager.save_checkpoint(model, optimizer, None, epoch=1, metrics={"loss": 1.0}, is_best=True)
+
+    assert list(tmp_path.iterdir()) == []
+    manager.close()
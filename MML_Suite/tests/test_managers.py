@@ -0,0 +1,57 @@
+import pytest
+import torch
+from experiment_utils.managers import CenterManager
+from modalities import Modality
+
+NUM_SAMPLES = 64
+BATCH_SIZE = 16
+MODALITY_DIMS = {Modality.TEXT: 8, Modality.AUDIO: 5}
+
+
+def _fresh_centers(features, labels, exclude_zero):
+    manager = CenterManager("cpu", MODALITY_DIMS, exclude_zero=exclude_zero)
+    manager.reset(features=features, labels=labels)
+    return manager
+
+
+def _rows(features, labels, rows):
+    return (
+        {modality: feature[rows].clone() for modality, feature in features.items()},
+        {modality: label[rows].clone() for modality, label in labels.items()},
+    )
+
+
+def _assert_same_centers(manager, expected):
+    for modality in MODALITY_DIMS:
+        for polarity in ("pos", "neg"):
+            torch.testing.assert_close(
+                manager.get_center(modality, polarity), expected.get_center(modality, polarity), atol=1e-5, rtol=1e-5
+            )
+            torch.testing.assert_close(manager.counts[modality][polarity], expected.counts[modality][polarity])
+
+
+@pytest.mark.parametrize("exclude_zero", [True, False])
+def test_update_rows_matches_reset(exclude_zero):
+    generator = torch.Generator().manual_seed(0)
+    features = {modality: torch.randn(NUM_SAMPLES, dim, generator=generator) for modality, dim in MODALITY_DIMS.items()}
+    ## integer-valued labels, so some rows sit at zero and the pos/neg split depends on `exclude_zero`
+    labels = {
+        modality: torch.randint(-2, 3, (NUM_SAMPLES,), generator=generator).float() for modality in MODALITY_DIMS
+    }
+
+    manager = _fresh_centers(features, labels, exclude_zero)
+
+    for _ in range(5):
+        ## a batch drawn with replacement repeats some rows, as the training step sees them
+        indexes = torch.randint(0, NUM_SAMPLES, (BATCH_SIZE,), generator=generator)
+        indexes[1] = indexes[0]
+        rows = torch.unique(indexes)
+        previous = _rows(features, labels, rows)
+
+        for modality, dim in MODALITY_DIMS.items():
+            features[modality][indexes] = torch.randn(BATCH_SIZE, dim, generator=generator)
+            ## negate the labels of the changed rows, moving them between the pos and neg sums (zero rows turn positive)
+            labels[modality][rows] = -labels[modality][rows] + torch.rand(len(rows), generator=generator) * 0.5
+
+        manager.update_rows(*previous, *_rows(features, labels, rows))
+        _assert_same_centers(manager, _fresh_centers(features, labels, exclude_zero))
@@ -0,0 +1,54 @@
+import torch
+from data.masking import BatchMaskingEngine
+from data.pattern import MultiplexedPatternDataset
+from modalities import Modality
+from torch.utils.data import default_collate
+
+PATTERNS = {"a": {"audio": 1.0}, "av": {"audio": 1.0, "video": 1.0}, "v": {"video": 1.0}}
+MODALITIES = {"audio": Modality.AUDIO, "video": Modality.VIDEO}
+
+
+class _PerSampleMaskedDataset:
+    """Stand-in for a dataset that masks per sample, so its unmasked rows carry the "_original"/"_reverse" views."""
+
+    def __init__(self, reverse_views: bool) -> None:
+        self.split = "test"
+        self.selected_patterns = list(PATTERNS)
+        self.pattern_bucketed = False
+        self.masking_engine = BatchMaskingEngine(PATTERNS, MODALITIES, "test", with_reverse=reverse_views)
+
+    def __getitem__(self, idx: int):
+        sample = {"label": torch.tensor(idx), "pattern_name": "av", "missing_mask": {}}
+        for mod_enum in MODALITIES.values():
+            data = torch.full((3,), float(idx + 1))
+            sample[mod_enum] = data
+            sample[f"{str(mod_enum)}_original"] = data
+            sample[f"{str(mod_enum)}_reverse"] = torch.zeros_like(data)
+            sample["missing_mask"][mod_enum] = 1.0
+        return sample
+
+    def collate(self, batch):
+        return default_collate(batch)
+
+
+def _multiplexed_batch(reverse_views: bool):
+    dataset = MultiplexedPatternDataset(_PerSampleMaskedDataset(reverse_views))
+    return dataset.collate([dataset[0], dataset[1]])
+
+
+def test_views_are_rebuilt_per_pattern():
+    batch = _multiplexed_batch(reverse_views=True)
+
+    assert batch["pattern_name"] == ["a", "a", "av", "av", "v", "v"]
+    video = str(Modality.VIDEO)
+    assert torch.equal(batch[f"{video}_original"], batch[Modality.VIDEO])
+    assert torch.equal(batch[f"{video}_original"][:2], torch.zeros(2, 3))
+    assert torch.equal(batch[f"{video}_reverse"][:2], torch.tensor([[1.0] * 3, [2.0] * 3]))
+    assert torch.equal(batch["missing_mask"][Modality.VIDEO], torch.tensor([0.0, 0.0, 1.0, 1.0, 1.0, 1.0]))
+
+
+def test_no_stale_reverse_views_without_with_reverse():
+    batch = _multiplexed_batch(reverse_views=False)
+
+    assert not [key for key in batch if isinstance(key, str) and key.endswith("_reverse")]
+    assert torch.equal(batch[f"{str(Modality.AUDIO)}_original"][4:], torch.zeros(2, 3))
@@ -0,0 +1,80 @@
+import pytest
+import torch
+from modalities import Modality
+from models.mixins import MissingModalityMixin
+from models.msa.networks.lstm import LSTMEncoder
+from models.msa.utt_fusion import UttFusionModel
+from torch import nn
+
+INPUT_SIZE = 4
+MAX_LEN = 6
+
+
+def _encoder(embd_method: str, normalize_attention: bool = False) -> LSTMEncoder:
+    torch.manual_seed(0)
+    encoder = LSTMEncoder(
+        input_size=INPUT_SIZE, hidden_size=8, embd_method=embd_method, normalize_attention=normalize_attention
+    )
+    if embd_method == "attention":
+        nn.init.normal_(encoder.attention_vector_weight)
+    return encoder.eval()
+
+
+class _AudioModel(nn.Module, MissingModalityMixin):
+    def __init__(self) -> None:
+        super().__init__()
+        self.encoder = _encoder("attention")
+
+    def get_encoder(self, modality):
+        return self.encoder
+
+    def classify_embeddings(self, embeddings):
+        return embeddings[Modality.AUDIO]
+
+
+@pytest.mark.parametrize("normalize_attention", [False, True])
+@pytest.mark.parametrize("embd_method", ["last", "maxpool", "attention"])
+def test_packed_rows_match_unpadded_sequences(embd_method, normalize_attention):
+    encoder = _encoder(embd_method, normalize_attention)
+    ## the padded timesteps hold noise, so they must not contribute to the packed embeddings
+    data = torch.randn(3, MAX_LEN, INPUT_SIZE)
+    lengths = torch.tensor([MAX_LEN, 4, 2])
+
+    with torch.no_grad():
+        packed = encoder(data, lengths=lengths)
+        for row, length in enumerate(lengths.tolist()):
+            torch.testing.assert_close(packed[row : row + 1], encoder(data[row : row + 1, :length]))
+
+
+def test_default_attention_sums_the_outputs():
+    ## existing checkpoints were trained with the softmax over the singleton axis, i.e. all weights equal to 1
+    encoder = _encoder("attention")
+    data = torch.randn(2, MAX_LEN, INPUT_SIZE)
+
+    with torch.no_grad():
+        r_out, _ = encoder.rnn(data)
+        torch.testing.assert_close(encoder(data), r_out.sum(dim=1))
+
+
+def test_absent_rows_use_the_full_length_zero_embedding():
+    model = _AudioModel().eval()
+    data = torch.randn(3, MAX_LEN, INPUT_SIZE)
+    data[1] = 0
+    presence = torch.tensor([1.0, 0.0, 1.0])
+    lengths = torch.tensor([MAX_LEN, 3, 2])
+
+    with torch.no_grad():
+        embedding = model.encode_present(Modality.AUDIO, data, presence, lengths=lengths)
+        torch.testing.assert_close(embedding[1:2], model.encoder(torch.zeros(1, MAX_LEN, INPUT_SIZE)))
+        torch.testing.assert_close(embedding[2:3], model.encoder(data[2:3, :2]))
+
+
+def test_utt_fusion_gives_absent_rows_the_padded_length():
+    lengths = {Modality.AUDIO: torch.tensor([5.0, 3.0]), Modality.VIDEO: torch.tensor([2.0, 4.0])}
+    missing_mask = {Modality.AUDIO: torch.tensor([1.0, 0.0])}
+    inputs = {Modality.AUDIO: torch.zeros(2, 7, INPUT_SIZE), Modality.VIDEO: torch.zeros(2, 7, INPUT_SIZE)}
+
+    kwargs = UttFusionModel._encoder_kwargs(lengths, missing_mask, inputs)
+
+    assert kwargs[Modality.AUDIO]["lengths"].tolist() == [5.0, 7.0]
+    assert kwargs[Modality.VIDEO]["lengths"].tolist() == [2.0, 4.0]
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+import torch
+from config.metric_config import MetricConfig
+from experiment_utils.metric_recorder import MetricRecorder
+from experiment_utils.streaming_metrics import ConfusionMatrixState, resolve_streaming_metric
+from sklearn import metrics as sk
+
+BATCH_SIZE = 16
+PATTERN = "ai"
+
+
+def _labels(kind: str, n: int = 100, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    match kind:
+        case "binary":
+            shape, high = (n,), 2
+        case "multiclass":
+            shape, high = (n,), 5
+        case "multilabel":
+            shape, high = (n, 6), 2
+    return rng.integers(0, high, shape), rng.integers(0, high, shape)
+
+
+def _metric_configs(kind: str) -> dict:
+    configs = {
+        "accuracy": {"function": "sklearn.metrics.accuracy_score"},
+        "f1_micro": {"function": "sklearn.metrics.f1_score", "kwargs": {"average": "micro"}},
+        "f1_macro": {"function": "sklearn.metrics.f1_score", "kwargs": {"average": "macro"}},
+        "f1_weighted": {"function": "sklearn.metrics.f1_score", "kwargs": {"average": "weighted"}},
+        "precision_macro": {"function": "sklearn.metrics.precision_score", "kwargs": {"average": "macro"}},
+        "recall_weighted": {"function": "sklearn.metrics.recall_score", "kwargs": {"average": "weighted"}},
+    }
+    if kind == "binary":
+        configs["f1_binary"] = {"function": "sklearn.metrics.f1_score"}
+    if kind != "multilabel":
+        configs["balanced_accuracy"] = {"function": "sklearn.metrics.balanced_accuracy_score"}
+        configs["confusion"] = {"function": "sklearn.metrics.confusion_matrix"}
+    return configs
+
+
+def _sklearn_value(config: dict, targets: np.ndarray, predictions: np.ndarray):
+    func = getattr(sk, config["function"].rsplit(".", 1)[1])
+    return func(targets, predictions, **config.get("kwargs", {}))
+
+
+@pytest.mark.parametrize("kind", ["binary", "multiclass", "multilabel"])
+def test_recorder_matches_sklearn(kind):
+    targets, predictions = _labels(kind)
+    configs = _metric_configs(kind)
+    recorder = MetricRecorder(MetricConfig(metrics=configs))
+
+    for start in range(0, len(targets), BATCH_SIZE):
+        batch = slice(start, start + BATCH_SIZE)
+        recorder.update(predictions=predictions[batch], targets=targets[batch], modality=PATTERN)
+    results = recorder.calculate_metrics()
+
+    for name, config in configs.items():
+        expected = _sklearn_value(config, targets, predictions)
+        np.testing.assert_allclose(results[f"{name}_{PATTERN.upper()}"], expected, err_msg=name)
+
+
+@pytest.mark.parametrize("kind", ["binary", "multiclass"])
+def test_single_label_metrics_are_streamed(kind):
+    recorder = MetricRecorder(MetricConfig(metrics=_metric_configs(kind)))
+    targets, predictions = _labels(kind)
+    recorder.update(predictions=predictions, targets=targets, modality=PATTERN)
+
+    assert set(recorder.streaming_metrics) == set(_metric_configs(kind))
+    assert not recorder.modality_data
+
+
+def test_multilabel_targets_fall_back_to_buffering():
+    recorder = MetricRecorder(MetricConfig(metrics=_metric_configs("multilabel")))
+    targets, predictions = _labels("multilabel")
+    recorder.update(predictions=predictions, targets=targets, modality=PATTERN)
+
+    assert not recorder.streaming_metrics
+    assert len(recorder.modality_data[PATTERN]) == 1
+
+
+def test_reduced_precision_predictions_are_upcast():
+    configs = {"mae": {"function": "sklearn.metrics.mean_absolute_error"}}
+    recorder = MetricRecorder(MetricConfig(metrics=configs))
+    targets = torch.linspace(-3, 3, BATCH_SIZE)
+    predictions = targets.to(torch.bfloat16)
+    recorder.update(predictions=predictions, targets=targets, modality=PATTERN)
+
+    expected = sk.mean_absolute_error(targets.numpy(), predictions.float().numpy())
+    np.testing.assert_allclose(recorder.calculate_metrics()[f"mae_{PATTERN.upper()}"], expected)
+
+
+def test_batch_of_one_with_squeezed_outputs():
+    configs = _metric_configs("binary")
+    recorder = MetricRecorder(MetricConfig(metrics=configs))
+    targets, predictions = _labels("binary", n=3)
+    recorder.update_all(predictions=predictions[:2], targets=targets[:2], m_types=np.array([PATTERN] * 2))
+    recorder.update_all(predictions=torch.tensor(predictions[2]), targets=targets[2], m_types=np.array([PATTERN]))
+    results = recorder.calculate_metrics()
+
+    expected = _sklearn_value(configs["accuracy"], targets, predictions)
+    np.testing.assert_allclose(results[f"accuracy_{PATTERN.upper()}"], expected)
+
+
+def test_confusion_state_rejects_multilabel_targets():
+    targets, predictions = _labels("multilabel")
+    with pytest.raises(ValueError, match="one class label per row"):
+        ConfusionMatrixState().update(targets, predictions)
+
+
+@pytest.mark.parametrize("kind", ["binary", "multiclass"])
+def test_kernels_match_sklearn_in_chunks(kind):
+    targets, predictions = _labels(kind, seed=1)
+    state = ConfusionMatrixState()
+    for start in range(0, len(targets), BATCH_SIZE):
+        state.update(targets[start : start + BATCH_SIZE], predictions[start : start + BATCH_SIZE])
+
+    for name, config in _metric_configs(kind).items():
+        metric = resolve_streaming_metric(config["function"], config.get("kwargs"))
+        expected = _sklearn_value(config, targets, predictions)
+        np.testing.assert_allclose(metric.compute(state), expected, err_msg=name)
@@ -7,8 +7,9 @@ from typing import Dict
 
 import numpy as np
 import torch
-from config import CMAMConfig
+from config import AssociationNetworkConfig, CMAMConfig
 from config.resolvers import resolve_model_name
+from experiment_utils.utils import format_path_with_env, model_fingerprint
 from experiment_utils import (
     CheckpointManager,
     EmbeddingVisualizationReport,
@@ -19,13 +20,18 @@ from experiment_utils import (
     MetricRecorder,
     MetricsReport,
     ModelReport,
+    PrecisionPolicy,
+    RunningLoss,
     TimingReport,
     clean_checkpoints,
     configure_logger,
     get_console,
     get_logger,
 )
-from modalities import add_modality
+from experiment_utils.precision import FP32
+from modalities import Modality, add_modality
+from models.cmams import AssociationNetwork, CMAMEmbeddingStore, TargetEmbeddingStore
+from models.compilation import compile_failures, compile_model, preserved_training_state, restore_eager
 from rich import box
 from rich.panel import Panel
 from torch.utils.data import DataLoader
@@ -74,7 +80,7 @@ def setup_dataloaders(config: CMAMConfig, console, logger) -> Dict[str, DataLoad
     """Setup data loaders for training and evaluation."""
     logger.debug("Building dataloaders...")
 
-    dataloaders = config.data.build_all_dataloaders()
+    dataloaders = config.data.build_all_dataloaders(seed=config.experiment.seed)
     console.print(f"Finished building dataloaders. Created: {list(dataloaders.keys())}")
 
     # Log dataset sizes
@@ -82,7 +88,7 @@ def setup_dataloaders(config: CMAMConfig, console, logger) -> Dict[str, DataLoad
         dataset_size = len(loader.dataset)
         logger.debug(f"{split} dataset size: {dataset_size}")
         if split in ["train", "validation"]:
-            total_iterations = config.training.epochs * (dataset_size // loader.batch_size)
+            total_iterations = config.training.epochs * len(loader)
             logger.debug(f"Total {split} iterations: {total_iterations}")
 
     return dataloaders
@@ -140,16 +146,198 @@ def setup_model_components(config: CMAMConfig, console, logger, dataloaders: Dat
     return model, optimizer, criterion, scheduler, device
 
 
-def train_epoch(model, train_loader, optimizer, criterion, device, console, epoch, monitor=None):
-    """Run one epoch of training."""
+def setup_target_embeddings(
+    config: CMAMConfig, trained_model, dataloaders: Dict[str, DataLoader], device, console, logger
+) -> Dict[str, TargetEmbeddingStore]:
+    """
+    Encode the target modality of every split once with the frozen teacher encoder.
+
+    On-disk stores live under the fingerprint of the encoder's weights, so a retrained teacher never reuses them.
+    """
+    if not config.cache_target_embeddings or not hasattr(trained_model, "get_encoder"):
+        return {}
+
+    encoder = trained_model.get_encoder(config.target_modality)
+    store_dir = None
+    if config.target_embeddings_dir:
+        store_dir = Path(format_path_with_env(config.target_embeddings_dir)) / model_fingerprint(encoder)
+    target_embeddings = {}
+    for split, loader in dataloaders.items():
+        if split == "embeddings":
+            continue
+        store_path = store_dir / f"{split}.pt" if store_dir is not None else None
+        if store_path is not None and store_path.exists():
+            target_embeddings[split] = TargetEmbeddingStore.load(store_path)
+            logger.info(f"Loaded {split} target embeddings from {store_path}")
+            continue
+
+        target_embeddings[split] = TargetEmbeddingStore.build(encoder, loader, config.target_modality, device)
+        logger.info(f"Computed {len(target_embeddings[split])} {split} target embeddings")
+        if store_path is not None:
+            target_embeddings[split].save(store_path)
+
+    console.print(f"[green]✓[/] Target embeddings cached for: {list(target_embeddings.keys())}")
+    return target_embeddings
+
+
+def setup_cmam_components(
+    config: CMAMConfig, trained_model, device, console, logger, batch_size: int, precision: PrecisionPolicy = FP32
+):
+    """
+    Build the C-MAM, with its optimizer and scheduler.
+
+    The teacher is loaded from `config.model.pretrained_path` and frozen. The C-MAM is loaded from
+    `config.cmam.pretrained_path` if given. In embedding space its input encoders are frozen too, since their
+    embeddings are precomputed, and without a C-MAM checkpoint they are copied from the teacher's encoders of the
+    same modalities. `config.cmam.compile` compiles the association network (or the configured C-MAM modules),
+    which is then warmed up with a batch of `batch_size` rows.
+    """
+    if config.model.pretrained_path is not None:
+        checkpoint = torch.load(config.model.pretrained_path, map_location=device, weights_only=True)
+        trained_model.load_state_dict(checkpoint["model_state_dict"])
+        console.print(f"[green]✓[/] Loaded the trained model from {config.model.pretrained_path}")
+    else:
+        console.print("[bold yellow]![/] No pretrained path for the trained model, its weights are untrained")
+    trained_model.requires_grad_(False)
+    trained_model.eval()
+
+    cmam_kwargs = dict(config.cmam.kwargs)
+    association_config = cmam_kwargs.pop("association_net", None)
+    if isinstance(association_config, AssociationNetworkConfig):
+        cmam_kwargs["association_network"] = AssociationNetwork(
+            input_size=association_config.input_size,
+            hidden_size=association_config.hidden_size,
+            output_size=association_config.output_size,
+            batch_norm=association_config.batch_norm,
+            dropout=association_config.dropout,
+        )
+    cmam = resolve_model_name(config.cmam.name)(
+        **cmam_kwargs,
+        target_modality=config.target_modality,
+        metric_recorder=MetricRecorder(config=config.metrics),
+    )
+
+    if config.cmam.pretrained_path is not None:
+        checkpoint = torch.load(config.cmam.pretrained_path, map_location=device, weights_only=True)
+        cmam.load_state_dict(checkpoint["model_state_dict"])
+        console.print(f"[green]✓[/] Loaded the C-MAM from {config.cmam.pretrained_path}")
+    elif config.embedding_space:
+        for name, encoder in cmam.input_encoders.items():
+            encoder.load_state_dict(trained_model.get_encoder(Modality.from_str(name)).state_dict())
+        console.print("[green]✓[/] C-MAM input encoders initialised from the trained model")
+    if config.embedding_space:
+        cmam.input_encoders.requires_grad_(False)
+    cmam.to(device)
+    logger.info(f"C-MAM: {cmam}")
+
+    if config.cmam.compile:
+        ## the association network is the only module both training modes run, so it is the default target
+        compile_config = {} if config.cmam.compile is True else dict(config.cmam.compile)
+        compile_config.setdefault("modules", ["association_network"])
+        compiled = compile_model(cmam, compile_config)
+        if compiled:
+            console.print(f"[green]✓[/] Compiled modules: {compiled}")
+        else:
+            console.print("[bold yellow]![/] No module could be compiled, running in eager mode")
+        logger.info(f"Compiled modules: {compiled}")
+        if compiled and compile_config.get("warmup", True):
+            warm_up_compiled_cmam(cmam, batch_size, device, precision)
+
+    optimizer = config.get_optimizer(cmam)
+    scheduler = config.get_scheduler(optimizer=optimizer) if config.training.scheduler is not None else None
+    console.print("[green]✓[/] C-MAM created")
+    return cmam, optimizer, scheduler
+
+
+def warm_up_compiled_cmam(cmam, batch_size: int, device, precision: PrecisionPolicy = FP32) -> None:
+    """
+    Run a synthetic batch through the compiled association network so compilation happens before training starts.
+
+    The association network only sees fused (batch_size, input_size) embeddings, so random ones exercise the same
+    graphs as training: forward and backward, in train mode, with gradients enabled and under the precision
+    policy's autocast. Its parameters, batch norm statistics and gradients are restored afterwards. If the warm-up
+    batch fails, every module is restored to eager mode.
+    """
+    console.print("Warming up compiled C-MAM...")
+    start = time.time()
+    association_network = cmam.association_network
+    input_size = next(m for m in association_network.modules() if isinstance(m, torch.nn.Linear)).in_features
+    try:
+        with preserved_training_state(association_network):
+            association_network.train()
+            with precision.autocast():
+                outputs = association_network(torch.randn(batch_size, input_size, device=device))
+            outputs.float().square().mean().backward()
+    except Exception as e:
+        restore_eager(cmam)
+        get_logger().warning(f"Warm-up of the compiled C-MAM failed, running in eager mode: {e}")
+        console.print("[bold yellow]![/] Warm-up of the compiled C-MAM failed, running in eager mode")
+        return
+    finally:
+        cmam.train()
+
+    failed = compile_failures(cmam)
+    if failed:
+        console.print(f"[bold yellow]![/] Running in eager mode: {failed}")
+    console.print(f"[green]✓[/] Compiled C-MAM warmed up in {time.time() - start:.1f}s")
+
+
+def loader_batch_size(loader: DataLoader) -> int:
+    return loader.batch_size or loader.batch_sampler.batch_size
+
+
+def setup_embedding_stores(
+    config: CMAMConfig, cmam, trained_model, dataloaders: Dict[str, DataLoader], device, console, logger
+) -> Dict[str, CMAMEmbeddingStore]:
+    """
+    Encode the inputs, targets and labels of every split once, see `CMAMEmbeddingStore`.
+
+    On-disk stores live under the fingerprints of the teacher and of the C-MAM's input encoders.
+    """
+    store_dir = None
+    if config.embedding_store_dir:
+        fingerprint = f"{model_fingerprint(trained_model)[:20]}-{model_fingerprint(cmam.input_encoders)[:20]}"
+        store_dir = Path(format_path_with_env(config.embedding_store_dir)) / fingerprint
+    stores = {}
+    for split, loader in dataloaders.items():
+        if split == "embeddings":
+            continue
+        store_path = store_dir / f"{split}.pt" if store_dir is not None else None
+        if store_path is not None and store_path.exists():
+            stores[split] = CMAMEmbeddingStore.load(store_path)
+            logger.info(f"Loaded the {split} embedding store from {store_path}")
+        else:
+            stores[split] = CMAMEmbeddingStore.build(cmam, trained_model, loader, device)
+            logger.info(f"Computed the {split} embedding store ({len(stores[split])} samples)")
+            if store_path is not None:
+                stores[split].save(store_path)
+        ## the stores are small, keeping them on the device avoids a host-to-device copy per batch
+        stores[split].to(device)
+
+    console.print(f"[green]✓[/] Embedding stores built for: {list(stores.keys())}")
+    return stores
+
+
+def train_epoch(
+    model, train_loader, optimizer, criterion, device, console, trained_model, monitor=None, precision=FP32
+):
+    """Run one epoch of C-MAM training."""
     model.train()
     start_time = time.time()
 
     console.start_task("Training", total=len(train_loader), style="light slate_blue")
-    losses = []
+    running_loss = RunningLoss()
     for batch in train_loader:
-        train_loss = model.train_step(batch, criterion=criterion, optimizer=optimizer, device=device, epoch=epoch)
-        losses.append(train_loss)
+        train_loss = precision.run_step(
+            model.train_step,
+            batch,
+            batch["label"],
+            criterion=criterion,
+            optimizer=optimizer,
+            device=device,
+            trained_model=trained_model,
+        )
+        running_loss.update(train_loss)
         if monitor:
             monitor.step()
 
@@ -157,26 +345,114 @@ def train_epoch(model, train_loader, optimizer, criterion, device, console, epoc
 
     console.complete_task("Training")
 
-    return np.mean([l["loss"] for l in losses]), (time.time() - start_time) / len(train_loader)
-
-
-def validate_epoch(model, val_loader, criterion, device, console, monitor=None, task_name: str = "Validation"):
-    """Run one epoch of validation."""
+    return running_loss.mean("loss"), (time.time() - start_time) / len(train_loader)
+
+
+def validate_epoch(
+    model,
+    val_loader,
+    criterion,
+    device,
+    console,
+    trained_model,
+    split: str = "validation",
+    monitor=None,
+    task_name: str = "Validation",
+    precision=FP32,
+):
+    """Run one epoch of C-MAM validation, `split` selects the cached target embeddings."""
     model.eval()
     start_time = time.time()
 
     console.start_task(task_name, total=len(val_loader), style="bright yellow")
-    losses = []
+    running_loss = RunningLoss()
     with torch.no_grad():
         for batch in val_loader:
-            validation_loss = model.validation_step(batch, criterion=criterion, device=device)
-            losses.append(validation_loss)
+            validation_loss = precision.run_step(
+                model.evaluate,
+                batch,
+                batch["label"],
+                criterion=criterion,
+                device=device,
+                trained_model=trained_model,
+                split=split,
+            )
+            running_loss.update(validation_loss)
             if monitor:
                 monitor.step()
             console.update_task(task_name, advance=1)
 
     console.complete_task(task_name)
-    return np.mean([l["loss"] for l in losses]), (time.time() - start_time) / len(val_loader)
+    return running_loss.mean("loss"), (time.time() - start_time) / len(val_loader)
+
+
+def train_embedding_epoch(
+    model, store, batch_size, optimizer, criterion, device, console, trained_model, monitor=None, precision=FP32
+):
+    """Run one epoch of embedding-space training on a `CMAMEmbeddingStore`."""
+    model.train()
+    start_time = time.time()
+    num_batches = store.num_batches(batch_size)
+
+    console.start_task("Training", total=num_batches, style="light slate_blue")
+    running_loss = RunningLoss()
+    for batch in store.batches(batch_size, shuffle=True):
+        train_loss = precision.run_step(
+            model.embedding_train_step,
+            batch,
+            criterion=criterion,
+            optimizer=optimizer,
+            device=device,
+            trained_model=trained_model,
+            pattern_names=store.pattern_names,
+        )
+        running_loss.update(train_loss)
+        if monitor:
+            monitor.step()
+
+        console.update_task("Training", advance=1)
+
+    console.complete_task("Training")
+
+    return running_loss.mean("loss"), (time.time() - start_time) / num_batches
+
+
+def validate_embedding_epoch(
+    model,
+    store,
+    batch_size,
+    criterion,
+    device,
+    console,
+    trained_model,
+    monitor=None,
+    task_name: str = "Validation",
+    precision=FP32,
+):
+    """Run one epoch of embedding-space validation on a `CMAMEmbeddingStore`."""
+    model.eval()
+    start_time = time.time()
+    num_batches = store.num_batches(batch_size)
+
+    console.start_task(task_name, total=num_batches, style="bright yellow")
+    running_loss = RunningLoss()
+    with torch.no_grad():
+        for batch in store.batches(batch_size):
+            validation_loss = precision.run_step(
+                model.embedding_evaluate,
+                batch,
+                criterion=criterion,
+                device=device,
+                trained_model=trained_model,
+                pattern_names=store.pattern_names,
+            )
+            running_loss.update(validation_loss)
+            if monitor:
+                monitor.step()
+            console.update_task(task_name, advance=1)
+
+    console.complete_task(task_name)
+    return running_loss.mean("loss"), (time.time() - start_time) / num_batches
 
 
 def check_early_stopping(
@@ -211,15 +487,13 @@ def setup_tracking(config: CMAMConfig, output_dir: Path, model) -> tuple:
         device=config.experiment.device,
     )
 
+    ## the tracked model is the C-MAM, its checkpoints must not overwrite the frozen teacher's (or the C-MAM
+    ## checkpoint it was initialised from), so they always go to the run's own model directory
+    console.print(f"C-MAM checkpoints saved to: {checkpoint_manager.model_dir}")
     if config.model.pretrained_path is not None:
-        checkpoint_manager.model_dir = Path(config.model.pretrained_path).parent
         console.print(f"Using pretrained model from: {config.model.pretrained_path}")
-
-    ## override the checkpoint manager for cmam
-
     if config.cmam.pretrained_path is not None:
-        checkpoint_manager.model_dir = Path(config.cmam.pretrained_path).parent
-        console.print(f"Using pretrained model from: {config.cmam.pretrained_path}")
+        console.print(f"Using pretrained C-MAM from: {config.cmam.pretrained_path}")
 
     # Initialize experiment data collector
     experiment_data = {
@@ -273,7 +547,21 @@ def main(config: CMAMConfig, console, logger):
     clean_checkpoints(os.path.join(os.path.dirname(config.logging.model_output_path), str(config.experiment.run_id)))
     dataloaders = setup_dataloaders(config, console, logger)
 
-    model, optimizer, criterion, scheduler, device = setup_model_components(config, console, logger, dataloaders)
+    ## the configured model is the frozen teacher, the C-MAM is the model that is trained and tracked
+    trained_model, _, criterion, _, device = setup_model_components(config, console, logger, dataloaders)
+    precision = PrecisionPolicy(config.training.precision, device)
+    console.print(f"[green]✓[/] Precision policy: {precision.precision}")
+    model, optimizer, scheduler = setup_cmam_components(
+        config, trained_model, device, console, logger, loader_batch_size(dataloaders["train"]), precision
+    )
+
+    embedding_stores = None
+    if config.embedding_space:
+        embedding_stores = setup_embedding_stores(config, model, trained_model, dataloaders, device, console, logger)
+    else:
+        model.set_target_embeddings(
+            setup_target_embeddings(config, trained_model, dataloaders, device, console, logger)
+        )
 
     # Setup tracking components
     checkpoint_manager, experiment_data, report_generator, monitor = setup_tracking(config, output_dir, model)
@@ -299,17 +587,31 @@ def main(config: CMAMConfig, console, logger):
                     monitor.start_epoch(epoch)
 
                 # Training phase
-                train_loss, train_time = train_epoch(
-                    model,
-                    dataloaders["train"],
-                    optimizer,
-                    criterion,
-                    device,
-                    console,
-                    epoch_metrics,
-                    epoch=epoch,
-                    monitor=monitor,
-                )
+                if embedding_stores is not None:
+                    train_loss, train_time = train_embedding_epoch(
+                        model,
+                        embedding_stores["train"],
+                        loader_batch_size(dataloaders["train"]),
+                        optimizer,
+                        criterion,
+                        device,
+                        console,
+                        trained_model,
+                        monitor=monitor,
+                        precision=precision,
+                    )
+                else:
+                    train_loss, train_time = train_epoch(
+                        model,
+                        dataloaders["train"],
+                        optimizer,
+                        criterion,
+                        device,
+                        console,
+                        trained_model,
+                        monitor=monitor,
+                        precision=precision,
+                    )
 
                 # Record training data
                 console.print("Calculating training metrics")
@@ -327,14 +629,28 @@ def main(config: CMAMConfig, console, logger):
                 model.metric_recorder.reset()
                 epoch_metrics = model.metric_recorder
 
-                val_loss, val_time = validate_epoch(
-                    model,
-                    dataloaders["validation"],
-                    criterion,
-                    device,
-                    console,
-                    epoch_metrics,
-                )
+                if embedding_stores is not None:
+                    val_loss, val_time = validate_embedding_epoch(
+                        model,
+                        embedding_stores["validation"],
+                        loader_batch_size(dataloaders["validation"]),
+                        criterion,
+                        device,
+                        console,
+                        trained_model,
+                        precision=precision,
+                    )
+                else:
+                    val_loss, val_time = validate_epoch(
+                        model,
+                        dataloaders["validation"],
+                        criterion,
+                        device,
+                        console,
+                        trained_model,
+                        split="validation",
+                        precision=precision,
+                    )
 
                 if monitor:
                     monitor.end_epoch()
@@ -360,12 +676,13 @@ def main(config: CMAMConfig, console, logger):
                     epoch=epoch,
                     metrics=val_metrics,
                     is_best=is_best,
+                    precision=precision,
                 )
 
                 # Reset wait counter if we found a new best model
                 if is_best:
                     wait = 0
-                    console.print(f"[green]>> New best model saved at epoch {epoch}[/]")
+                    console.print(f"[green]>> New best model at epoch {epoch}[/]")
                 else:
                     wait += 1
 
@@ -395,7 +712,8 @@ def main(config: CMAMConfig, console, logger):
                 )
         # Testing phase
         if config.experiment.is_test:
-            # Load best model for testing
+            # Load best model for testing, once the background checkpoint writes have finished
+            checkpoint_manager.flush()
             checkpoint_manager.load_checkpoint(model=model, load_best=True)
 
             for _test_dataloader in [d for d in dataloaders if d not in ["train", "validation", "embeddings"]]:
@@ -409,16 +727,31 @@ def main(config: CMAMConfig, console, logger):
                     monitor.start_epoch(_test_dataloader)
 
                 console.print(f"\n[bold cyan]Starting Testing Phase for {_test_dataloader}[/]")
-                with torch.no_grad():
-                    test_loss, test_time = validate_epoch(
-                        model=model,
-                        val_loader=dataloaders[_test_dataloader],
-                        criterion=criterion,
-                        device=device,
-                        console=console,
-                        epoch_metrics=test_metrics,
+                if embedding_stores is not None:
+                    test_loss, test_time = validate_embedding_epoch(
+                        model,
+                        embedding_stores[_test_dataloader],
+                        loader_batch_size(dataloaders[_test_dataloader]),
+                        criterion,
+                        device,
+                        console,
+                        trained_model,
                         task_name=f"Testing {_test_dataloader}",
+                        precision=precision,
                     )
+                else:
+                    with torch.no_grad():
+                        test_loss, test_time = validate_epoch(
+                            model=model,
+                            val_loader=dataloaders[_test_dataloader],
+                            criterion=criterion,
+                            device=device,
+                            console=console,
+                            trained_model=trained_model,
+                            split=_test_dataloader,
+                            task_name=f"Testing {_test_dataloader}",
+                            precision=precision,
+                        )
 
                 final_test_metrics = test_metrics.calculate_metrics()
                 final_test_metrics["loss"] = test_loss
@@ -430,6 +763,7 @@ def main(config: CMAMConfig, console, logger):
                 if monitor:
                     monitor.end_epoch()
     finally:
+        checkpoint_manager.close()
         if monitor:
             monitor.close()
             model.detach_monitor()
@@ -1,3 +1,4 @@
+import inspect
 import os
 import time
 import warnings
@@ -20,13 +21,17 @@ from experiment_utils import (
     MetricRecorder,
     MetricsReport,
     ModelReport,
+    PrecisionPolicy,
+    RunningLoss,
     TimingReport,
     clean_checkpoints,
     configure_logger,
     get_console,
     get_logger,
 )
+from experiment_utils.precision import FP32
 from modalities import add_modality
+from models.compilation import compile_failures, compile_model, preserved_training_state, restore_eager
 from rich import box
 from rich.panel import Panel
 from torch.nn import Module
@@ -82,7 +87,7 @@ def setup_dataloaders(
     """Setup data loaders for training and evaluation."""
     logger.debug("Building dataloaders...")
 
-    dataloaders = config.data.build_all_dataloaders()
+    dataloaders = config.data.build_all_dataloaders(seed=config.experiment.seed)
     console.print(f"Finished building dataloaders. Created: {list(dataloaders.keys())}")
 
     # Log dataset sizes
@@ -90,7 +95,7 @@ def setup_dataloaders(
         dataset_size = len(loader.dataset)
         logger.debug(f"{split} dataset size: {dataset_size}")
         if split in ["train", "validation"]:
-            total_iterations = config.training.epochs * (dataset_size // loader.batch_size)
+            total_iterations = config.training.epochs * len(loader)
             logger.debug(f"Total {split} iterations: {total_iterations}")
 
     return dataloaders
@@ -130,6 +135,14 @@ def setup_model_components(
     device = config.experiment.device
     model.to(device)
 
+    if config.model.compile:
+        compiled = compile_model(model, config.model.compile)
+        if compiled:
+            console.print(f"[green]✓[/] Compiled modules: {compiled}")
+        else:
+            console.print("[bold yellow]![/] No module could be compiled, running in eager mode")
+        logger.info(f"Compiled modules: {compiled}")
+
     # Setup optimizer and criterion
     optimizer = config.get_optimizer(model)
     criterion: LossFunctionGroup = config.get_criterion(
@@ -156,6 +169,55 @@ def setup_model_components(
     return model, optimizer, criterion, scheduler, device, metric_recorder
 
 
+def warm_up_compiled_model(
+    model: Module,
+    loader: DataLoader,
+    criterion: LossFunctionGroup,
+    device: torch.device,
+    metric_recorder: MetricRecorder,
+    precision: PrecisionPolicy = FP32,
+) -> None:
+    """
+    Run one training batch through a compiled model so compilation happens, and fails, before training starts.
+
+    The batch goes through ``train_step`` in train mode with gradients enabled, so the graphs compiled here are
+    the ones training uses, backward included. A zero learning rate SGD optimizer stands in for the real one,
+    whose state is left untouched, and the parameters, batch norm statistics, gradients and loss scale are
+    restored afterwards.
+
+    Modules whose compiled forward fails fall back to eager mode on their own; if the warm-up batch still fails,
+    every module is restored to eager mode.
+    """
+    console.print("Warming up compiled model...")
+    start = time.time()
+    precision_state = precision.state_dict()
+    try:
+        with preserved_training_state(model):
+            model.train()
+            precision.run_step(
+                model.train_step,
+                next(iter(loader)),
+                criterion=criterion,
+                optimizer=torch.optim.SGD(model.parameters(), lr=0.0),
+                device=device,
+                epoch=1,
+                metric_recorder=metric_recorder.clone(),
+            )
+    except Exception as e:
+        restore_eager(model)
+        get_logger().warning(f"Warm-up of the compiled model failed, running in eager mode: {e}")
+        console.print("[bold yellow]![/] Warm-up of the compiled model failed, running in eager mode")
+        return
+    finally:
+        precision.load_state_dict(precision_state)
+        model.train()
+
+    failed = compile_failures(model)
+    if failed:
+        console.print(f"[bold yellow]![/] Running in eager mode: {failed}")
+    console.print(f"[green]✓[/] Compiled model warmed up in {time.time() - start:.1f}s")
+
+
 def train_epoch(
     model: Module,
     train_loader: DataLoader,
@@ -166,18 +228,25 @@ def train_epoch(
     epoch: int,
     metric_recorder: MetricRecorder,
     monitor: ExperimentMonitor = None,
+    precision: PrecisionPolicy = FP32,
 ) -> tuple[float, float]:
     """Run one epoch of training."""
     model.train()
     start_time = time.time()
 
     console.start_task("Training", total=len(train_loader), style="light slate_blue")
-    losses = []
+    running_loss = RunningLoss()
     for batch in train_loader:
-        train_loss = model.train_step(
-            batch, criterion=criterion, optimizer=optimizer, device=device, epoch=epoch, metric_recorder=metric_recorder
+        train_loss = precision.run_step(
+            model.train_step,
+            batch,
+            criterion=criterion,
+            optimizer=optimizer,
+            device=device,
+            epoch=epoch,
+            metric_recorder=metric_recorder,
         )
-        losses.append(train_loss)
+        running_loss.update(train_loss)
         if monitor:
             monitor.step()
 
@@ -185,7 +254,7 @@ def train_epoch(
 
     console.complete_task("Training")
 
-    return np.mean([l["loss"] for l in losses]), (time.time() - start_time) / len(train_loader)
+    return running_loss.mean("loss"), (time.time() - start_time) / len(train_loader)
 
 
 def validate_epoch(
@@ -197,26 +266,39 @@ def validate_epoch(
     metric_recorder: MetricRecorder,
     monitor: ExperimentMonitor = None,
     task_name: str = "Validation",
+    precision: PrecisionPolicy = FP32,
 ) -> tuple[float, float]:
     """Run one epoch of validation."""
     model.eval()
     start_time = time.time()
 
+    # Pattern-bucketed datasets yield each sample once, the model evaluates every pattern itself
+    step_kwargs = {}
+    if getattr(val_loader.dataset, "pattern_bucketed", False):
+        if "patterns" not in inspect.signature(model.validation_step).parameters:
+            raise ValueError(f"{model.__class__.__name__} does not support pattern-bucketed evaluation")
+        step_kwargs["patterns"] = val_loader.dataset.get_bucketed_patterns()
+
     console.start_task(task_name, total=len(val_loader), style="bright yellow")
-    losses = []
+    running_loss = RunningLoss()
     with torch.no_grad():
         for batch in val_loader:
-            validation_loss = model.validation_step(
-                batch, criterion=criterion, device=device, metric_recorder=metric_recorder
+            validation_loss = precision.run_step(
+                model.validation_step,
+                batch,
+                criterion=criterion,
+                device=device,
+                metric_recorder=metric_recorder,
+                **step_kwargs,
             )
             # epoch_metrics.update_from_dict(validation_results)
-            losses.append(validation_loss)
+            running_loss.update(validation_loss)
             if monitor:
                 monitor.step()
             console.update_task(task_name, advance=1)
 
     console.complete_task(task_name)
-    return np.mean([l["loss"] for l in losses]), (time.time() - start_time) / len(val_loader)
+    return running_loss.mean("loss"), (time.time() - start_time) / len(val_loader)
 
 
 def check_early_stopping(
@@ -319,6 +401,11 @@ def main(
     model, optimizer, criterion, scheduler, device, metric_recorder = setup_model_components(
         config, console, logger, dataloaders
     )
+    precision = PrecisionPolicy(config.training.precision, device)
+    console.print(f"[green]✓[/] Precision policy: {precision.precision}")
+    compile_config = config.model.compile
+    if compile_config and (compile_config is True or compile_config.get("warmup", True)):
+        warm_up_compiled_model(model, dataloaders["train"], criterion, device, metric_recorder, precision)
 
     # Setup tracking components
     checkpoint_manager, experiment_data, report_generator, monitor = setup_tracking(config, output_dir, model)
@@ -354,6 +441,7 @@ def main(
                     metric_recorder=epoch_metrics,
                     epoch=epoch,
                     monitor=monitor,
+                    precision=precision,
                 )
 
                 # Record training data
@@ -381,6 +469,7 @@ def main(
                     console=console,
                     metric_recorder=epoch_metrics,
                     monitor=monitor,
+                    precision=precision,
                 )
 
                 if monitor:
@@ -407,12 +496,13 @@ def main(
                     epoch=epoch,
                     metrics=val_metrics,
                     is_best=is_best,
+                    precision=precision,
                 )
 
                 # Reset wait counter if we found a new best model
                 if is_best:
                     wait = 0
-                    console.print(f"[green]>> New best model saved at epoch {epoch}[/]")
+                    console.print(f"[green]>> New best model at epoch {epoch}[/]")
                 else:
                     wait += 1
 
@@ -442,7 +532,8 @@ def main(
                 )
         # Testing phase
         if config.experiment.is_test:
-            # Load best model for testing
+            # Load best model for testing, once the background checkpoint writes have finished
+            checkpoint_manager.flush()
             checkpoint_manager.load_checkpoint(model=model, load_best=True)
 
             for _test_dataloader in [d for d in dataloaders if d not in ["train", "validation", "embeddings"]]:
@@ -465,6 +556,7 @@ def main(
                         console=console,
                         metric_recorder=test_metrics,
                         task_name=f"Testing {_test_dataloader}",
+                        precision=precision,
                     )
 
                 final_test_metrics = test_metrics.calculate_metrics(
@@ -479,6 +571,7 @@ def main(
                 if monitor:
                     monitor.end_epoch()
     finally:
+        checkpoint_manager.close()
         if monitor:
             monitor.close()
             model.detach_monitor()